@@ -0,0 +1,57 @@
+# FBl337
+# Programming Code Golf Language
+# Created: 21 February 2024
+# Version: 21 February 2024 12:00PM
+# Copyright: James Leibert 2024
+# Licence: Available for use under the GPL3 Licence https://www.gnu.org/licenses/gpl-3.0.txt
+
+# axis_benchmark.py
+# Benchmark: transposing, rotating and shifting square integer grids, and the commands which work along an axis.
+# Rectangular arrays are permuted, rolled and shifted in their buffer (see storage.py)
+
+
+import sys
+from time import perf_counter_ns
+
+from fb1337 import run
+from fb1337.array import StructuredArray
+
+SIDES = [100, 250, 500]
+COMMANDS = ['⦰', '1⏀', '1⦵', '↦', '↥', '⌿+', '⋮µ#)']
+
+
+def grid(side):
+    return [[r * side + c for c in range(side)] for r in range(side)]
+
+
+def timed(fn):
+    start = perf_counter_ns()
+    fn()
+    return (perf_counter_ns() - start) / 1_000_000
+
+
+def measure(side):
+    array = StructuredArray(grid(side))
+    return {
+        'transpose': timed(lambda: array.transpose()),
+        'rotate': timed(lambda: array.rotate_on_axis(-1, 1)),
+        'rotate rows': timed(lambda: array.rotate_on_axis(0, 1)),
+        'shift': timed(lambda: array.shift_on_axis(-1, 1)),
+    }
+
+
+def measure_commands(side):
+    # The grid is built by the program, so the times include building it
+    build = str(side * side) + '⍳' + str(side) + ',' + str(side) + '⍴'
+    base = timed(lambda: run(build + '#', [], cache=False))
+    return {command: timed(lambda: run(build + command + '#', [], cache=False)) - base for command in COMMANDS}
+
+
+if __name__ == "__main__":
+    sides = [int(sys.argv[1])] if len(sys.argv) > 1 else SIDES
+    for side in sides:
+        times = measure(side)
+        print((str(side) + '×' + str(side)).ljust(8), '  '.join([name + ' ' + str(round(ms, 1)) + ' ms'
+                                                                for name, ms in times.items()]))
+        times = measure_commands(side)
+        print(''.ljust(8), '  '.join([command + ' ' + str(round(ms, 1)) + ' ms' for command, ms in times.items()]))
@@ -0,0 +1,40 @@
+# FBl337
+# Programming Code Golf Language
+# Created: 21 February 2024
+# Version: 21 February 2024 12:00PM
+# Copyright: James Leibert 2024
+# Licence: Available for use under the GPL3 Licence https://www.gnu.org/licenses/gpl-3.0.txt
+
+# batch_benchmark.py
+# Benchmark: running one program against many inputs with run() or a compiled program's run_many()
+
+
+from time import perf_counter_ns
+
+from fb1337 import run, compile
+
+CODE = "$1⍳/+$1∂×+"  # sum of 1..n plus n squared
+INPUTS = [[n % 50 + 1] for n in range(10_000)]
+
+
+def time_run():
+    start = perf_counter_ns()
+    results = [run(CODE, parameters) for parameters in INPUTS]
+    end = perf_counter_ns()
+    return results, (end - start) / 1_000_000
+
+
+def time_run_many(backend='tree'):
+    start = perf_counter_ns()
+    results = list(compile(CODE, backend=backend).run_many(INPUTS))
+    end = perf_counter_ns()
+    return results, (end - start) / 1_000_000
+
+
+if __name__ == "__main__":
+    expected, run_ms = time_run()
+    print(len(INPUTS), 'x run()', round(run_ms), 'ms')
+    for backend in ['tree', 'closure', 'bytecode']:
+        results, run_many_ms = time_run_many(backend)
+        print(len(INPUTS), 'x run_many()', backend, round(run_many_ms), 'ms', 'speed up', round(run_ms / run_many_ms, 1),
+              'ok' if results == expected else 'results differ')
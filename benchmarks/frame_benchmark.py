@@ -0,0 +1,39 @@
+# FBl337
+# Programming Code Golf Language
+# Created: 21 February 2024
+# Version: 21 February 2024 12:00PM
+# Copyright: James Leibert 2024
+# Licence: Available for use under the GPL3 Licence https://www.gnu.org/licenses/gpl-3.0.txt
+
+# frame_benchmark.py
+# Benchmark: environments created for loop bodies and lambda calls, and how many were reused from the pool
+
+
+from time import perf_counter_ns
+
+from fb1337 import compile
+from fb1337.environment import Environment
+
+SIZE = 10_000
+PROGRAMS = {
+    'loop': str(SIZE) + ":_2×◌;",
+    'nested loop': "100:100:_①+◌;;",
+    'map lambda': str(SIZE) + "⍳¨µ2×)/+",
+    'filter lambda': str(SIZE) + "⍳}µ3%)/+",
+}
+
+
+def count_environments(code, backend):
+    program = compile(code, backend=backend)
+    created, reused = Environment.created, Environment.reused
+    start = perf_counter_ns()
+    program.run()
+    end = perf_counter_ns()
+    return Environment.created - created, Environment.reused - reused, (end - start) / 1_000_000
+
+
+if __name__ == "__main__":
+    for name, code in PROGRAMS.items():
+        for backend in ['tree', 'closure', 'bytecode']:
+            created, reused, ms = count_environments(code, backend)
+            print(name.ljust(14), backend.ljust(9), created, 'created', reused, 'reused', round(ms, 1), 'ms')
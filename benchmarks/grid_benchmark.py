@@ -0,0 +1,45 @@
+# FBl337
+# Programming Code Golf Language
+# Created: 21 February 2024
+# Version: 21 February 2024 12:00PM
+# Copyright: James Leibert 2024
+# Licence: Available for use under the GPL3 Licence https://www.gnu.org/licenses/gpl-3.0.txt
+
+# grid_benchmark.py
+# Benchmark: building structured arrays from square grids of up to 10^6 cells and flattening them should take
+# linear time in the number of cells, for rectangular and ragged grids
+
+
+import sys
+from time import perf_counter_ns
+
+import fb1337  # loads the commands, which sets up the array types
+from fb1337.array import FlatList, StructuredArray
+
+SIDES = [10, 100, 300, 1000]
+
+
+def timed(fn):
+    start = perf_counter_ns()
+    fn()
+    return (perf_counter_ns() - start) / 1_000_000
+
+
+def measure(side):
+    grid = [[r * side + c for c in range(side)] for r in range(side)]
+    ragged = [row[:side - r % 2] for r, row in enumerate(grid)]
+    flat = grid[0] * side
+    return {
+        'build': timed(lambda: StructuredArray(grid)),
+        'build ragged': timed(lambda: StructuredArray(ragged)),
+        'flatten': timed(lambda: StructuredArray.flatten_structured(grid)),
+        'flat list': timed(lambda: FlatList([]).build(flat)),
+    }
+
+
+if __name__ == "__main__":
+    largest = int(sys.argv[1]) if len(sys.argv) > 1 else SIDES[-1]
+    for side in [s for s in SIDES if s <= largest]:
+        times = measure(side)
+        print(str(side * side).rjust(7), 'cells', '  '.join([name + ' ' + str(round(ms, 1)) + ' ms'
+                                                           for name, ms in times.items()]))
@@ -0,0 +1,48 @@
+# FBl337
+# Programming Code Golf Language
+# Created: 21 February 2024
+# Version: 21 February 2024 12:00PM
+# Copyright: James Leibert 2024
+# Licence: Available for use under the GPL3 Licence https://www.gnu.org/licenses/gpl-3.0.txt
+
+# import_benchmark.py
+# Benchmark: the time taken by `import fb1337`, measured with python -X importtime
+
+
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RUNS = 5
+SLOWEST = 10
+# Modules which should only be imported when they are used
+LAZY = ['scipy', 'PyQt5']
+
+
+def import_times():
+    """Import fb1337 in a fresh interpreter. Returns a dictionary of the cumulative import time in us of each module"""
+    environment = dict(os.environ, PYTHONPATH=ROOT)
+    process = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import fb1337'], env=environment,
+                             capture_output=True, text=True, check=True)
+    times = dict()
+    for line in process.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        self_time, cumulative, module = line[len('import time:'):].split('|')
+        times[module.strip()] = int(cumulative)
+    return times
+
+
+if __name__ == "__main__":
+    runs = [import_times() for _ in range(RUNS)]
+    best = {module: min(times.get(module, 0) for times in runs) for module in runs[0]}
+    print('import fb1337', round(best['fb1337'] / 1000, 1), 'ms', '(best of', RUNS, 'runs)')
+    print()
+    print('slowest top level imports')
+    top_level = [module for module in best if '.' not in module or module.startswith('fb1337.')]
+    for module in sorted(top_level, key=lambda m: -best[m])[:SLOWEST]:
+        print(' ', module.ljust(24), round(best[module] / 1000, 1), 'ms')
+    print()
+    loaded = [package for package in LAZY if any(m.split('.')[0] == package for m in best)]
+    print('lazy imports', 'ok' if len(loaded) == 0 else 'loaded at start up: ' + ', '.join(loaded))
@@ -0,0 +1,43 @@
+# FBl337
+# Programming Code Golf Language
+# Created: 21 February 2024
+# Version: 21 February 2024 12:00PM
+# Copyright: James Leibert 2024
+# Licence: Available for use under the GPL3 Licence https://www.gnu.org/licenses/gpl-3.0.txt
+
+# iteration_benchmark.py
+# Benchmark: the overhead of each kind of loop, timed with an empty loop body (best of several runs)
+
+
+from time import perf_counter_ns
+
+from fb1337 import compile
+
+SIZE = 20_000
+LOOPS = {
+    'count': str(SIZE) + ":;",
+    'count down': "~" + str(SIZE) + ":;",
+    'slice': "{1," + str(SIZE + 1) + "Ø:;",
+    'string': "$1:;",
+    'list': str(SIZE) + "⍳:;",
+    'for': "Ω1µ_" + str(SIZE) + "≤)µ_1+):;",
+}
+REPEATS = 3
+
+
+def time_loop(code, backend):
+    program = compile(code, backend=backend)
+    best = None
+    for _ in range(REPEATS):
+        start = perf_counter_ns()
+        program.run(['x' * SIZE])
+        end = perf_counter_ns()
+        best = end - start if best is None else min(best, end - start)
+    return best / 1_000_000
+
+
+if __name__ == "__main__":
+    for name, code in LOOPS.items():
+        for backend in ['tree', 'closure', 'bytecode']:
+            ms = time_loop(code, backend)
+            print(name.ljust(11), backend.ljust(9), round(ms, 1), 'ms', round(ms * 1000 / SIZE, 2), 'us per step')
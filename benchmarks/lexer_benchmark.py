@@ -0,0 +1,53 @@
+# FBl337
+# Programming Code Golf Language
+# Created: 21 February 2024
+# Version: 21 February 2024 12:00PM
+# Copyright: James Leibert 2024
+# Licence: Available for use under the GPL3 Licence https://www.gnu.org/licenses/gpl-3.0.txt
+
+# lexer_benchmark.py
+# Benchmark: tokenizing a generated program of up to 1 MB. The time per KB should not grow with the program length
+
+
+import random
+from time import perf_counter_ns
+
+from fb1337.lexer import tokenize, iter_tokens
+
+SIZES = [10_000, 100_000, 1_000_000]
+FRAGMENTS = ["$1⍳/+", "3,4+", "Hello` World`!", "µ∂2<)", "~12×", "ḣ⍳", "Ø", "`nl", "λ²)", "⍝ a comment\n",
+             "\t another comment\n", "Ωµ0)λ1)λ1+):_◌"]
+
+
+def generate_program(size):
+    """A program of at least size bytes made from random fragments of code and comments"""
+    generator = random.Random(1337)
+    fragments, length = [], 0
+    while length < size:
+        fragment = generator.choice(FRAGMENTS)
+        fragments.append(fragment)
+        length += len(fragment.encode('utf-8'))
+    return ''.join(fragments)
+
+
+def time_tokenize(program):
+    start = perf_counter_ns()
+    tokens = tokenize(program)
+    end = perf_counter_ns()
+    return len(tokens), (end - start) / 1_000_000
+
+
+def time_first_token(program):
+    # Tokens are generated lazily, so the first is available without reading the whole program
+    start = perf_counter_ns()
+    next(iter_tokens(program))
+    end = perf_counter_ns()
+    return (end - start) / 1_000_000
+
+
+if __name__ == "__main__":
+    for size in SIZES:
+        program = generate_program(size)
+        count, ms = time_tokenize(program)
+        print(size // 1000, 'KB', count, 'tokens', round(ms), 'ms', round(ms / (size / 1000), 3), 'ms per KB',
+              'first token', round(time_first_token(program), 2), 'ms')
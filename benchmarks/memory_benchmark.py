@@ -0,0 +1,42 @@
+# FBl337
+# Programming Code Golf Language
+# Created: 21 February 2024
+# Version: 21 February 2024 12:00PM
+# Copyright: James Leibert 2024
+# Licence: Available for use under the GPL3 Licence https://www.gnu.org/licenses/gpl-3.0.txt
+
+# memory_benchmark.py
+# Benchmark: the memory held by a syntax tree, in bytes per token, for large generated programs
+
+
+import gc
+import tracemalloc
+
+import fb1337  # loads the commands, which registers their signatures with the parser
+from fb1337.parser import SyntaxTree
+
+LENGTH = 200_000
+PROGRAMS = {
+    'flat': "3,4+" * (LENGTH // 4),
+    'commented': "$1⍳/+\t sum to n\n" * (LENGTH // 16),
+    'blocks': "3:_2×;" * (LENGTH // 6),
+    'nested': "µ" * 1_000 + "3" + ")" * 1_000,
+}
+
+
+def tree_memory(program):
+    """The memory still allocated once the tree is built, and the number of tokens in the tree"""
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    tree = SyntaxTree(program)
+    gc.collect()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return after - before, len(tree.tokens)
+
+
+if __name__ == "__main__":
+    for name, program in PROGRAMS.items():
+        size, count = tree_memory(program)
+        print(name.ljust(10), count, 'tokens', round(size / 1_000_000, 1), 'MB', round(size / count), 'bytes per token')
@@ -0,0 +1,48 @@
+# FBl337
+# Programming Code Golf Language
+# Created: 21 February 2024
+# Version: 21 February 2024 12:00PM
+# Copyright: James Leibert 2024
+# Licence: Available for use under the GPL3 Licence https://www.gnu.org/licenses/gpl-3.0.txt
+
+# parser_benchmark.py
+# Benchmark: building the syntax tree should take linear time in the length of the program,
+# and any depth of nesting should parse without reaching the recursion limit.
+# Token locations are only worked out when they are needed, so deep nesting does not cost quadratic memory
+
+
+import sys
+from time import perf_counter_ns
+
+import fb1337  # loads the commands, which registers their signatures with the parser
+from fb1337.parser import SyntaxTree
+
+LENGTHS = [1_000, 10_000, 100_000]
+DEPTHS = [10, 1_000, 5_000]
+
+
+def time_parse(program):
+    start = perf_counter_ns()
+    tree = SyntaxTree(program)
+    end = perf_counter_ns()
+    return len(tree.tokens), (end - start) / 1_000_000
+
+
+def long_program(length):
+    """A flat program of length repeated additions"""
+    return "3,4+" * (length // 4)
+
+
+def nested_program(depth):
+    """A program with thunk blocks nested to the given depth"""
+    return "µ" * depth + "3" + ")" * depth
+
+
+if __name__ == "__main__":
+    print('recursion limit', sys.getrecursionlimit())
+    for length in LENGTHS:
+        count, ms = time_parse(long_program(length))
+        print('length', length, count, 'tokens', round(ms, 1), 'ms', round(ms * 1000 / count, 2), 'us per token')
+    for depth in DEPTHS:
+        count, ms = time_parse(nested_program(depth))
+        print('depth', depth, count, 'tokens', round(ms, 1), 'ms', round(ms * 1000 / count, 2), 'us per token')
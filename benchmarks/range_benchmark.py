@@ -0,0 +1,45 @@
+# FBl337
+# Programming Code Golf Language
+# Created: 21 February 2024
+# Version: 21 February 2024 12:00PM
+# Copyright: James Leibert 2024
+# Licence: Available for use under the GPL3 Licence https://www.gnu.org/licenses/gpl-3.0.txt
+
+# range_benchmark.py
+# Benchmark: the time and peak memory of programs which make a large list with ⍳ or ‥ but only use part of it,
+# or reduce it. The lists are Ranges, so their values are not stored
+
+
+import gc
+import tracemalloc
+from time import perf_counter_ns
+
+from fb1337 import compile
+
+PROGRAMS = {
+    'sum': "ṁ⍳/+",
+    'prefix': "ḃ⍳↑10",
+    'count': "1,ṁ‥#",
+    'slice sum': "ṁ⍳[Ø1000Ø/+",
+    'maximum': "~ṁ⍳/⌈",
+    'loop': "ṁ⍳ ↓999990:_",
+}
+
+
+def measure(code):
+    """The time taken and the peak memory allocated while running the program"""
+    program = compile(code)
+    gc.collect()
+    tracemalloc.start()
+    start = perf_counter_ns()
+    program.run([])
+    end = perf_counter_ns()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return (end - start) / 1_000_000, peak
+
+
+if __name__ == "__main__":
+    for name, code in PROGRAMS.items():
+        ms, peak = measure(code)
+        print(name.ljust(10), code.ljust(14), round(ms, 1), 'ms', round(peak / 1_000_000, 2), 'MB peak')
@@ -0,0 +1,45 @@
+# FBl337
+# Programming Code Golf Language
+# Created: 21 February 2024
+# Version: 21 February 2024 12:00PM
+# Copyright: James Leibert 2024
+# Licence: Available for use under the GPL3 Licence https://www.gnu.org/licenses/gpl-3.0.txt
+
+# reduce_benchmark.py
+# Benchmark: reductions and scans (/ ∖ ⥆ ⥶ ⌿ ⥸) of large integer lists and grids.
+# When the fn parameter is a single command such as + the integers are folded without calling it,
+# so the times should be far below those of the same reduction by a lambda
+
+
+from time import perf_counter_ns
+
+from fb1337 import compile
+
+SIDE = 1000
+
+PROGRAMS = {
+    'range sum': "ṁ⍳/+",
+    'list sum': "ṁ⍳@1,1/+",
+    'list scan': "ṁ⍳@1,1∖+#",
+    'list fold r': "ṁ⍳@1,1⥆-",
+    'list lambda': "ṁ⍳@1,1/λ+)",
+    'big sum': "100000⍳¨µḃ×ḃ×)/+",
+    'column sum': str(SIDE * SIDE) + "⍳" + str(SIDE) + "," + str(SIDE) + "⍴⌿+#",
+    'row max': str(SIDE * SIDE) + "⍳" + str(SIDE) + "," + str(SIDE) + "⍴/⌈#",
+    'column scan': str(SIDE * SIDE) + "⍳" + str(SIDE) + "," + str(SIDE) + "⍴∖+#",
+    'grid sum': str(SIDE * SIDE) + "⍳" + str(SIDE) + "," + str(SIDE) + "⍴⥸+",
+    'column lambda': str(SIDE * SIDE) + "⍳" + str(SIDE) + "," + str(SIDE) + "⍴⌿λ+)#",
+}
+
+
+def measure(code):
+    program = compile(code)
+    start = perf_counter_ns()
+    result = program.run([])
+    return (perf_counter_ns() - start) / 1_000_000, result
+
+
+if __name__ == "__main__":
+    for name, code in PROGRAMS.items():
+        ms, result = measure(code)
+        print(name.ljust(14), code.ljust(24), str(result)[:24].ljust(26), round(ms, 1), 'ms')
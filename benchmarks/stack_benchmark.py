@@ -0,0 +1,49 @@
+# FBl337
+# Programming Code Golf Language
+# Created: 21 February 2024
+# Version: 21 February 2024 12:00PM
+# Copyright: James Leibert 2024
+# Licence: Available for use under the GPL3 Licence https://www.gnu.org/licenses/gpl-3.0.txt
+
+# stack_benchmark.py
+# Micro-benchmark: the cost of a pop should not depend on the depth of the stack
+
+
+from time import perf_counter_ns
+
+from fb1337.environment import Environment
+
+DEPTHS = [10, 100, 1_000, 10_000, 100_000, 1_000_000]
+OPERATIONS = 10_000
+
+
+def slicing_pop(stack):
+    """The previous implementation, which copied the stack on every pop"""
+    value, stack = stack[-1], stack[:-1]
+    return value, stack
+
+
+def time_pops(depth):
+    env = Environment()
+    env.push_many(range(depth + OPERATIONS))
+    start = perf_counter_ns()
+    for _ in range(OPERATIONS):
+        env.pop()
+    end = perf_counter_ns()
+    return (end - start) / OPERATIONS
+
+
+def time_slicing_pops(depth, operations=100):
+    stack = list(range(depth + operations))
+    start = perf_counter_ns()
+    for _ in range(operations):
+        _, stack = slicing_pop(stack)
+    end = perf_counter_ns()
+    return (end - start) / operations
+
+
+if __name__ == "__main__":
+    print('depth', 'pop ns', 'slicing pop ns', sep='\t')
+    for d in DEPTHS:
+        slicing = round(time_slicing_pops(d)) if d <= 100_000 else '-'
+        print(d, round(time_pops(d)), slicing, sep='\t')
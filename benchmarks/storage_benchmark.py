@@ -0,0 +1,52 @@
+# FBl337
+# Programming Code Golf Language
+# Created: 21 February 2024
+# Version: 21 February 2024 12:00PM
+# Copyright: James Leibert 2024
+# Licence: Available for use under the GPL3 Licence https://www.gnu.org/licenses/gpl-3.0.txt
+
+# storage_benchmark.py
+# Benchmark: structured array operations on integer grids of 10^3 to 10^6 values (10^7 with the argument 7).
+# Operations after the first use the buffer the array keeps (see storage.py)
+
+
+import sys
+from time import perf_counter_ns
+
+import fb1337  # loads the commands, which sets up the array types
+from fb1337.array import StructuredArray
+
+COLUMNS = 1000
+LOOKUPS = 1000
+
+
+def grid(size):
+    columns = min(size, COLUMNS)
+    return [[r * columns + c for c in range(columns)] for r in range(size // columns)]
+
+
+def timed(fn):
+    start = perf_counter_ns()
+    fn()
+    return (perf_counter_ns() - start) / 1_000_000
+
+
+def measure(size):
+    values = grid(size)
+    array = StructuredArray(values)
+    rows, columns = len(values), len(values[0])
+    return {
+        'flatten': timed(lambda: array.all_values()),
+        'reverse': timed(lambda: array.reverse_on_axis(-1)),
+        'lookup': timed(lambda: [array.select_index((i % rows, i % columns)) for i in range(LOOKUPS)]),
+        'take': timed(lambda: array.take(rows // 2)),
+        'map': timed(lambda: array.map(lambda x: x + 1)),
+    }
+
+
+if __name__ == "__main__":
+    largest = int(sys.argv[1]) if len(sys.argv) > 1 else 6
+    for exponent in range(3, largest + 1):
+        times = measure(10 ** exponent)
+        print(('10^' + str(exponent)).ljust(6), '  '.join([name + ' ' + str(round(ms, 1)) + ' ms'
+                                                          for name, ms in times.items()]))
@@ -0,0 +1,37 @@
+# FBl337
+# Programming Code Golf Language
+# Created: 21 February 2024
+# Version: 21 February 2024 12:00PM
+# Copyright: James Leibert 2024
+# Licence: Available for use under the GPL3 Licence https://www.gnu.org/licenses/gpl-3.0.txt
+
+# variable_benchmark.py
+# Benchmark: nested loops which read named variables, program parameters and loop values on every iteration
+
+
+from time import perf_counter_ns
+
+from fb1337 import compile
+
+SIZE = 60
+PROGRAMS = {
+    'named': "3→a 4→b 5→c " + str(SIZE) + ":" + str(SIZE) + ":$a$b+$c+◌;;",
+    'parameters': str(SIZE) + ":" + str(SIZE) + ":$1$2+➊+◌;;",
+    'loop values': str(SIZE) + ":" + str(SIZE) + ":_①+⓪+◌;;",
+    'nested lambda': "3→a " + str(SIZE) + ":" + str(SIZE) + ":µµ$a)⏎)⏎◌;;",
+}
+
+
+def time_program(code, backend):
+    program = compile(code, backend=backend)
+    start = perf_counter_ns()
+    program.run([1, 2])
+    end = perf_counter_ns()
+    return (end - start) / 1_000_000
+
+
+if __name__ == "__main__":
+    for name, code in PROGRAMS.items():
+        for backend in ['tree', 'closure', 'bytecode']:
+            ms = time_program(code, backend)
+            print(name.ljust(14), backend.ljust(9), round(ms, 1), 'ms', round(ms * 1000 / SIZE ** 2, 1), 'us per iteration')
@@ -0,0 +1,44 @@
+# FBl337
+# Programming Code Golf Language
+# Created: 21 February 2024
+# Version: 21 February 2024 12:00PM
+# Copyright: James Leibert 2024
+# Licence: Available for use under the GPL3 Licence https://www.gnu.org/licenses/gpl-3.0.txt
+
+# window_benchmark.py
+# Benchmark: ⧈ window and ⌺ stencil over square integer grids, for several grid sizes and window sizes.
+# A single command is reduced over strided views of the windows; a lambda is called for each window
+# Give a largest side as the argument to change the grid sizes
+
+
+import sys
+from time import perf_counter_ns
+
+from fb1337 import run
+
+SIDES = [10, 30, 100, 300, 1000]
+WINDOWS = [2, 3, 5]
+REDUCERS = ['+', '⌈', 'λ+)']
+
+
+def timed(code):
+    start = perf_counter_ns()
+    run(code, [], cache=False)
+    return (perf_counter_ns() - start) / 1_000_000
+
+
+def measure(side, window, command, reducer):
+    # The time to build the grid is measured separately and taken away
+    build = str(side * side) + '⍳' + str(side) + ',' + str(side) + '⍴'
+    return timed(build + command + str(window) + reducer + '#') - timed(build + '#')
+
+
+if __name__ == "__main__":
+    largest = int(sys.argv[1]) if len(sys.argv) > 1 else SIDES[-1]
+    for side in [side for side in SIDES if side <= largest]:
+        for window in WINDOWS:
+            times = [command + reducer + ' ' + str(round(measure(side, window, command, reducer), 1)) + ' ms'
+                     for command in '⧈⌺' for reducer in REDUCERS
+                     # Calling a lambda for each window of the largest grids takes too long to be useful
+                     if reducer[0] != 'λ' or side <= 300]
+            print((str(side) + '×' + str(side)).ljust(10), 'window', window, '  '.join(times))
@@ -0,0 +1,55 @@
+# FBl337
+# Programming Code Golf Language
+# Created: 21 February 2024
+# Version: 21 February 2024 12:00PM
+# Copyright: James Leibert 2024
+# Licence: Available for use under the GPL3 Licence https://www.gnu.org/licenses/gpl-3.0.txt
+
+# client.py
+# Thin client for a running fb1337 server (see fb1337/server.py)
+# This does not import fb1337, so sending a program to the server avoids the cost of loading the interpreter
+
+
+import json
+import os
+import socket
+import tempfile
+
+
+def default_socket_path():
+    """The socket used by the server and the client, which can be changed with the FB1337_SOCKET variable.
+    It is kept in a directory only the user can use: fb1337 in $XDG_RUNTIME_DIR, or fb1337-[uid] in the
+    temporary directory"""
+    if 'FB1337_SOCKET' in os.environ:
+        return os.environ['FB1337_SOCKET']
+    if 'XDG_RUNTIME_DIR' in os.environ:
+        directory = os.path.join(os.environ['XDG_RUNTIME_DIR'], 'fb1337')
+    else:
+        user = str(os.getuid()) if hasattr(os, 'getuid') else 'user'
+        directory = os.path.join(tempfile.gettempdir(), 'fb1337-' + user)
+    return os.path.join(directory, 'server.sock')
+
+
+def owned_by_user(path):
+    """True if the file belongs to the current user, so a socket made by another user is never trusted"""
+    try:
+        return not hasattr(os, 'getuid') or os.stat(path).st_uid == os.getuid()
+    except OSError:
+        return False
+
+
+def run_remote(code, parameters, name=None, path=None, backend='tree', cache=True, fold=True, socket_path=None):
+    """Send a program to the server and return its response, or None if no server of this user is running"""
+    if socket_path is None: socket_path = default_socket_path()
+    if not hasattr(socket, 'AF_UNIX') or not os.path.exists(socket_path) or not owned_by_user(socket_path):
+        return None
+    request = {'code': code, 'parameters': parameters, 'name': name, 'backend': backend, 'cache': cache, 'fold': fold,
+               'path': os.path.abspath(path) if path is not None else None}
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as connection:
+        try:
+            connection.connect(socket_path)
+        except OSError:
+            return None
+        connection.sendall((json.dumps(request) + '\n').encode('utf-8'))
+        with connection.makefile('r', encoding='utf-8') as responses:
+            return json.loads(responses.readline())
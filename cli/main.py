@@ -11,11 +11,38 @@
 
 import os
 import sys
+from ast import literal_eval
 
-from fb1337.fb1337 import run, run_annotated, run_interactive, test
+from client import default_socket_path, run_remote
 
 sys.setrecursionlimit(10000)
 
+
+def read_test_line(line):
+	"""Split a line of a test file into its name and the python values for its program, parameters and result.
+	The values are separated by spaces, but may also contain spaces, so each value is the shortest run of
+	space-separated words that is a valid python literal. Returns None if the line is not in this format"""
+	words = line.split(' ')
+	name, words = words[0], words[1:]
+	values = []
+	while len(words) > 0 and len(values) < 3:
+		if words[0] == '':
+			words = words[1:]
+			continue
+		for n in range(1, len(words) + 1):
+			try:
+				values.append(literal_eval(' '.join(words[:n])))
+				words = words[n:]
+				break
+			except (ValueError, SyntaxError):
+				pass
+		else:
+			return None
+	if len(values) < 3 or len([w for w in words if w != '']) > 0:
+		return None
+	return [name] + values
+
+
 if __name__ == "__main__":
 
 	arguments = sys.argv[1:]
@@ -25,35 +52,79 @@ if __name__ == "__main__":
 		print("version 1.0")
 		print("Usage:")
 		print("fb1337 -h                print this help information")
-		print("fb1337 -t [name]         perform examples in a test file")
+		print("fb1337 -t (-j [n])(-to [seconds]) [name] perform examples in a test file")
+		print("                         -j share the tests out over n worker processes")
+		print("                         -to fail any test which runs for more than [seconds]")
 		print("                         Rows should contain: ")
 		print("                             [name] in text")
 		print("                             [program] as a python string")
 		print("                             [parameters] as a python list")
 		print("                             [result] as a python list")
-		print("fb1337 (-d)(-i) (-c [code] | [filename]) ([parameter ...])")
+		print("fb1337 serve (-j [n])(-n [jobs])(-to [seconds])(-stdio)")
+		print("                         run a server with n warm worker processes, which each run up to")
+		print("                         [jobs] programs, each for up to [seconds]. Requests are JSON lines")
+		print("                         read from a Unix socket, or from stdin with -stdio. The timeout")
+		print("                         cannot stop a single long call into C code (e.g. a huge power)")
+		print("fb1337 (-d)(-i)(-l)(-nc)(-nf)(-b [backend])(-p)(-pj [file]) (-c [code] | [filename]) ([parameter ...])")
 		print("                         -d provide program annotations")
 		print("                         -i run in interactive mode")
+		print("                         -l run in this process even if a server is running (see serve)")
+		print("                         -nc (or --no-cache) do not use the cache of parsed programs")
+		print("                         -nf do not work out constant expressions before running")
 		print("                         -c provide program code as a python string")
+		print("                         -b select the backend: tree (default), closure (fastest) or bytecode")
+		print("                         -p print a profile of the time spent in each command")
+		print("                         -pj save the raw profile data to a JSON file")
 
 	elif arguments[0] == '-t':
 		# Run a test suite from a file
-		program_name = arguments[2]
-		test_suite = dict()
+		arguments = arguments[1:]
+		workers, timeout = None, None
+		while len(arguments) > 1 and arguments[0] in ('-j', '-to'):
+			if arguments[0] == '-j':
+				workers, arguments = int(arguments[1]), arguments[2:]
+			else:
+				timeout, arguments = float(arguments[1]), arguments[2:]
+		if len(arguments) == 0 or not os.path.isfile(arguments[0]):
+			print("File not found", arguments[0] if len(arguments) > 0 else '')
+			exit()
+		program_name = arguments[0]
+		test_suite = []
 		with open(program_name, 'r') as file:
-			if file is None:
-				print("File not found", program_name)
-				exit()
-			tests = file.readlines()
-			for test in tests:
-				items = test.split(' ')
-				items = [t.strip("/n/r/t ") for t in items]
-				if len(items) > 2:
-					test_suite[items[0]] = {'code': items[1], 'parameters': items[2], 'expected': items[3]}
-				else:
-					print("test_suite not in correct format")
+			for line in file.readlines():
+				line = line.strip(" \n\r\t")
+				if len(line) == 0:
+					continue
+				items = read_test_line(line)
+				if items is None:
+					print("test_suite not in correct format", line)
 					exit()
-			test(test_suite)
+				name, code, parameters, expected = items
+				test_suite.append({'name': name, 'code': code, 'parameters': parameters, 'result': expected})
+		from fb1337.fb1337 import test
+		test(test_suite, path=os.path.abspath(program_name), workers=workers, timeout=timeout)
+
+	elif arguments[0] == 'serve':
+		# Run a server with a pool of warm interpreters
+		from fb1337.server import Server
+		arguments = arguments[1:]
+		workers, jobs, timeout, stdio = None, 1000, None, False
+		while len(arguments) > 0:
+			arg, arguments = arguments[0], arguments[1:]
+			if arg == '-j' and len(arguments) > 0:
+				workers, arguments = int(arguments[0]), arguments[1:]
+			elif arg == '-n' and len(arguments) > 0:
+				jobs, arguments = int(arguments[0]), arguments[1:]
+			elif arg == '-to' and len(arguments) > 0:
+				timeout, arguments = float(arguments[0]), arguments[1:]
+			elif arg == '-stdio':
+				stdio = True
+		server = Server(workers=workers, timeout=timeout, jobs_per_worker=jobs)
+		if stdio:
+			server.serve_stdio()
+		else:
+			server.serve_socket(default_socket_path())
+		server.close()
 
 	else:
 		# Run a program
@@ -63,6 +134,12 @@ if __name__ == "__main__":
 		program = None
 		name = None
 		parameters = []
+		backend = 'tree'
+		profile = False
+		profile_json = None
+		local = False
+		cache = True
+		fold = True
 
 		# Parse options and parameters
 		while len(arguments) > 0:
@@ -76,10 +153,28 @@ if __name__ == "__main__":
 				elif option == 'i':
 					# Run in interactive mode
 					interactive = True
+				elif option == 'l':
+					# Do not use a running server
+					local = True
+				elif option == 'nc' or option == '-no-cache':
+					# Always parse the program
+					cache = False
+				elif option == 'nf':
+					# Do not fold constants
+					fold = False
 				elif option == 'c' and len(arguments) > 0:
 					# Run a program directly from the command line
 					program, arguments = arguments[0], arguments[1:]
 					name = None
+				elif option == 'b' and len(arguments) > 0:
+					# Select the backend used to run the program
+					backend, arguments = arguments[0], arguments[1:]
+				elif option == 'p':
+					# Profile the program
+					profile = True
+				elif option == 'pj' and len(arguments) > 0:
+					# Save the profile data as JSON
+					profile_json, arguments = arguments[0], arguments[1:]
 			else:
 				if program is None:
 					# If we receive a filename before getting a -c argument, we read the code from a file
@@ -94,13 +189,29 @@ if __name__ == "__main__":
 					# Any other non-option values are assumed to be arguments
 					parameters.append(arg)
 
-		if not debug and not interactive:
+		response = None
+		if not debug and not interactive and not profile and profile_json is None and not local:
+			# Send the program to the server, if one of this user is running
+			response = run_remote(program, parameters, name=name, backend=backend, cache=cache, fold=fold)
+		if response is not None:
+			print(response['output'], end='')
+			if response['error'] is not None:
+				print(response['error'], file=sys.stderr)
+				exit(1)
+			result = response['text']
+		elif not debug and not interactive:
 			# Run in quiet mode
-			result = run(commented_code=program, parameters=parameters, name=name)
+			from fb1337.fb1337 import run
+			result = run(commented_code=program, parameters=parameters, name=name, backend=backend, profile=profile,
+			             profile_json=profile_json, cache=cache, fold=fold)
 		elif not interactive:
 			# Run in annotated mode
-			result = run_annotated(commented_code=program, parameters=parameters, name=name, title=name, expected=None)
+			from fb1337.fb1337 import run_annotated
+			result = run_annotated(commented_code=program, parameters=parameters, name=name, title=name, expected=None,
+			                       backend=backend, profile=profile, profile_json=profile_json, cache=cache,
+			                       fold=fold)
 		else:
 			# Run in interactive mode
+			from fb1337.fb1337 import run_interactive
 			result = run_interactive(commented_code=program, parameters=parameters)
 		print(result)
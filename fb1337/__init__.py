@@ -8,4 +8,4 @@
 # __init__.py
 # Module Initialisation
 
-from .fb1337 import run, run_annotated, run_interactive, test, interactive_from_test_suite
+from .fb1337 import run, run_annotated, run_interactive, test, interactive_from_test_suite, compile, CompiledProgram
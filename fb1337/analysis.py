@@ -0,0 +1,219 @@
+# FBl337
+# Programming Code Golf Language
+# Created: 21 February 2024
+# Version: 21 February 2024 12:00PM
+# Copyright: James Leibert 2024
+# Licence: Available for use under the GPL3 Licence https://www.gnu.org/licenses/gpl-3.0.txt
+
+# analysis.py
+# Static analysis: the stack depth and parameter types at each token, worked out before the program runs
+
+
+from fb1337.dispatch import InlineCache
+from fb1337.environment import address
+from fb1337.optimizer import command_groups, FOLDABLE_GROUPS, UNFOLDABLE_SYMBOLS
+from fb1337.type_utilities import parameter_match
+
+# Stack commands move their parameters back onto the stack in a fixed order (positions in the parameters)
+STACK_EFFECTS = {'◌': (), '⊢': (0,), '⊣': (1, 0), '⊩': (0, 0), '⫣': (0, 1, 0), '∂': (0, 0), 'ð': (0, 1, 0, 1),
+                 '«': (1, 0), '⨩': (0, 1, 0), 'ḋ': (0, 0, 1), '®': (1, 2, 0)}
+
+# The type of the result of these commands when they are given integers (or booleans)
+INTEGER_RESULTS = {symbol: int for symbol in '~+×-÷%⩲²√⊛±⨸⩓⩔!‼⌈⌊'}
+INTEGER_RESULTS.update({symbol: bool for symbol in '‰‱|=≠<≤>≥'})
+_representatives = {int: 0, bool: False}
+
+# Commands which look up or assign the name given as their code parameter
+NAME_COMMANDS = {'$', '£', '→'}
+
+
+def _function_parameter(e):
+	# Function and block parameters are always Python functions, so this stands in for them
+	return None
+
+
+class StackUnderflow:
+	"""A command which will take more values than the stack can hold when it is reached.
+	Missing values are passed to the command as None: accepted is False if none of its patterns allow this"""
+
+	__slots__ = ('symbol', 'code_location', 'needed', 'available', 'accepted')
+
+	def __init__(self, symbol, code_location, needed, available, accepted):
+		self.symbol = symbol
+		self.code_location = code_location
+		self.needed = needed
+		self.available = available
+		self.accepted = accepted
+
+	def __repr__(self):
+		return self.symbol + ' at ' + str(self.code_location[0]) + ' takes ' + str(self.needed) + \
+			' stack values but the stack holds ' + str(self.available) + \
+			(' (the missing values are read as null)' if self.accepted else ' (no pattern accepts missing values)')
+
+
+class _Entry:
+	# A value on the stack. When known is set, value is the value itself or one of the same type which
+	# stands in for it. When maybe is set, the command which pushed it may not have pushed anything
+	__slots__ = ('value', 'known', 'maybe')
+
+	def __init__(self, value=None, known=False, maybe=False):
+		self.value = value
+		self.known = known
+		self.maybe = maybe
+
+
+_MISSING = _Entry(None, True)  # Taken from an empty stack
+_UNCERTAIN = _Entry(maybe=True)  # Taken from a stack whose contents are not known
+
+
+class StackAnalysis:
+	"""Follows the values on the stack through each block without running the program.
+	The top level starts with an empty stack; blocks and function parameters start with an unknown stack.
+	Values pushed by value tokens are known exactly, as are the results of the stack commands and the type
+	of the results of integer arithmetic. Other commands without side effects push one unknown value
+	(or nothing, if they return None), and commands which run code or use the whole stack leave it unknown.
+	For each token, depths holds the (least, greatest) number of values on the stack before it runs
+	(greatest is None when there is no limit) and types the names of the types of its parameters ('?' if not
+	known), indexed by token index.
+	Names given as constants to the lookup and assign commands are resolved to their addresses (see environment.py).
+	A call site where the types of all the parameters are known is monomorphic: the matching command pattern is
+	found now and put in the token's inline cache, so its first call does not search the patterns.
+	Commands which will certainly take more values than there are on the stack are listed in underflows"""
+
+	def __init__(self, program):
+		self.program = program
+		self.depths = dict()
+		self.types = dict()
+		self.underflows = []
+		self.selected = 0
+		self.entries = []
+		self.closed = True  # Whether the entries are the whole stack
+
+	def analyse(self, syntax_tree):
+		tree = syntax_tree.tree
+		self._analyse_block(tree if type(tree) is list else [tree], True)
+		for token in syntax_tree.tokens:
+			if token.sub_tree is not None:
+				self._analyse_block(token.sub_tree, False)
+			for fn_token in token.fn_tokens:
+				self._analyse_block([fn_token], False)
+		return self
+
+	def _analyse_block(self, block, closed):
+		self.entries = []
+		self.closed = closed
+		if len(block) > 0 and type(block[0]) is list:
+			# Several context blocks share one stack, so they are followed one after the other
+			block = [token for context in block for token in context]
+		work = [('enter', token, None) for token in reversed(block)]
+
+		while len(work) > 0:
+			step, token, parameters = work.pop()
+			if step == 'enter':
+				if token.token_type == 'end block' or token.value == ';':
+					continue
+				self.depths[token.index] = self._depth()
+				if token.token_type == 'value':
+					self.entries.append(_Entry(token.value, True))
+					continue
+				# The stack parameters are taken first, then each code parameter is run and its value taken
+				parameters = self._pop(token, token.stack_values)
+				work.append(('call', token, parameters))
+				for code_token in reversed(token.code_tokens):
+					work.append(('code', token, parameters))
+					work.append(('enter', code_token, None))
+			elif step == 'code':
+				parameters.extend(self._pop(None, 1))
+			else:
+				self._call(token, parameters)
+
+	def _depth(self):
+		least = len([entry for entry in self.entries if not entry.maybe])
+		return least, len(self.entries) if self.closed else None
+
+	def _reset(self):
+		self.entries = []
+		self.closed = False
+
+	def _pop(self, token, n):
+		entries = self.entries
+		if n <= 0:
+			return []
+		if any([entry.maybe for entry in entries[-n:]]):
+			# The stack no longer holds values at known places
+			self._reset()
+			return [_UNCERTAIN] * n
+		available = min(n, len(entries))
+		taken = entries[len(entries) - available:]
+		del entries[len(entries) - available:]
+		if available == n:
+			return taken
+		if not self.closed:
+			return [_UNCERTAIN] * (n - available) + taken
+		if token is not None:
+			self._underflow(token, n, available)
+		return [_MISSING] * (n - available) + taken
+
+	def _underflow(self, token, needed, available):
+		patterns = self.program.commands.symbol_lookup[token.value]['patterns']
+		accepted = any([all([parameter_match([None], (t,)) for t in pattern['signature'][:needed - available]])
+		                for pattern in patterns])
+		self.underflows.append(StackUnderflow(token.value, token.code_location, needed, available, accepted))
+
+	def _call(self, token, parameters):
+		symbol = token.value
+		self.types[token.index] = tuple([type(entry.value).__name__ if entry.known else '?' for entry in parameters])
+		monomorphic = all([entry.known for entry in parameters])
+		if monomorphic:
+			self._select(token, [entry.value for entry in parameters])
+		if symbol in NAME_COMMANDS:
+			self._resolve(parameters[token.stack_values:])
+
+		if len(token.fn_tokens) > 0 or token.sub_tree is not None:
+			# Code run by the command may change the stack
+			self._reset()
+		elif symbol in STACK_EFFECTS and len(token.code_tokens) == 0:
+			# None is never pushed, so values missing from the stack stay missing
+			self.entries.extend([parameters[i] for i in STACK_EFFECTS[symbol] if parameters[i] is not _MISSING])
+		elif command_groups.get(symbol) in FOLDABLE_GROUPS and symbol not in UNFOLDABLE_SYMBOLS:
+			result = INTEGER_RESULTS.get(symbol)
+			if monomorphic and result is not None and all([type(entry.value) in _representatives
+			                                                 for entry in parameters]):
+				self.entries.append(_Entry(_representatives[result], True))
+			else:
+				self.entries.append(_Entry(maybe=True))
+		else:
+			self._reset()
+
+	@staticmethod
+	def _resolve(parameters):
+		"""Work out the address of each name given as a constant, so it is ready when the program runs"""
+		for entry in parameters:
+			if entry.known and type(entry.value) in (str, int):
+				try:
+					address(entry.value)
+				except (IndexError, ValueError):
+					# Not a valid name: the lookup will fail when it is run
+					pass
+
+	def _select(self, token, values):
+		"""Find the command pattern for a monomorphic call site and put it in the token's inline cache"""
+		program = self.program
+		if token.inline_cache is not None or token.value not in program.commands.symbol_lookup:
+			return
+		parameters = values + [_function_parameter] * (len(token.fn_tokens) + (token.sub_tree is not None))
+		patterns = program.commands.symbol_lookup[token.value]['patterns']
+		cache = InlineCache(program.commands, token.value)
+		key = cache.key(parameters)
+		if key is None or not any([parameter_match(parameters, pattern['signature']) for pattern in patterns]):
+			return
+		stack_parameters = parameters[:token.stack_values]
+		code_parameters = parameters[token.stack_values:len(values)]
+		fn_parameters = parameters[len(values):len(values) + len(token.fn_tokens)]
+		block_parameters = parameters[len(values) + len(token.fn_tokens):]
+		match = program.commands.match_command(token.value, stack_parameters, code_parameters, fn_parameters,
+		                                       block_parameters)
+		cache.store(key, parameters, match)
+		token.inline_cache = cache
+		program.inline_caches.append(cache)
+		self.selected += 1
@@ -10,12 +10,24 @@
 
 from functools import reduce
 from itertools import accumulate, chain, count
-from math import sqrt
-from operator import add, mul
+from math import prod, sqrt
+from operator import add, mul, sub
 
 import numpy as np
 from math import isqrt
 
+from fb1337 import storage
+
+# The types which hold nested structure
+_CONTAINERS = {list, tuple, np.ndarray}
+
+# What each of these commands does to two integers, so a fold of integers by a fn parameter which is just the
+# command (see Program._call) can be run without calling it. Each fold of a whole list has a builtin which does it
+BUILTIN_FOLDS = {'+': add, '×': mul, '⌈': max, '⌊': min, '-': sub, '∧': lambda a, b: a and b,
+                 '∨': lambda a, b: a or b}
+_BUILTIN_TOTALS = {'+': sum, '×': prod, '⌈': max, '⌊': min, '-': lambda v: v[0] - sum(v[1:]),
+                   '∧': lambda v: 0 if 0 in v else v[-1], '∨': lambda v: next((x for x in v if x != 0), 0)}
+
 
 class Array:
 
@@ -70,7 +82,7 @@ class Array:
 
 	@staticmethod
 	def container(x):
-		return type(x) in (list, tuple, np.ndarray)
+		return type(x) in _CONTAINERS
 
 	@staticmethod
 	def number(x):
@@ -83,12 +95,13 @@ class Array:
 		if isinstance(array, FlatList):
 			values = array.iterable()
 			array_type = [isinstance(v, Array) for v in values]
+			# The lists of flat lists can be changed in place, so the structured array is given copies
 			if all(array_type):
-				return StructuredArray([x.structured_values() for x in values])
+				return StructuredArray([list(x.values) if isinstance(x, FlatList) else x.structured_values() for x in values])
 			elif all([not v for v in array_type]):
 				return StructuredArray([0 if x == '' else x for x in values])
 			else:
-				return StructuredArray(values)
+				return StructuredArray(list(values))
 		elif isinstance(array, Coordinate):
 			return StructuredArray([x for x in array.iterable()])
 		else:
@@ -117,6 +130,10 @@ class Array:
 
 	# Methods that do not alter the array
 
+	def buffer(self):
+		"""The values held in a NumPy buffer (see storage.py), or None. Only structured arrays hold one"""
+		return None
+
 	def count(self, axis=-1):
 		if self.is_structured():
 			shape = self.get_shape()
@@ -229,9 +246,9 @@ class Array:
 				return self
 		elif isinstance(obj, Array) and len(self.iterable()) == len(obj.iterable()):
 			if start:
-				return StructuredArray([obj.iterable(), self.iterable()])
+				return StructuredArray([list(obj.iterable()), list(self.iterable())])
 			else:
-				return StructuredArray([self.iterable(), obj.iterable()])
+				return StructuredArray([list(self.iterable()), list(obj.iterable())])
 		elif isinstance(self, FlatList) and isinstance(obj, FlatList):
 			return FlatList([self.iterable(), obj.iterable()])
 		elif not self.is_structured() and isinstance(obj, Array) and not obj.is_structured():
@@ -306,7 +323,7 @@ class Array:
 			structured = Array.promote(self)
 		else:
 			structured = self
-		return StructuredArray(StructuredArray.permute_axes(structured.structured_values()))
+		return StructuredArray(StructuredArray.permute_axes(structured.structured_values(), None, structured.buffer()))
 
 	def reverse_on_axis(self, axis):
 		if not self.is_structured():
@@ -465,23 +482,36 @@ class Array:
 	def window(self, window_size, reduce_fn, edges=False):
 		shape = self.get_shape()
 
+		# Integer arrays reduced by a single command are reduced in NumPy, over strided views of the windows
+		symbol = getattr(reduce_fn, 'symbol', None)
+		if symbol in storage.WINDOW_PADDING:
+			buffer = self.buffer()
+			if buffer is None:
+				buffer = storage.from_values(self.all_values(), shape)
+			reduced = None if buffer is None else storage.window_reduce(buffer, window_size, symbol, edges)
+			if reduced is not None and self.is_structured():
+				return StructuredArray.from_buffer(reduced)
+			elif reduced is not None:
+				return self.build(storage.flat(reduced))
+
 		window_shape = [window_size for _ in shape]
 		window_relative = [win_rel_coord for win_rel_coord in StructuredArray.all_indices(window_shape)]
-		valid_coordinates = [array_coord for array_coord in StructuredArray.all_indices(shape)]
+		# The flat index of each cell of the window, relative to the flat index of its corner
+		window_offsets = [StructuredArray.flat_index_for_coordinate(w, shape) for w in window_relative]
 
 		all_values = self.all_values()
 
 		new_values = []
-		for index in valid_coordinates:
+		for index in StructuredArray.all_indices(shape):
 			window_corner = [c - (w - 1) // 2 for c, w in zip(index, window_shape)]
-			window_coordinates = [tuple([c + w for c, w in zip(window_corner, window_relative_coord)])
-			                      for window_relative_coord in window_relative]
-			if not edges and all([w in valid_coordinates for w in window_coordinates]):
-				values = [all_values[StructuredArray.flat_index_for_coordinate(c, shape)] for c in window_coordinates]
+			corner_index = StructuredArray.flat_index_for_coordinate(window_corner, shape)
+			inside = all([0 <= c and c + w <= s for c, w, s in zip(window_corner, window_shape, shape)])
+			if not edges and inside:
+				values = [all_values[corner_index + offset] for offset in window_offsets]
 				new_values.append(StructuredArray.reduce_struc(values, reduce_fn)[-1])
 			elif edges:
-				valid_window_coordinates = [w for w in window_coordinates if w in valid_coordinates]
-				values = [all_values[StructuredArray.flat_index_for_coordinate(c, shape)] for c in valid_window_coordinates]
+				values = [all_values[corner_index + offset] for w, offset in zip(window_relative, window_offsets)
+				          if all([0 <= c + r < s for c, r, s in zip(window_corner, w, shape)])]
 				if len(values) == 0:
 					new_values.append(self.default)
 				else:
@@ -502,7 +532,7 @@ class Array:
 		if axis == 0:
 			return self.build(self.structured_values()[n])
 		else:
-			return self.build(StructuredArray.promote_axis(self.structured_values(), axis)[n])
+			return self.build(StructuredArray.promote_axis(self.structured_values(), axis, self.buffer())[n])
 
 	# Selection indices / boolean mask conversions
 
@@ -567,7 +597,7 @@ class Array:
 		shape = self.get_shape()
 		if axis < 0: axis = len(shape) + axis
 		if self.is_structured():
-			s_struc = StructuredArray.promote_axis(self.structured_values(), axis)
+			s_struc = StructuredArray.promote_axis(self.structured_values(), axis, self.buffer())
 		else:
 			s_struc = self.iterable()
 		if len(shape) > 1 and self.is_structured():
@@ -599,15 +629,17 @@ class Array:
 			return self.build([fn(x) for x in self.iterable()])
 
 	def map_on_axis(self, fn, axis=-1):
+		buffer = None
 		if self.is_structured():
 			struc = self.structured_values()
+			buffer = self.buffer()
 		elif all([isinstance(x, Array) for x in self.values]):
 			struc = [x.structured_values() for x in self.values]
 		else:
 			struc = self.structured_values()
 		if axis < 0: axis = len(self.get_shape()) + axis
 		if axis != 0:
-			struc = StructuredArray.promote_axis(struc, axis)
+			struc = StructuredArray.promote_axis(struc, axis, buffer)
 		result_struc = []
 		for x in struc:
 			row_val = fn(self.build(x))
@@ -771,15 +803,16 @@ class FlatList(Array):
 	@classmethod
 	def int_list(cls, a, b=None):
 		"""Create a list of integers from a..b or b..a.
-		If only one value is provided, the list starts/ends at 1."""
+		If only one value is provided, the list starts/ends at 1.
+		The list is a Range, so its values are not stored until they are needed."""
 		if b is None and a > 0:
-			return cls(list(range(1, a + 1, 1)))
+			return Range(range(1, a + 1, 1))
 		elif b is None and a < 0:
-			return cls(list(range(-a, 0, -1)))
+			return Range(range(-a, 0, -1))
 		elif a > b:
-			return cls(list(range(a, b - 1, -1)))
+			return Range(range(a, b - 1, -1))
 		else:
-			return cls(list(range(a, b + 1, 1)))
+			return Range(range(a, b + 1, 1))
 
 	@classmethod
 	def to_ch_list(cls, x):
@@ -829,6 +862,9 @@ class FlatList(Array):
 
 	@staticmethod
 	def flat_reduce(values, fn, reverse, partial_sums):
+		folded = FlatList.builtin_fold(values, fn, reverse, partial_sums)
+		if folded is not None:
+			return folded
 		if len(values) < 2:
 			accumulated = [values[0]]
 		elif reverse:
@@ -849,6 +885,25 @@ class FlatList(Array):
 		else:
 			return accumulated[-1]
 
+	@staticmethod
+	def builtin_fold(values, fn, reverse, partial_sums):
+		"""Fold a list of integers as flat_reduce would, without calling fn, when it is a command in BUILTIN_FOLDS.
+		Returns None for any other function or values"""
+		symbol = getattr(fn, 'symbol', None)
+		if symbol not in BUILTIN_FOLDS or len(values) < 2 or set(map(type, values)) != {int}:
+			return None
+		operation = BUILTIN_FOLDS[symbol]
+		if partial_sums and reverse:
+			# Folding from the right is folding the reversed list from the left, giving each value first
+			return StructuredArray(list(accumulate(reversed(values), lambda a, b: operation(b, a)))[::-1])
+		elif partial_sums:
+			return StructuredArray(list(accumulate(values, operation)))
+		elif reverse and symbol == '-':
+			return sum(values[0::2]) - sum(values[1::2])
+		else:
+			# The others give the same result when they are folded from the right
+			return _BUILTIN_TOTALS[symbol](values)
+
 	@staticmethod
 	def flat_reduce_r(values, fn):
 		if len(values) < 2:
@@ -875,13 +930,134 @@ class FlatList(Array):
 		return '<FlatList | ' + ' | '.join([str(s) for s in self.values]) + ' | >'
 
 
+class Range(FlatList):
+	"""A flat list of evenly spaced integers, as made by ⍳ and ‥, held as a Python range.
+	The values are only stored when something needs the list itself: counting, indexing, taking, dropping,
+	slicing and iterating use the range, and reductions by +, ×, ⌈, ⌊ and - are worked out without
+	visiting each value. Once the values have been stored they may be changed in place, so from then on
+	the Range behaves as an ordinary FlatList"""
+
+	# Reductions which can be worked out from the range, for fn parameters that are a single command.
+	# Each takes a range holding at least one value
+	CLOSED_FORMS = {
+		'+': lambda r: len(r) * (r[0] + r[-1]) // 2,
+		'×': lambda r: 0 if 0 in r else prod(r),
+		'⌈': lambda r: max(r[0], r[-1]),
+		'⌊': lambda r: min(r[0], r[-1]),
+		'-': lambda r: 2 * r[0] - len(r) * (r[0] + r[-1]) // 2,
+	}
+	# Longer ranges which do not hold 0 are only multiplied once their values are stored
+	PRODUCT_LIMIT = 10_000
+
+	def __init__(self, span, default=0):
+		self.span = span
+		self._values = None
+		super(Range, self).__init__(None, default)
+
+	@property
+	def values(self):
+		if self._values is None:
+			self._values = list(self.span)
+		return self._values
+
+	@values.setter
+	def values(self, values):
+		self._values = values
+
+	def is_lazy(self):
+		"""True until the values have been stored"""
+		return self._values is None
+
+	# Overrides which use the range while the values have not been stored
+
+	def get_shape(self):
+		if self._values is None:
+			return len(self.span),
+		return super(Range, self).get_shape()
+
+	def count(self, axis=-1):
+		if self._values is None:
+			return len(self.span)
+		return super(Range, self).count(axis)
+
+	def take(self, n):
+		if self._values is None:
+			return Range(self.span[:n])
+		return super(Range, self).take(n)
+
+	def drop(self, n):
+		if self._values is None:
+			return Range(self.span[n:])
+		return super(Range, self).drop(n)
+
+	def slice(self, slice_obj):
+		if self._values is None:
+			return Range(self.span[slice_obj.start_value:slice_obj.stop_value:slice_obj.step_value])
+		return super(Range, self).slice(slice_obj)
+
+	def select_index(self, index):
+		if self._values is None:
+			flat_index = StructuredArray.flat_index_for_coordinate(index, self.get_shape())
+			return self.span[flat_index] if 0 <= flat_index < len(self.span) else ''
+		return super(Range, self).select_index(index)
+
+	def reduce(self, fn, axis, reverse=False, partial_sums=False):
+		if self._values is None:
+			return self._reduce_span(fn, reverse, partial_sums)
+		return super(Range, self).reduce(fn, axis, reverse, partial_sums)
+
+	def reduce_all(self, fn, reverse=False, partial_sums=False):
+		if self._values is None:
+			return self._reduce_span(fn, reverse, partial_sums)
+		return super(Range, self).reduce_all(fn, reverse, partial_sums)
+
+	def _reduce_span(self, fn, reverse, partial_sums):
+		span = self.span
+		symbol = getattr(fn, 'symbol', None)
+		if symbol == '×' and len(span) > Range.PRODUCT_LIMIT and 0 not in span:
+			# The product is too large to work out without storing the values, as any other list would
+			return FlatList.flat_reduce(self.values, fn, reverse, partial_sums)
+		# - is the only one of these which gives a different result when reduced from the right
+		if not partial_sums and len(span) > 0 and symbol in Range.CLOSED_FORMS and not (reverse and symbol == '-'):
+			return Range.CLOSED_FORMS[symbol](span)
+		# A range can be indexed and sliced like a list, so it is reduced without storing the values.
+		# Reducing from the right joins the partial results into a list, so it needs one
+		return FlatList.flat_reduce(list(span) if reverse else span, fn, reverse, partial_sums)
+
+	def __repr__(self):
+		if self._values is None:
+			return '<Range | ' + str(self.span.start) + ' .. ' + str(self.span.stop) + ' by ' + \
+				str(self.span.step) + ' | >'
+		return super(Range, self).__repr__()
+
+
 class StructuredArray(Array):
-	def __init__(self, structured_values, default=0):
+	"""A rectangular array held as nested lists. When the values are needed as a whole, they are also held in
+	a buffer (see storage.py), which is kept until the values are changed. The nested lists are never changed
+	in place, so the buffer always holds the same values as the lists"""
+
+	def __init__(self, structured_values, default=0, shape=None):
+		"""The shape is worked out from the nested lists, unless it is already known and given"""
 		super(StructuredArray, self).__init__()
 
-		self.values = structured_values
-		self.shape = StructuredArray.shape_of_structured(structured_values)
 		self.default = default
+		self.mutate(structured_values, shape)
+
+	@classmethod
+	def from_buffer(cls, buffer, default=0):
+		"""A structured array holding the values of a buffer, which it keeps"""
+		if buffer.size == 0:
+			return cls(storage.structured(buffer), default)
+		array = cls(storage.structured(buffer), default, buffer.shape)
+		array._buffer = buffer
+		return array
+
+	def buffer(self):
+		"""The values held in a buffer, or None if the nested lists are not rectangular"""
+		if self._buffer is None:
+			buffer = storage.to_buffer(self.values, self.shape)
+			self._buffer = False if buffer is None else buffer
+		return None if self._buffer is False else self._buffer
 
 	# Required implementations
 
@@ -895,18 +1071,27 @@ class StructuredArray(Array):
 		return self.values
 
 	def iterable(self):
-		return StructuredArray.flatten_structured(self.values)
+		return self.all_values()
 
 	def all_values(self):
+		buffer = self.buffer()
+		if buffer is not None:
+			return storage.flat(buffer)
 		return StructuredArray.flatten_structured(self.values)
 
-	def mutate(self, structured_values):
+	def mutate(self, structured_values, shape=None):
 		self.values = structured_values
-		self.shape = StructuredArray.shape_of_structured(structured_values)
+		if shape is None:
+			self.shape, rectangular = StructuredArray.measure_structured(structured_values)
+			# Ragged lists cannot be held in a buffer, so none is made
+			self._buffer = None if rectangular else False
+		else:
+			self.shape = tuple(shape)
+			self._buffer = None
 		return self
 
-	def build(self, structured_values):
-		return StructuredArray(structured_values, self.default)
+	def build(self, structured_values, shape=None):
+		return StructuredArray(structured_values, self.default, shape)
 
 	# Overrides of default implementation
 
@@ -915,8 +1100,83 @@ class StructuredArray(Array):
 		self.values = new_struc
 		self.shape = shape
 		self.default = 0
+		self._buffer = None
 		return self
 
+	# These use the buffer when the array is rectangular
+
+	def take(self, n):
+		buffer = self.buffer()
+		if buffer is None or buffer.ndim == 0:
+			return super(StructuredArray, self).take(n)
+		return StructuredArray.from_buffer(buffer[:n], self.default)
+
+	def drop(self, n):
+		buffer = self.buffer()
+		if buffer is None or buffer.ndim == 0:
+			return super(StructuredArray, self).drop(n)
+		return StructuredArray.from_buffer(buffer[n:], self.default)
+
+	def reverse_on_axis(self, axis):
+		buffer = self.buffer()
+		if buffer is None or not -buffer.ndim <= axis < buffer.ndim:
+			return super(StructuredArray, self).reverse_on_axis(axis)
+		return StructuredArray.from_buffer(np.flip(buffer, axis), self.default)
+
+	def rotate_on_axis(self, axis, n):
+		buffer = self.buffer()
+		if buffer is None or not -buffer.ndim <= axis < buffer.ndim:
+			return super(StructuredArray, self).rotate_on_axis(axis, n)
+		# Rotating by the length of the axis or more leaves the array as it is
+		length = buffer.shape[axis]
+		rotated = np.roll(buffer, n if -length < n < length else 0, axis)
+		return StructuredArray.from_buffer(rotated, self.default).reshape(self.shape)
+
+	def shift_on_axis(self, axis, n):
+		buffer = self.buffer()
+		if buffer is None or n not in (1, -1) or not -buffer.ndim <= axis < buffer.ndim:
+			return super(StructuredArray, self).shift_on_axis(axis, n)
+		shifted = np.empty(buffer.shape, dtype=object)
+		source, target = np.moveaxis(buffer, axis, 0), np.moveaxis(shifted, axis, 0)
+		if n > 0:
+			target[0], target[1:] = self.default, source[:-1]
+		else:
+			target[-1], target[:-1] = self.default, source[1:]
+		return StructuredArray.from_buffer(shifted, self.default).reshape(self.shape)
+
+	def select_index(self, index):
+		buffer = self.buffer()
+		if buffer is None:
+			return super(StructuredArray, self).select_index(index)
+		flat_index = StructuredArray.flat_index_for_coordinate(index, self.shape)
+		return storage.item(buffer, flat_index) if 0 <= flat_index < buffer.size else ''
+
+	def map(self, fn):
+		buffer = self.buffer()
+		if buffer is None or buffer.ndim == 0:
+			return super(StructuredArray, self).map(fn)
+		values = [fn(x) for x in storage.flat(buffer)]
+		mapped = storage.from_values(values, buffer.shape)
+		if mapped is None:
+			# The function returned structures, which are nested inside the array
+			return self.build(StructuredArray.shape_structured(values, buffer.shape))
+		return StructuredArray.from_buffer(mapped, self.default)
+
+	def reduce(self, fn, axis, reverse=False, partial_sums=False):
+		buffer = self.buffer()
+		folded = None
+		if buffer is not None and -buffer.ndim <= axis < buffer.ndim and getattr(fn, 'symbol', None) in BUILTIN_FOLDS:
+			folded = storage.fold(np.moveaxis(buffer, axis, 0), fn.symbol, reverse, partial_sums)
+		if folded is None:
+			return super(StructuredArray, self).reduce(fn, axis, reverse, partial_sums)
+		if not partial_sums and buffer.ndim == 1:
+			return storage.structured(folded)
+		elif not partial_sums or buffer.ndim == 1:
+			return StructuredArray.from_buffer(folded, self.default)
+		else:
+			# Each partial result of folding the slices is itself an array
+			return self.build([StructuredArray.from_buffer(s, self.default) for s in folded])
+
 	def matrix_multiply(self, other):
 		return self.inner_product(other, add, mul)
 
@@ -924,16 +1184,50 @@ class StructuredArray(Array):
 
 	@staticmethod
 	def flatten_structured(obj):
-		if Array.container(obj):
-			return sum([StructuredArray.flatten_structured(x) for x in obj], start=[])
-		else:
+		"""A new list of the values in the nested lists, in order"""
+		if not Array.container(obj):
 			return [obj]
+		flat = []
+		work = [iter(obj)]
+		while len(work) > 0:
+			for x in work[-1]:
+				if type(x) in _CONTAINERS:
+					work.append(iter(x))
+					break
+				flat.append(x)
+			else:
+				work.pop()
+		return flat
 
 	@staticmethod
 	def shape_of_structured(obj):
+		return StructuredArray.measure_structured(obj)[0]
+
+	@staticmethod
+	def measure_structured(obj):
+		"""The shape of the nested lists, and whether they are rectangular: the lists on each level all have the
+		same length, and the lists on the last level hold no lists. The first items give the shape of rectangular
+		lists, which is then checked one level at a time"""
+		shape = []
+		item = obj
+		while Array.container(item) and len(item) > 0:
+			shape.append(len(item))
+			item = item[0]
+		level = [obj]
+		for length in shape:
+			if not all([type(x) in _CONTAINERS and len(x) == length for x in level]):
+				return StructuredArray.ragged_shape(obj), False
+			level = [y for x in level for y in x]
+		if not _CONTAINERS.isdisjoint(map(type, level)):
+			return StructuredArray.ragged_shape(obj), False
+		return tuple(shape), True
+
+	@staticmethod
+	def ragged_shape(obj):
+		"""The shape of nested lists which may not be rectangular: their length followed by the smallest (in tuple
+		order) of the shapes of their items"""
 		if Array.container(obj) and len(obj) > 0:
-			sub_shapes = sorted(tuple([StructuredArray.shape_of_structured(x) for x in obj]))
-			return tuple([len(sub_shapes)] + list(sub_shapes[0]))
+			return tuple([len(obj)] + list(min([StructuredArray.ragged_shape(x) for x in obj])))
 		else:
 			return ()
 
@@ -1034,12 +1328,22 @@ class StructuredArray(Array):
 			return indices[0]
 
 	@staticmethod
-	def permute_axes(struc, permutation=None):
-		shape = StructuredArray.shape_of_structured(struc)
-		size = reduce(mul, shape, 1)
+	def permute_axes(struc, permutation=None, buffer=None):
+		"""The nested lists with their axes in the order given by the permutation (reversed if it is not valid).
+		Rectangular lists are permuted in a buffer, which can be passed in if it is already held"""
+		if buffer is None:
+			shape, rectangular = StructuredArray.measure_structured(struc)
+			if rectangular:
+				buffer = storage.to_buffer(struc, shape)
+		else:
+			shape = buffer.shape
 		dimensions = len(shape)
 		if permutation is None or len(permutation) != dimensions or sorted(permutation) != list(range(dimensions)):
 			permutation = list(range(dimensions))[::-1]
+		if buffer is not None:
+			return storage.structured(buffer.transpose(permutation))
+		# Ragged lists are permuted one value at a time, as if they had the shape found for them
+		size = reduce(mul, shape, 1)
 		permuted_shape = [shape[i] for i in permutation]
 		new_flat = [0] * size
 		old_flat = StructuredArray.flatten_structured(struc)
@@ -1051,14 +1355,14 @@ class StructuredArray(Array):
 		return new_struc
 
 	@staticmethod
-	def promote_axis(struc, axis):
+	def promote_axis(struc, axis, buffer=None):
 		if axis == 0:
 			return struc
-		shape = StructuredArray.shape_of_structured(struc)
+		shape = StructuredArray.shape_of_structured(struc) if buffer is None else buffer.shape
 		dim = len(shape)
 		permutation = list(range(dim))
 		permutation = [permutation[axis]] + permutation[:axis] + permutation[axis + 1:]
-		return StructuredArray.permute_axes(struc, permutation)
+		return StructuredArray.permute_axes(struc, permutation, buffer)
 
 	@staticmethod
 	def map_struc(a, fn):
@@ -0,0 +1,340 @@
+# FBl337
+# Programming Code Golf Language
+# Created: 21 February 2024
+# Version: 21 February 2024 12:00PM
+# Copyright: James Leibert 2024
+# Licence: Available for use under the GPL3 Licence https://www.gnu.org/licenses/gpl-3.0.txt
+
+# bytecode.py
+# Bytecode compiler, virtual machine and disassembler
+
+
+from fb1337.environment import Environment
+from fb1337.iterators import Iterator
+from fb1337.lambda_fn import run_object
+from fb1337.parser import SyntaxTree, SyntaxToken
+
+# Instruction set
+# Values are pushed to the program stack as usual. Parameters being gathered for a call are held on a separate
+# operand stack, local to each run of the virtual machine.
+PUSH_CONST = 0  # push the constant to the program stack
+CALL = 1  # run the command described by the call site, taking its gathered parameters from the operand stack
+POP_STACK = 2  # pop n stack parameters from the program stack and hold them as a list on the operand stack
+TAKE = 3  # move the top value of the program stack (a code parameter) to the operand stack
+MAKE_FN = 4  # make a fn parameter which runs the segment at the given address and hold it on the operand stack
+ENTER = 5  # run the following instructions in a new local environment
+LEAVE = 6  # return to the enclosing environment
+ITER_BEGIN = 7  # pop a value from the program stack, make an iterator from it and start it
+ITER_TEST = 8  # test the iterator, entering a new local environment for the body or jumping to the address
+ITER_NEXT = 9  # leave the body's environment, update the iterator and jump back to its test
+ITER_END = 10  # finish the iterator
+TRACE = 11  # tell the tracer that the token has been reached
+RETURN = 12  # end of a segment
+
+OPNAMES = ['PUSH_CONST', 'CALL', 'POP_STACK', 'TAKE', 'MAKE_FN', 'ENTER', 'LEAVE',
+           'ITER_BEGIN', 'ITER_TEST', 'ITER_NEXT', 'ITER_END', 'TRACE', 'RETURN']
+
+
+class CallSite:
+	"""Everything the virtual machine needs to know to call a command, worked out at compile time"""
+
+	def __init__(self, token, stack_values, gathered, code_count, fn_count, block):
+		self.token = token
+		self.stack_values = stack_values
+		self.gathered = gathered
+		self.code_count = code_count
+		self.fn_count = fn_count
+		self.block = block
+		self.block_fn = None
+		# The block parameters passed to every call, and whether the stack parameters are the only others
+		self.blocks = []
+		self.simple = not gathered and code_count == 0 and fn_count == 0
+
+	def __repr__(self):
+		s = str(self.token.value) + ' s' + str(self.stack_values) + ' c' + str(self.code_count) + ' f' + str(self.fn_count)
+		if self.block is not None:
+			s += ' b@' + str(self.block.address)
+		return s
+
+
+class Bytecode:
+	"""A program lowered to a flat list of instructions.
+	The main program starts at address 0. Fn parameters and blocks are compiled into separate segments,
+	each ending in RETURN, which are run by re-entering the virtual machine at their start address.
+	The iteration (:) and paren (() commands are compiled inline as jumps, so loops and paren blocks
+	do not use the Python stack, however deeply they are nested. Other fn parameters and blocks are called by
+	the commands they are passed to, so each level of them still uses the Python stack, as in the tree backend."""
+
+	def __init__(self, program):
+		self.program = program
+		self.tracing = program.tracer is not None
+		self.ops = []
+		self.args = []
+		self.tokens = []
+		self.pending = []
+		self.call_sites = []
+		self.code = []  # (op, arg) pairs, so the virtual machine reads each instruction with one index
+		self.single_calls = dict()  # The call site of each segment which only calls one command, by address
+		self.call = program._call
+
+	# Compilation
+
+	def compile(self, tree):
+		"""Compile the tree as the main program, followed by any segments it needs"""
+		self._compile_context(tree)
+		self._emit(RETURN, None, None)
+		while len(self.pending) > 0:
+			segment, start = self.pending.pop(0)
+			start.address = len(self.ops)
+			self._compile_context(segment)
+			self._emit(RETURN, None, None)
+		# Blocks do not depend on the environment they are applied in, so one function per call site is shared
+		for site in self.call_sites:
+			if site.block is not None:
+				site.block_fn = self._block(site.block.address)
+				site.blocks = [site.block_fn]
+		self.code = list(zip(self.ops, self.args))
+		for address in range(1, len(self.ops) - 1):
+			if self.ops[address - 1] == RETURN and self.ops[address] == CALL and self.ops[address + 1] == RETURN and \
+					self.args[address].simple:
+				self.single_calls[address] = self.args[address]
+		return self
+
+	def _emit(self, op, arg, token):
+		self.ops.append(op)
+		self.args.append(arg)
+		self.tokens.append(token)
+		return len(self.ops) - 1
+
+	def _segment(self, tree):
+		"""Queue a segment to be compiled after the current one. Its address is filled in when it is compiled"""
+		start = SegmentStart()
+		self.pending.append((tree, start))
+		return start
+
+	def _compile_context(self, tree):
+		"""Compile a tree, token or list of tokens. A work stack is used rather than recursion,
+		so deeply nested programs compile without reaching Python's recursion limit.
+		The work stack holds trees still to be compiled and functions which emit instructions."""
+		work = [tree]
+		while len(work) > 0:
+			item = work.pop()
+			if isinstance(item, SyntaxToken):
+				self._compile_token(item, work)
+
+			elif isinstance(item, SyntaxTree):
+				work.append(item.tree)
+
+			elif type(item) is list:
+				work.extend(reversed(item))
+
+			elif callable(item):
+				item()
+
+	def _compile_token(self, token, work):
+		token_type = token.token_type
+
+		if token.value == ';' or token_type == 'end block':
+			if self.tracing:
+				self._emit(TRACE, None, token)
+
+		elif token_type == 'fn':
+			work.extend(reversed(self._apply_steps(token)))
+
+		elif token_type == 'value':
+			if self.tracing:
+				self._emit(TRACE, None, token)
+			self._emit(PUSH_CONST, token.value, token)
+
+		else:
+			print("Unknown token", token)
+			raise SyntaxError
+
+	def _apply_steps(self, token):
+		"""The steps to compile a function token, in order"""
+		emit = self._emit
+		simple = len(token.code_tokens) == 0 and len(token.fn_tokens) == 0 and token.sub_tree is not None
+
+		# Inline control flow. When a tracer is attached, the commands are called as usual so it sees them
+		if not self.tracing and simple and token.value == ':' and token.stack_values == 1:
+			test = []
+
+			def begin():
+				emit(ITER_BEGIN, None, token)
+				test.append(emit(ITER_TEST, None, token))
+
+			def end():
+				emit(ITER_NEXT, test[0], token)
+				self.args[test[0]] = emit(ITER_END, None, token)
+
+			return [begin, token.sub_tree, end]
+
+		if not self.tracing and simple and token.value == '(' and token.stack_values == 0:
+			return [lambda: emit(ENTER, None, token), token.sub_tree, lambda: emit(LEAVE, None, token)]
+
+		# Stack parameters are taken before the code parameters are evaluated
+		steps = []
+		gathered = len(token.code_tokens) > 0
+		if gathered:
+			steps.append(lambda: emit(POP_STACK, token.stack_values, token))
+		for code_token in token.code_tokens:
+			steps.append(code_token)
+			steps.append(lambda: emit(TAKE, None, token))
+
+		def call():
+			for fn_token in token.fn_tokens:
+				runs_object = fn_token.token_type == 'fn' and fn_token.value in 'λµ(κ$'
+				emit(MAKE_FN, (self._segment(fn_token), runs_object), token)
+			block = self._segment(token.sub_tree) if token.sub_tree is not None else None
+			site = CallSite(token, token.stack_values, gathered, len(token.code_tokens), len(token.fn_tokens), block)
+			self.call_sites.append(site)
+			emit(CALL, site, token)
+
+		steps.append(call)
+		return steps
+
+	# Execution
+
+	def run(self, env):
+		self.execute(env, 0)
+
+	def execute(self, env, pc):
+		"""Run instructions from the address until the end of the segment.
+		The instructions are tested for in order of how often they are usually run"""
+		code = self.code
+		call = self.call
+		operands = []
+		frames = []
+		iterators = []
+
+		while True:
+			op, arg = code[pc]
+			pc += 1
+
+			if op == PUSH_CONST:
+				env.push(arg)
+
+			elif op == CALL:
+				if arg.simple:
+					call(env, arg.token, env.pop_n(arg.stack_values), [], [], arg.blocks)
+					continue
+				if arg.fn_count > 0:
+					fns = operands[-arg.fn_count:]
+					del operands[-arg.fn_count:]
+				else:
+					fns = []
+				if arg.code_count > 0:
+					code_parameters = operands[-arg.code_count:]
+					del operands[-arg.code_count:]
+				else:
+					code_parameters = []
+				stack = operands.pop() if arg.gathered else env.pop_n(arg.stack_values)
+				call(env, arg.token, stack, code_parameters, fns, arg.blocks)
+
+			elif op == MAKE_FN:
+				operands.append(self._fn(env, arg[0].address, arg[1]))
+
+			elif op == RETURN:
+				return
+
+			elif op == TAKE:
+				operands.append(env.pop())
+
+			elif op == POP_STACK:
+				operands.append(env.pop_n(arg))
+
+			elif op == ITER_TEST:
+				if iterators[-1].proceed(env):
+					frames.append(env)
+					env = Environment.acquire(env)
+				else:
+					pc = arg
+
+			elif op == ITER_NEXT:
+				finished = env
+				env = frames.pop()
+				finished.release()
+				iterators[-1].advance(env)
+				pc = arg
+
+			elif op == ITER_BEGIN:
+				obj = env.pop()
+				iterator = obj if isinstance(obj, Iterator) else Iterator.from_object(obj)
+				iterator.begin(env)
+				iterators.append(iterator)
+
+			elif op == ITER_END:
+				iterators.pop().finish(env)
+
+			elif op == ENTER:
+				frames.append(env)
+				env = Environment.acquire(env)
+
+			elif op == LEAVE:
+				finished = env
+				env = frames.pop()
+				finished.release()
+
+			elif op == TRACE:
+				self.program._trace_token(env, self.tokens[pc - 1])
+
+	def _block(self, address):
+		def block(e):
+			self.execute(e, address)
+
+		return block
+
+	def _fn(self, env, address, runs_object):
+		"""Fn parameters run in the environment the command was applied in, not the one they are called with.
+		Most fn parameters only call one command (as in ⍮◌ or ?µ...)), which is called without entering the
+		virtual machine"""
+		site = self.single_calls.get(address)
+		call = self.call
+		if site is not None and runs_object:
+			def f(e):
+				call(env, site.token, env.pop_n(site.stack_values), [], [], site.blocks)
+				run_object(e, e.pop())
+		elif site is not None:
+			def f(e):
+				call(env, site.token, env.pop_n(site.stack_values), [], [], site.blocks)
+		elif runs_object:
+			def f(e):
+				self.execute(env, address)
+				run_object(e, e.pop())
+		else:
+			def f(e):
+				self.execute(env, address)
+
+		return f
+
+	# Disassembly
+
+	def disassemble(self):
+		"""Return a listing of the instructions, one per line"""
+		lines = []
+		segment_starts = {0} | {i + 1 for i, op in enumerate(self.ops) if op == RETURN}
+		for address, (op, arg, token) in enumerate(zip(self.ops, self.args, self.tokens)):
+			if address in segment_starts and address < len(self.ops):
+				lines.append(('main:' if address == 0 else 'segment ' + str(address) + ':'))
+			if op == MAKE_FN:
+				operand = '@' + str(arg[0].address) + (' run' if arg[1] else '')
+			elif op in (ITER_TEST, ITER_NEXT):
+				operand = '-> ' + str(arg)
+			elif op == PUSH_CONST:
+				operand = repr(arg) if arg != '' else 'Ø'
+			elif arg is not None:
+				operand = str(arg)
+			else:
+				operand = ''
+			lines.append(('  ' + str(address).rjust(5) + '  ' + OPNAMES[op].ljust(11) + ' ' + operand).rstrip())
+		return '\n'.join(lines)
+
+
+class SegmentStart:
+	"""The address of a segment, which is only known once the segment has been compiled"""
+
+	def __init__(self):
+		self.address = None
+
+	def __repr__(self):
+		return '@' + str(self.address)
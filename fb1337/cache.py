@@ -0,0 +1,158 @@
+# FBl337
+# Programming Code Golf Language
+# Created: 21 February 2024
+# Version: 21 February 2024 12:00PM
+# Copyright: James Leibert 2024
+# Licence: Available for use under the GPL3 Licence https://www.gnu.org/licenses/gpl-3.0.txt
+
+# cache.py
+# On-disk cache of parsed programs, so a program is only lexed and parsed the first time it is run
+
+
+import hashlib
+import os
+import pickle
+import sys
+import tempfile
+
+from fb1337 import lexer, parser
+from fb1337.parser import SyntaxTree, command_dictionary
+
+MAX_CACHE_BYTES = 64 * 1024 * 1024
+# The directory is only listed to remove old entries when the entries saved since it was last listed could take
+# it over max_bytes, or after this many saves (other processes may be saving entries too)
+EVICT_EVERY = 256
+
+
+def default_cache_directory():
+	"""The cache is kept in ~/.cache/fb1337, which can be changed with the FB1337_CACHE variable"""
+	if 'FB1337_CACHE' in os.environ:
+		return os.environ['FB1337_CACHE']
+	cache_home = os.environ.get('XDG_CACHE_HOME', os.path.join(os.path.expanduser('~'), '.cache'))
+	return os.path.join(cache_home, 'fb1337')
+
+
+class ProgramCache:
+	"""Syntax trees saved with pickle, in a file named by a hash of the program code and of the interpreter.
+	The interpreter fingerprint covers the python version, the source of the lexer and parser, and the command
+	signatures, so a change to any of them starts a fresh set of entries.
+	When the cache is larger than max_bytes, the least recently used entries are removed.
+	Entries are unpickled, so the directory is made readable only by the user, and entries owned by anyone else
+	are ignored. The cache is only an optimisation: if it cannot be read or written, the program is simply parsed"""
+
+	def __init__(self, directory=None, max_bytes=MAX_CACHE_BYTES):
+		self.directory = directory if directory is not None else default_cache_directory()
+		self.max_bytes = max_bytes
+		self.hits = 0
+		self.misses = 0
+		self.last_hit = None
+		self.scans = 0  # The number of times the directory has been listed to remove old entries
+		self._fingerprint = None
+		# The size of the directory when it was last listed, plus the sizes of the entries saved since then
+		self._bytes = None
+		self._saves = 0
+
+	def fingerprint(self):
+		if self._fingerprint is None:
+			h = hashlib.sha256()
+			h.update(str(sys.version_info[:2]).encode('utf-8'))
+			for module in [lexer, parser]:
+				with open(module.__file__, 'rb') as file:
+					h.update(file.read())
+			h.update(repr(sorted(command_dictionary.items())).encode('utf-8'))
+			self._fingerprint = h.hexdigest()
+		return self._fingerprint
+
+	def _path(self, commented_code):
+		h = hashlib.sha256()
+		h.update(self.fingerprint().encode('utf-8'))
+		h.update(commented_code.encode('utf-8'))
+		return os.path.join(self.directory, h.hexdigest() + '.tree')
+
+	def syntax_tree(self, commented_code):
+		"""Return the syntax tree for the code, from the cache if possible"""
+		path = self._path(commented_code)
+		tree = self._load(path)
+		self.last_hit = tree is not None
+		if tree is not None:
+			self.hits += 1
+			return tree
+		self.misses += 1
+		tree = SyntaxTree(commented_code)
+		self._save(path, tree)
+		return tree
+
+	def statistics(self):
+		return {'hits': self.hits, 'misses': self.misses,
+		        'hit rate': self.hits / (self.hits + self.misses) if self.hits + self.misses > 0 else None}
+
+	@staticmethod
+	def _load(path):
+		try:
+			with open(path, 'rb') as file:
+				if hasattr(os, 'getuid') and os.fstat(file.fileno()).st_uid != os.getuid():
+					return None
+				tree = pickle.load(file)
+			# Mark the entry as recently used
+			os.utime(path)
+			return tree
+		except Exception:
+			return None
+
+	def _save(self, path, tree):
+		try:
+			os.makedirs(self.directory, mode=0o700, exist_ok=True)
+			# Write to a temporary file first, so other processes never read part of an entry
+			handle, temporary_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+			try:
+				with os.fdopen(handle, 'wb') as file:
+					pickle.dump(tree, file, protocol=pickle.HIGHEST_PROTOCOL)
+				os.replace(temporary_path, path)
+			finally:
+				if os.path.exists(temporary_path):
+					os.remove(temporary_path)
+			self._saves += 1
+			if self._bytes is not None:
+				self._bytes += os.path.getsize(path)
+			if self._bytes is None or self._bytes > self.max_bytes or self._saves >= EVICT_EVERY:
+				self._evict()
+		except Exception:
+			# Very deeply nested trees cannot be pickled, and the directory may not be writable
+			pass
+
+	def _evict(self):
+		self.scans += 1
+		self._saves = 0
+		entries = []
+		for entry in os.scandir(self.directory):
+			if entry.name.endswith('.tree'):
+				status = entry.stat()
+				entries.append((status.st_mtime, status.st_size, entry.path))
+		total = sum([size for _, size, _ in entries])
+		for _, size, path in sorted(entries):
+			if total <= self.max_bytes:
+				break
+			try:
+				os.remove(path)
+			except OSError:
+				pass
+			total -= size
+		self._bytes = total
+
+
+_program_cache = None
+
+
+def program_cache():
+	"""The cache shared by run, run_annotated and compile"""
+	global _program_cache
+	if _program_cache is None:
+		_program_cache = ProgramCache()
+	return _program_cache
+
+
+def syntax_tree(commented_code, cache=True):
+	"""Parse the code, using the program cache unless cache is False"""
+	if not cache:
+		return SyntaxTree(commented_code)
+	return program_cache().syntax_tree(commented_code)
@@ -12,7 +12,6 @@
 import math
 
 import numpy as np
-from scipy.special import comb
 
 from fb1337.array import Array, Coordinate, Matrix, FlatList
 from fb1337.dictionary import Dictionary
@@ -23,6 +22,12 @@ from fb1337.parser import add_command_signature
 from fb1337.type_utilities import convert_collection, truthy_object, int_value
 from fb1337.type_utilities import parameter_match
 
+
+def binomial(n, r):
+    # SciPy is slow to import, so it is only loaded the first time it is needed
+    from scipy.special import comb
+    return comb(n, r, exact=True)
+
 # fb1337 language commands
 FBLeet_language = [
 
@@ -113,7 +118,7 @@ FBLeet_language = [
     ]},
     {'symbol': '‼', 'signature': (2, 0, 0, 0), 'alias': 'binomial', 'group': 'math', 'patterns': [
         {'signature': ('int', 'int'), 'description': 'nCr binomial coefficient',
-         'function': lambda e, n, r: comb(n, r, exact=True)},
+         'function': lambda e, n, r: binomial(n, r)},
     ]},
     {'symbol': '⌈', 'signature': (2, 0, 0, 0), 'alias': 'max', 'group': 'math', 'patterns': [
         {'signature': ('int', 'int'), 'description': 'maximum value',
@@ -293,11 +298,11 @@ FBLeet_language = [
     ]},
     {'symbol': '☐', 'signature': (0, 1, 0, 0), 'alias': 'gather n', 'group': 'list', 'patterns': [
         {'signature': ('int',), 'description': 'put the top n items on the stack into a list',
-         'function': lambda e, n: FlatList([e.pop() for _ in range(n)][::-1])},
+         'function': lambda e, n: FlatList(e.pop_n(n))},
     ]},
     {'symbol': '☆', 'signature': (1, 0, 0, 0), 'alias': 'scatter', 'group': 'list', 'patterns': [
         {'signature': ('Array',), 'description': 'put each item in the list onto the stack',
-         'function': lambda e, l: [[e.push(x) for x in l.iterable()], None][1]},
+         'function': lambda e, l: e.push_many(l.iterable())},
         {'signature': ('any',), 'description': 'ungroup items and place each on the stack',
          'function': lambda e, l:
          [[e.push(x) for x in l] if (type(l) is list or type(l) is tuple) else [e.push(l) for _ in [1]], None][1]},
@@ -460,7 +465,7 @@ FBLeet_language = [
     {'symbol': '#', 'signature': (1, 0, 0, 0), 'alias': 'count', 'group': 'array', 'patterns': [
         {'signature': ('str',), 'description': 'string length', 'function': lambda e, x: len(str(x))},
         {'signature': ('List',), 'description': 'the length of a flat list',
-         'function': lambda e, l: len(l.iterable())},
+         'function': lambda e, l: l.count()},
         {'signature': ('Coordinate',), 'description': 'the dimension of a coordinate index',
          'function': lambda e, l: len(l.iterable())},
         {'signature': ('Array',), 'description': 'the size of the first axis of a structured array',
@@ -0,0 +1,145 @@
+# FBl337
+# Programming Code Golf Language
+# Created: 21 February 2024
+# Version: 21 February 2024 12:00PM
+# Copyright: James Leibert 2024
+# Licence: Available for use under the GPL3 Licence https://www.gnu.org/licenses/gpl-3.0.txt
+
+# compiler.py
+# Closure compiler: turns a syntax tree into nested Python callables
+
+
+from fb1337.lambda_fn import run_object
+from fb1337.parser import SyntaxTree, SyntaxToken
+
+
+class ClosureCompiler:
+	"""Walks a syntax tree once and builds one pre-bound closure per token.
+	Each closure takes an environment and has the same effect as Program._eval_context on that token,
+	but the work of inspecting the token (its type, parameter counts, fn and block parameters) is done
+	once at compile time rather than every time the token is executed.
+	Matching and running the command itself is still done by Program._call, so the results are identical."""
+
+	def __init__(self, program):
+		self.program = program
+		self.tracing = program.tracer is not None
+
+	def compile(self, tree):
+		"""Return a function f(env) which runs the tree"""
+		return self._compile_context(tree)
+
+	def _compile_context(self, tree):
+		if isinstance(tree, SyntaxToken):
+			return self._compile_token(tree)
+
+		elif isinstance(tree, SyntaxTree):
+			return self._compile_context(tree.tree)
+
+		elif type(tree) is list:
+			parts = [self._compile_context(token) for token in tree]
+			if not self.tracing:
+				parts = [part for part in parts if part is not _no_op]
+			if len(parts) == 0:
+				return _no_op
+			if len(parts) == 1:
+				return parts[0]
+			parts = tuple(parts)
+
+			def run_sequence(env):
+				for part in parts:
+					part(env)
+
+			return run_sequence
+
+		return _no_op
+
+	def _compile_token(self, token):
+		token_type = token.token_type
+		trace = self.program._trace_token
+
+		if token.value == ';' or token_type == 'end block':
+			if not self.tracing:
+				return _no_op
+
+			def run_end(env):
+				trace(env, token)
+
+			return run_end
+
+		elif token_type == 'fn':
+			return self._compile_apply(token)
+
+		elif token_type == 'value':
+			value = token.value
+			if self.tracing:
+				def run_value(env):
+					trace(env, token)
+					env.push(value)
+			else:
+				def run_value(env):
+					env.push(value)
+
+			return run_value
+
+		else:
+			print("Unknown token", token)
+			raise SyntaxError
+
+	def _compile_apply(self, token):
+		call = self.program._call
+		stack_values = token.stack_values
+		code_parameters = tuple(self._compile_context(code_token) for code_token in token.code_tokens)
+		fn_parameters = tuple(self._compile_fn_parameter(fn_token) for fn_token in token.fn_tokens)
+
+		if token.sub_tree is not None:
+			# The block does not depend on the environment it is applied in, so a single function is shared
+			block_body = self._compile_context(token.sub_tree)
+
+			def block(e):
+				block_body(e)
+
+			block_parameters = (block,)
+		else:
+			block_parameters = ()
+
+		if len(code_parameters) == 0 and len(fn_parameters) == 0:
+			def run_apply(env):
+				call(env, token, env.pop_n(stack_values), [], [], list(block_parameters))
+
+			return run_apply
+
+		def run_apply(env):
+			stack = env.pop_n(stack_values)
+			code = []
+			for code_parameter in code_parameters:
+				code_parameter(env)
+				code.append(env.pop())
+			fns = [make_fn(env) for make_fn in fn_parameters]
+			call(env, token, stack, code, fns, list(block_parameters))
+
+		return run_apply
+
+	def _compile_fn_parameter(self, fn_token):
+		"""Return a function which, given the environment the command is applied in, makes the fn parameter.
+		As in the interpreter, the fn parameter runs in the applying environment, not the one it is called with"""
+		body = self._compile_context(fn_token)
+
+		if fn_token.token_type == 'fn' and fn_token.value in 'λµ(κ$':
+			def make_fn(env):
+				def f(e):
+					body(env)
+					run_object(e, e.pop())
+
+				return f
+		else:
+			def make_fn(env):
+				def f(e):
+					body(env)
+
+				return f
+
+		return make_fn
+
+
+def _no_op(env):
+	return
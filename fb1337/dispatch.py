@@ -0,0 +1,126 @@
+# FBl337
+# Programming Code Golf Language
+# Created: 21 February 2024
+# Version: 21 February 2024 12:00PM
+# Copyright: James Leibert 2024
+# Licence: Available for use under the GPL3 Licence https://www.gnu.org/licenses/gpl-3.0.txt
+
+# dispatch.py
+# Inline caches remembering which command pattern a call site matched for each combination of parameter types
+
+
+import numpy as np
+
+from fb1337.array import Array, FlatList, Range, StructuredArray, Matrix, Coordinate
+from fb1337.dictionary import Dictionary
+from fb1337.iterators import Iterator, CountIterator, SequenceIterator
+from fb1337.lambda_fn import Lambda
+from fb1337.slice import Slice
+from fb1337.type_utilities import is_num_collection, type_transformation_plan
+
+# Types for which parameter_match and the type transformations depend only on the type of the value,
+# apart from the tags added for strings and arrays. Parameters of any other type are never cached,
+# so each subclass of these (e.g. the fast iterators) must be listed too.
+CACHEABLE_TYPES = {int, float, bool, str, type(None), tuple, list,
+                   np.float64, np.int64, np.bool_,
+                   FlatList, Range, StructuredArray, Matrix, Coordinate,
+                   Dictionary, Iterator, CountIterator, SequenceIterator, Slice, Lambda, type(lambda e: None)}
+
+
+class InlineCache:
+    """An inline cache for a single call site (a function token in the syntax tree).
+    Entries are keyed on the types of the parameters, with a tag for strings (null, integer or text)
+    and for arrays passed where an integer is accepted (whether they hold a single number).
+    Each entry holds the matched command and its type transformation plan, so a hit replaces
+    matching every pattern and working out the transformations with one dictionary lookup.
+    A site that sees more than `limit` different keys is megamorphic: the cache is dropped and
+    the site always falls back to Commands.match_command."""
+
+    limit = 8
+
+    def __init__(self, commands, symbol):
+        self.entries = dict()
+        self.megamorphic = False
+        self.hits = 0
+        self.misses = 0
+
+        patterns = commands.symbol_lookup[symbol]['patterns'] if symbol in commands.symbol_lookup else []
+        self.int_positions = {i for pattern in patterns for i, t in enumerate(pattern['signature']) if t == 'int'}
+
+    def key(self, parameters):
+        """The cache key for the parameters, or None if they cannot be cached"""
+        key = []
+        for i, v in enumerate(parameters):
+            t = type(v)
+            if t is str:
+                if v == '' or v == 'Ø':
+                    key.append(v)
+                elif i in self.int_positions and _is_int_string(v):
+                    key.append('int')
+                else:
+                    key.append(str)
+            elif t not in CACHEABLE_TYPES:
+                return None
+            elif i in self.int_positions and isinstance(v, Array):
+                key.append((t, len(v.values) == 1 and is_num_collection(v)))
+            else:
+                key.append(t)
+        return tuple(key)
+
+    def lookup(self, parameters):
+        """Return the cached entry for the parameters, or None (with the key to store a new entry under)"""
+        if self.megamorphic:
+            self.misses += 1
+            return None, None
+        key = self.key(parameters)
+        entry = self.entries.get(key) if key is not None else None
+        if entry is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return entry, key
+
+    def store(self, key, parameters, match):
+        """Work out the transformation plan for a match and cache it. Returns the new entry"""
+        conversions, fn = type_transformation_plan(parameters, match['type signature'], match['function'])
+        entry = CacheEntry(match, conversions, fn)
+        if key is not None and not self.megamorphic:
+            if len(self.entries) >= self.limit:
+                self.entries = dict()
+                self.megamorphic = True
+            else:
+                self.entries[key] = entry
+        return entry
+
+    def __repr__(self):
+        return '<InlineCache entries=' + str(len(self.entries)) + ' hits=' + str(self.hits) + \
+            ' misses=' + str(self.misses) + (' megamorphic' if self.megamorphic else '') + '>'
+
+
+class CacheEntry:
+    """A matched command and the plan for transforming its parameters"""
+
+    def __init__(self, match, conversions, fn):
+        self.match = match
+        self.conversions = conversions
+        self.fn = fn
+
+
+# Whether each string seen in an integer position can be read as an integer. Names looked up with $ are
+# checked every time they are read, so the answers are kept, up to a limit
+_int_strings = dict()
+_INT_STRINGS_LIMIT = 4096
+
+
+def _is_int_string(s):
+    found = _int_strings.get(s)
+    if found is not None:
+        return found
+    try:
+        int(s)
+        found = True
+    except ValueError:
+        found = False
+    if len(_int_strings) < _INT_STRINGS_LIMIT:
+        _int_strings[s] = found
+    return found
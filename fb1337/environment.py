@@ -10,13 +10,86 @@
 
 
 import os
+import sys
+
+from fb1337.stack import Stack
+
+IMPLICIT_REFERENCES = ['⓪', '①', '②', '③', '④', '⑤']
+PARAMETER_REFERENCES = ['➊', '➋', '➌', '➍', '➎']
+NAME_CHARACTERS = 'ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz'
+
+# The kinds of reference a name can make
+IMPLICIT, PARAMETER, NAMED, INVALID = 'implicit', 'parameter', 'named', 'invalid'
+
+
+class Address:
+    """Where the value of a name is found: an implicit loop value (index is how many loops back),
+    a program parameter (index is its position in the parameters), or a named variable"""
+
+    __slots__ = ('kind', 'index', 'name')
+
+    def __init__(self, kind, index=None, name=None):
+        self.kind = kind
+        self.index = index
+        self.name = name
+
+    def __repr__(self):
+        return '<Address ' + self.kind + ' ' + str(self.index if self.name is None else self.name) + '>'
+
+
+# Names made while the program runs (e.g. with $ from a string) are also looked up, so the addresses kept are limited
+_addresses = dict()
+_ADDRESSES_LIMIT = 4096
+
+
+def address(name):
+    """The address of a name. Each name is only worked out once, usually before the program runs (see
+    analysis.py), so looking up a name does not need to compare it against each kind of reference"""
+    found = _addresses.get(name)
+    if found is not None:
+        return found
+    text = str(name) if type(name) is int else name
+    if text == '_':
+        found = Address(IMPLICIT, 0)
+    elif text in IMPLICIT_REFERENCES:
+        found = Address(IMPLICIT, IMPLICIT_REFERENCES.index(text))
+    elif text[0] in '0123456789':
+        found = Address(PARAMETER, int(text))
+    elif text in PARAMETER_REFERENCES:
+        found = Address(PARAMETER, PARAMETER_REFERENCES.index(text) + 1)
+    elif text[0] in NAME_CHARACTERS:
+        found = Address(NAMED, name=text)
+    else:
+        found = Address(INVALID)
+    if len(_addresses) < _ADDRESSES_LIMIT:
+        _addresses[name] = found
+    return found
+
+
+# Shared by every environment which has not had a value assigned, so most environments do not need a dictionary
+_EMPTY_NAMESPACE = dict()
+
+POOL_SIZE = 64
 
 
 class Environment:
+    """Environments for loop bodies and lambda calls are taken from a pool with acquire and given back with
+    release. An environment is only put back in the pool if nothing else still refers to it (e.g. a function
+    which captured it and was returned, or a child environment), so reusing it cannot be seen by the program.
+    The counts of environments created and reused are kept in created and reused"""
+
+    __slots__ = ('namespace', 'implicit_object', 'parent', 'base_env',
+                 'program_parameters', 'stack', 'path', 'writing', 'reading')
+
+    _pool = []
+    created = 0
+    reused = 0
 
     def __init__(self, parent=None, path=None):
+        Environment.created += 1
+
         # Local environment
-        self.namespace = dict()
+        self.namespace = _EMPTY_NAMESPACE
         self.implicit_object = None
 
         # Environment hierarchy
@@ -26,7 +99,7 @@ class Environment:
         # Base environment only: whole of program environment
         if parent is None:
             self.program_parameters = []
-            self.stack = [] if parent is None else None
+            self.stack = Stack()
             if path is not None:
                 self.path = os.path.realpath(os.path.join(os.getcwd(), os.path.dirname(path)))
             else:
@@ -34,150 +107,173 @@ class Environment:
             self.writing = False
             self.reading = None
 
+    # Frame pool
+
+    @classmethod
+    def acquire(cls, parent):
+        """Return an environment inside the parent, reusing one from the pool if possible"""
+        pool = cls._pool
+        if len(pool) == 0:
+            return cls(parent)
+        env = pool.pop()
+        env.parent = parent
+        env.base_env = parent.base_env
+        cls.reused += 1
+        return env
+
+    def release(self):
+        """Return the environment to the pool, unless anything other than the caller still refers to it.
+        The caller must not use the environment again"""
+        if _free_references is None or sys.getrefcount(self) > _free_references or \
+                len(Environment._pool) >= POOL_SIZE or self.parent is None:
+            return
+        self.namespace = _EMPTY_NAMESPACE
+        self.implicit_object = None
+        self.parent = None
+        self.base_env = None
+        Environment._pool.append(self)
+
+    def _reference_count(self):
+        # Called in the same way as release, to find how many references an environment held only by its caller has
+        return sys.getrefcount(self)
+
+    @classmethod
+    def allocation_statistics(cls):
+        return {'created': cls.created, 'reused': cls.reused}
+
     # Stack Methods
     def get_stack(self):
         """Return the entire stack without removing values"""
-        return self.base_env.stack
+        return self.base_env.stack.values
 
     def push(self, value):
         """Push a value to the stack"""
-        if value is not None:
-            self.base_env.stack.append(value)
+        self.base_env.stack.push(value)
+
+    def push_many(self, values):
+        """Push several values to the stack, the last value ending up on top"""
+        self.base_env.stack.push_many(values)
 
     def pop(self):
         """Pop a value from the stack and return it. Return None if the stack is empty"""
-        if len(self.base_env.stack) > 0:
-            value, self.base_env.stack = self.base_env.stack[-1], self.base_env.stack[:-1]
-            return value
-        else:
-            return None
+        return self.base_env.stack.pop()
+
+    def pop_n(self, n):
+        """Pop n values from the stack and return them in stack order (top of the stack last).
+        Missing values are returned as None"""
+        return self.base_env.stack.pop_n(n)
 
     def peek(self):
         """Return the top value on the stack without removing it. Return None if the stack is empty"""
-        if len(self.base_env.stack) > 0:
-            return self.base_env.stack[-1]
-        else:
-            return None
+        return self.base_env.stack.peek()
 
     def dup(self, x):
         """Push the same value twice onto the stack
         (usually this is taken from the stack, thus duplicating the top stack value)"""
-        self.push(x)
-        self.push(x)
+        self.push_many((x, x))
 
     def dup2(self, x, y):
         """Push a pair of values onto the stack twice
         (usually these are taken from the stack, thus duplicating the top two stack values)"""
-        self.push(x)
-        self.push(y)
-        self.push(x)
-        self.push(y)
+        self.push_many((x, y, x, y))
 
     def under(self, x, y):
         """Push two values onto the stack, then repeat the first value
         (usually these are taken from the stack, thus copying the lower value to the top of the stack"""
-        self.push(x)
-        self.push(y)
-        self.push(x)
+        self.push_many((x, y, x))
 
     def dup_under(self, x, y):
         """Push the first value onto the stack twice, then the second value
         (usually these are taken from the stack, thus copying the lower value under the top of the stack"""
-        self.push(x)
-        self.push(x)
-        self.push(y)
+        self.push_many((x, x, y))
 
     def deep(self, n):
         """Copy the value n-deep and put it on the top of the stack"""
-        if len(self.base_env.stack) > n >= 1:
-            index = len(self.base_env.stack) - n - 1
-            self.base_env.stack += [self.base_env.stack[index]]
+        self.base_env.stack.deep(n)
 
     def swap(self, x, y):
         """Pushes two values to the stack in reverse order
         (usually these are taken from the stack, thus reversing the top two stack values)"""
-        self.push(y)
-        self.push(x)
+        self.push_many((y, x))
 
     def rotate(self, x, y, z):
         """Pushes three values onto the stack in rotated order
         (usually these are taken from the stack, thus rotating the top three stack values abc->bca"""
-        self.push(y)
-        self.push(z)
-        self.push(x)
+        self.push_many((y, z, x))
 
     # Implicit Methods
 
     def implicit(self, back_ref=0, previous=False):
         """Returns the current loop implicit value, or one from an earlier loop"""
 
-        if back_ref == 0 and self.implicit_object is not None:
-            if previous:
-                return self.implicit_object.previous
-            else:
-                return self.implicit_object.implicit
-
-        elif self.implicit_object is None and self.parent is not None and self.parent != self:
-            return self.parent.implicit(back_ref, previous)
-
-        elif back_ref > 0 and self.implicit_object is not None and self.parent is not None and self.parent != self:
-            return self.parent.implicit(back_ref - 1, previous)
-
-        else:
-            return None
+        env = self
+        while True:
+            implicit_object = env.implicit_object
+            parent = env.parent
+            if back_ref == 0 and implicit_object is not None:
+                if previous:
+                    return implicit_object.previous
+                else:
+                    return implicit_object.implicit
+            elif parent is None or parent is env:
+                return None
+            elif implicit_object is not None:
+                back_ref -= 1
+            env = parent
 
     # Variable lookup and assignment
 
     def assign(self, name, value):
+        if self.namespace is _EMPTY_NAMESPACE:
+            self.namespace = dict()
         self.namespace[name] = value
 
     def lookup(self, name):
-        # Implicit references
-        if type(name) is int:
-            name = str(name)
-        if name == '_':
-            return self.implicit()
+        reference = _addresses.get(name)
+        if reference is None:
+            reference = address(name)
+        kind = reference.kind
+
+        # Local named variable references, found in this environment or the nearest one above it
+        if kind is NAMED:
+            name = reference.name
+            env = self
+            while True:
+                namespace = env.namespace
+                if name in namespace:
+                    return namespace[name]
+                parent = env.parent
+                if parent is None or parent is env:
+                    break
+                env = parent
 
-        elif name in ['⓪', '①', '②', '③', '④', '⑤']:
-            back_ref = ['⓪', '①', '②', '③', '④', '⑤'].index(name)
-            return self.implicit(back_ref)
+        # Implicit references
+        elif kind is IMPLICIT:
+            return self.implicit(reference.index)
 
         # Program Parameter references
-        elif name[0] in '0123456789':
-            index = int(name)
-            if index < len(self.base_env.program_parameters):
-                return self.base_env.program_parameters[index]
-            else:
-                return None
-
-        elif name in ['➊', '➋', '➌', '➍', '➎']:
-            index = ['➊', '➋', '➌', '➍', '➎'].index(name) + 1
-            if index < len(self.base_env.program_parameters):
-                return self.base_env.program_parameters[index]
+        elif kind is PARAMETER:
+            program_parameters = self.base_env.program_parameters
+            if reference.index < len(program_parameters):
+                return program_parameters[reference.index]
             else:
                 return None
 
-        # Local named variable references
-        elif name[0] in 'ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz':
-            if name in self.namespace:
-                return self.namespace[name]
-            elif self.parent is not None and self.parent != self:
-                return self.parent.lookup(name)
-
         print('lookup failed', name)
         raise KeyError
 
     def pin(self, n_values):
         # Collects n values from the stack and keeps them in the local environment
-        values = [self.pop() for _ in range(n_values)][::-1]
-        values = [x for x in values if x is not None]
+        values = [x for x in self.pop_n(n_values) if x is not None]
+        if self.namespace is _EMPTY_NAMESPACE:
+            self.namespace = dict()
         for i, v in enumerate(values):
             self.namespace['local_' + str(i + 1)] = v
         for i in range(n_values - len(values)):
             self.namespace['local_' + str(i + 1 + len(values))] = ''
 
     def local_lookup(self, i):
-        name = 'local_' + str(i)
+        name = _local_names[i] if i in _local_names else 'local_' + str(i)
         try:
             result = self.lookup(name)
         except KeyError:
@@ -240,3 +336,19 @@ class Environment:
             if ints:
                 values = [int(str(v)) for v in values]
             return values
+
+
+# The names of the pinned local values used by the ⑴ to ⑸ commands
+_local_names = {key: 'local_' + str(i) for i in range(1, 6) for key in (i, str(i))}
+
+
+def _count_free_references():
+    """The reference count of an environment held only by a local variable of the function releasing it.
+    Without reference counts (on other Python implementations) environments are never reused"""
+    if not hasattr(sys, 'getrefcount'):
+        return None
+    env = Environment(Environment())
+    return env._reference_count()
+
+
+_free_references = _count_free_references()
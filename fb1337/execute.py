@@ -9,44 +9,111 @@
 # FB1337 interpreter eval/apply loop
 
 
+from fb1337.analysis import StackAnalysis
+from fb1337.bytecode import Bytecode
 from fb1337.commands import Commands
+from fb1337.compiler import ClosureCompiler
+from fb1337.dispatch import InlineCache
 from fb1337.environment import Environment
 from fb1337.lambda_fn import run_object
+from fb1337.optimizer import ConstantFolder
 from fb1337.parser import SyntaxTree, SyntaxToken
-from fb1337.type_utilities import parse_program_parameter, apply_type_transformations, return_value
+from fb1337.profiler import Profiler
+from fb1337.tracing import TraceEvent, combine_tracers
+from fb1337.type_utilities import parse_program_parameter, transform_parameters, return_value
+
+
+BACKENDS = ['tree', 'closure', 'bytecode']
+
+
+def _single_command(fn_token):
+	"""The symbol of a fn parameter which only runs one command on values from the stack, otherwise None"""
+	if fn_token.token_type != 'fn' or fn_token.value in 'λµ(κ$' or len(fn_token.code_tokens) > 0 or \
+			len(fn_token.fn_tokens) > 0 or fn_token.sub_tree is not None:
+		return None
+	return fn_token.value
 
 
 class Program:
 
-	def __init__(self, syntax_tree, parameters=None, debugger=None, logging=False):
-		"""If parameters are provided, it is assumed the first parameter is the name of the program"""
+	def __init__(self, syntax_tree, parameters=None, debugger=None, logging=False, backend='tree', tracer=None,
+	             profile=False, fold=False):
+		"""If parameters are provided, it is assumed the first parameter is the name of the program.
+		A tracer (see tracing.py) receives on_enter and on_exit calls as each token runs. The older debugger
+		(an object with a notify method) and logging options are implemented as tracers.
+		With profile set, a Profiler (see profiler.py) records the time spent in each command, in self.profiler
+		The backend is 'tree' to walk the syntax tree directly, 'closure' to compile it to Python closures first,
+		or 'bytecode' to compile it to instructions for the bytecode virtual machine
+		With fold set, constant expressions in the syntax tree are replaced by their values (see optimizer.py)
+		before the program is run. The replaced code is listed in self.folds
+		The stack depth and types at each token are then worked out (see analysis.py), in self.analysis,
+		and the command patterns for call sites whose parameter types are known are selected before running"""
+
+		if backend not in BACKENDS:
+			print("Unknown backend", backend, "expected one of", BACKENDS)
+			raise ValueError
 
 		self.syntax_tree = syntax_tree
 		self.parameters = [parse_program_parameter(parameter) for parameter in
 		                   parameters] if parameters is not None else []
 		self.debugger = debugger
 		self.logging = logging
+		self.profiler = Profiler(syntax_tree if isinstance(syntax_tree, SyntaxTree) else None) if profile else None
+		self.tracer = combine_tracers(tracer, debugger, logging, self.profiler)
+		self.trace_event = TraceEvent()
 		self.commands = Commands()
 		self.name = self.parameters[0] if len(self.parameters) > 0 and self.parameters[0] is not None else 'f'
-
-	def _notify(self, env, info_dictionary):
-		"""If a debugger has registered for notifications, we send them the debugging info dictionary"""
-		if self.debugger is not None:
-			self.debugger.notify(env, info_dictionary)
-		if self.logging:
-			print("notification", 'stack:', env.get_stack(), 'implicit:', env.implicit(), 'info:', info_dictionary)
-
-	def run(self, path=None):
+		self.stack_high_water_mark = None
+		self.backend = backend
+		self.compiled = None
+		self.inline_caches = []
+		self.folds = []
+		if fold and isinstance(syntax_tree, SyntaxTree):
+			self.folds = ConstantFolder(self).fold(syntax_tree)
+		self.analysis = StackAnalysis(self).analyse(syntax_tree) if isinstance(syntax_tree, SyntaxTree) else None
+
+	def _trace_token(self, env, token):
+		"""Tell the tracer a value or end of block token has been reached"""
+		self.trace_event.set(token)
+		self.tracer.on_enter(env, self.trace_event)
+
+	def run(self, path=None, parameters=None):
 		"""This function will run a program in syntax tree form.
-		It is the only function fully available to other modules."""
+		It is the only function fully available to other modules.
+		Parameters given here are used for this run instead of those the program was created with,
+		so the same program (and its compiled code and caches) can be run many times"""
 
 		base_env = Environment(path=path)
-		base_env.program_parameters = self.parameters
+		if parameters is not None:
+			base_env.program_parameters = [parse_program_parameter(parameter) for parameter in parameters]
+		else:
+			base_env.program_parameters = self.parameters
 
-		self._eval_context(base_env, self.syntax_tree)
+		if self.backend == 'closure':
+			self.compile()(base_env)
+		elif self.backend == 'bytecode':
+			self.compile().run(base_env)
+		else:
+			self._eval_context(base_env, self.syntax_tree)
+		self.stack_high_water_mark = base_env.stack.high_water_mark
 
 		return return_value(base_env.get_stack())
 
+	def compile(self):
+		"""Compile the syntax tree for the selected backend, once, and return the compiled program"""
+		if self.compiled is None and self.backend == 'closure':
+			self.compiled = ClosureCompiler(self).compile(self.syntax_tree)
+		elif self.compiled is None and self.backend == 'bytecode':
+			self.compiled = Bytecode(self).compile(self.syntax_tree)
+		return self.compiled
+
+	def inline_cache_statistics(self):
+		"""Totals for the inline caches at the call sites this program has run"""
+		return {'sites': len(self.inline_caches),
+		        'hits': sum([cache.hits for cache in self.inline_caches]),
+		        'misses': sum([cache.misses for cache in self.inline_caches]),
+		        'megamorphic': len([cache for cache in self.inline_caches if cache.megamorphic])}
+
 	def _eval_context(self, env, tree):
 		"""evaluate a single block of code, which is a list of tokens"""
 
@@ -66,13 +133,15 @@ class Program:
 		token_type = token.token_type
 
 		if token.value == ';' or token_type == 'end block':
-			self._notify(env, {'token': token})
+			if self.tracer is not None:
+				self._trace_token(env, token)
 
 		elif token_type == 'fn':
 			self._apply(env, token)
 
 		elif token_type == "value":
-			self._notify(env, {'token': token})
+			if self.tracer is not None:
+				self._trace_token(env, token)
 			env.push(token.value)
 
 		else:
@@ -84,16 +153,12 @@ class Program:
 	def _apply(self, env, token):
 		"""lookup a function token, gather parameters and run the code associated with the function"""
 
-		symbol = token.value
-		stack_parameters = []
 		code_parameters = []
 		fn_parameters = []
 		block_parameters = []
 
-		for _ in range(token.stack_values):
-			# Stack parameters are taken directly from the stack without evaluation
-			stack_parameters.append(env.pop())
-		stack_parameters = stack_parameters[::-1]
+		# Stack parameters are taken directly from the stack without evaluation
+		stack_parameters = env.pop_n(token.stack_values)
 
 		for code_token in token.code_tokens:
 			self._eval_context(env, code_token)
@@ -126,36 +191,52 @@ class Program:
 			# so the owner can control its environment and timing
 			block_parameters.append(lambda e: self._eval_context(e, token.sub_tree))
 
-		match = self.commands.match_command(symbol, stack_parameters, code_parameters, fn_parameters, block_parameters)
-		if match is None:
-			print("No matching function found", symbol,
-			      [type(t).__name__ for t in stack_parameters],
-			      [type(t).__name__ for t in code_parameters],
-			      [type(t).__name__ for t in block_parameters])
-			raise KeyError
-
-		notification_info = {'token': token,
-		                     'symbol': match['symbol'],
-		                     'alias': match['alias'],
-		                     'signature': match['signature'],
-		                     'type signature': match['type signature'],
-		                     'description': match['description'],
-		                     's-params': stack_parameters,
-		                     'c-params': code_parameters,
-		                     'f-params': fn_parameters,
-		                     'b-params': block_parameters,
-		                     'value': None}
-		self._notify(env, notification_info)
+		self._call(env, token, stack_parameters, code_parameters, fn_parameters, block_parameters)
+
+		return
 
+	def _call(self, env, token, stack_parameters, code_parameters, fn_parameters, block_parameters):
+		"""match a function token against its gathered parameters and run the command.
+		This is shared by the tree-walking interpreter and the compiled back-ends"""
+
+		symbol = token.value
 		all_parameters = stack_parameters + code_parameters + fn_parameters + block_parameters
-		type_signature = match['type signature']
-		used_fn = match['function']
-		transformed_parameters, transformed_fn = apply_type_transformations(all_parameters, type_signature, used_fn)
-		value = transformed_fn(env, *transformed_parameters)
+
+		cache = token.inline_cache
+		if cache is None:
+			cache = token.inline_cache = InlineCache(self.commands, symbol)
+			self.inline_caches.append(cache)
+		entry, key = cache.lookup(all_parameters)
+		if entry is None:
+			match = self.commands.match_command(symbol, stack_parameters, code_parameters, fn_parameters, block_parameters)
+			if match is None:
+				print("No matching function found", symbol,
+				      [type(t).__name__ for t in stack_parameters],
+				      [type(t).__name__ for t in code_parameters],
+				      [type(t).__name__ for t in block_parameters])
+				raise KeyError
+			entry = cache.store(key, all_parameters, match)
+		match = entry.match
+
+		tracer = self.tracer
+		if len(fn_parameters) > 0 and tracer is None:
+			# A fn parameter which is a single command (as in /+) is marked with its symbol, so the command
+			# can use a built-in equivalent rather than calling it for each value
+			for fn, fn_token in zip(fn_parameters, token.fn_tokens):
+				fn.symbol = _single_command(fn_token)
+
+		if tracer is not None:
+			event = self.trace_event
+			event.set(token, match, stack_parameters, code_parameters, fn_parameters, block_parameters)
+			tracer.on_enter(env, event)
+
+		value = entry.fn(env, *transform_parameters(all_parameters, entry.conversions))
 		if value is not None:
 			env.push(value)
 
-		notification_info['value'] = value
-		self._notify(env, notification_info)
+		if tracer is not None:
+			# The event may have been reused by tokens run inside the command, so it is filled in again
+			event.set(token, match, stack_parameters, code_parameters, fn_parameters, block_parameters, value)
+			tracer.on_exit(env, event)
 
 		return
@@ -9,11 +9,16 @@
 # Module contains various functions for running programs
 
 
-from time import perf_counter_ns
+import pickle
+import signal
+import sys
+import threading
+from contextlib import contextmanager
+from time import perf_counter_ns, process_time_ns
 
+from fb1337.cache import program_cache, syntax_tree
+from fb1337.environment import Environment
 from fb1337.execute import Program
-from fb1337.interactive import Interactive
-from fb1337.parser import SyntaxTree
 from fb1337.type_utilities import parse_program_parameter
 
 
@@ -28,36 +33,84 @@ def _create_parameter_list(name, parameters):
     return [name] + [parse_program_parameter(parameter) for parameter in parameters]
 
 
-def run(commented_code, parameters=None, name=None, path=None):
+def run(commented_code, parameters=None, name=None, path=None, backend='tree', profile=False, profile_json=None,
+        cache=True, fold=True):
     """Run an fb1337 program in quiet mode.
     Outputs contents of the stack at the end of the program (as a list if more than one item).
     Parameters provided as a list/tuple of integers are assumed to be Lists; as a list/tuple of floats as a Matrix
     integers and strings are imported as integers and strings
     for a null parameter, use an empty string
-    If no name is provided, the default files for input and output are f.in and f.out"""
-    tree = SyntaxTree(commented_code)
+    If no name is provided, the default files for input and output are f.in and f.out
+    The backend may be 'tree' (walk the syntax tree), 'closure' (compile to Python closures before running,
+    usually the fastest) or 'bytecode' (compile to instructions for the bytecode virtual machine, which can be listed)
+    With profile set, a report of the time spent in each command is printed after the program has run.
+    If profile_json is a file name, the raw profile data is saved to it as JSON
+    With cache set, the parsed program is saved in the program cache (see cache.py) and reused on later runs
+    With fold set, constant expressions are worked out once, before the program runs (see optimizer.py)"""
+    tree = syntax_tree(commented_code, cache)
     if parameters is None: parameters = list()
     program_parameters = _create_parameter_list(name, parameters)
-    program = Program(tree, program_parameters)
+    program = Program(tree, program_parameters, backend=backend, profile=profile or profile_json is not None,
+                      fold=fold)
 
     result = program.run(path=path)
+    _profile_output(program, profile, profile_json)
     return result
 
 
-def run_annotated(commented_code, parameters=None, name=None, title=None, expected=None, path=None):
+def _profile_output(program, profile, profile_json):
+    if profile:
+        program.profiler.report()
+        print()
+    if profile_json is not None:
+        program.profiler.dump_json(profile_json)
+
+
+def compile(commented_code, name=None, path=None, backend='tree', cache=True, fold=True):
+    """Parse (and for the closure and bytecode backends, compile) a program once, so it can be run
+    with many sets of parameters. Returns a CompiledProgram"""
+    return CompiledProgram(commented_code, name=name, path=path, backend=backend, cache=cache, fold=fold)
+
+
+class CompiledProgram:
+    """A program ready to be run many times. The syntax tree, command table, compiled code and inline
+    caches are shared by every run. Parameters are given as for run"""
+
+    def __init__(self, commented_code, name=None, path=None, backend='tree', cache=True, fold=True):
+        self.name = name
+        self.path = path
+        self.tree = syntax_tree(commented_code, cache)
+        self.program = Program(self.tree, _create_parameter_list(name, []), backend=backend, fold=fold)
+        self.program.compile()
+
+    def run(self, parameters=None):
+        """Run the program with one set of parameters and return the result"""
+        if parameters is None: parameters = list()
+        return self.program.run(path=self.path, parameters=_create_parameter_list(self.name, parameters))
+
+    def run_many(self, parameter_sets):
+        """Run the program with each set of parameters in turn, yielding each result as it is produced"""
+        for parameters in parameter_sets:
+            yield self.run(parameters)
+
+
+def run_annotated(commented_code, parameters=None, name=None, title=None, expected=None, path=None, backend='tree',
+                  profile=False, profile_json=None, cache=True, fold=True):
     """Run an fb1337 program in annotated mode.
     Outputs contents of the stack at the end of the program (as a list if more than one item).
     Parameters provided as a list/tuple of integers are assumed to be Lists; as a list/tuple of floats as a Matrix
     integers and strings are imported as integers and strings
     for a null parameter, use an empty string
     If no name is provided, the default files for input and output are f.in and f.ou
-    Additional information on the program and its execution as well as a listing of its syntax tree and comments are printed."""
+    Additional information on the program and its execution as well as a listing of its syntax tree and comments are printed.
+    The backend, profiling, cache and fold options are as for run"""
     # Print program information
-    tree = SyntaxTree(commented_code)
+    tree = syntax_tree(commented_code, cache)
     if parameters is None: parameters = list()
     if expected is None: expected = list()
     program_parameters = _create_parameter_list(name, parameters)
-    program = Program(tree, program_parameters)
+    program = Program(tree, program_parameters, backend=backend, profile=profile or profile_json is not None,
+                      fold=fold)
 
     code = _strip_comments(commented_code)
 
@@ -65,15 +118,41 @@ def run_annotated(commented_code, parameters=None, name=None, title=None, expect
     print()
     tree.pretty_print()
     print()
+    if backend == 'bytecode':
+        print(program.compile().disassemble())
+        print()
     print(code, 'length', len(code))
     print('parameters', program_parameters)
+    print('backend', backend)
+    if len(program.folds) > 0:
+        print('constants folded')
+        for folded in program.folds:
+            print(' ', folded.code_location[0], folded.code, '→', folded.value)
+    analysis = program.analysis
+    print('call sites selected before running', analysis.selected, 'of',
+          len([token for token in tree.tokens if token.token_type == 'fn']))
+    if len(analysis.underflows) > 0:
+        print('stack underflows')
+        for underflow in analysis.underflows:
+            print(' ', underflow)
     print()
 
+    environments = Environment.allocation_statistics()
     start_time = perf_counter_ns()
     result = program.run(path=path)
     end_time = perf_counter_ns()
 
     print('run time', round((end_time - start_time) / 1000000, 2), "ms")
+    statistics = program.inline_cache_statistics()
+    print('inline caches', statistics['sites'], 'sites', statistics['hits'], 'hits', statistics['misses'], 'misses',
+          statistics['megamorphic'], 'megamorphic')
+    statistics = Environment.allocation_statistics()
+    print('environments', statistics['created'] - environments['created'], 'created',
+          statistics['reused'] - environments['reused'], 'reused')
+    if cache:
+        statistics = program_cache().statistics()
+        print('program cache', 'hit' if program_cache().last_hit else 'miss', statistics['hits'], 'hits',
+              statistics['misses'], 'misses', 'hit rate', str(round(100 * statistics['hit rate'])) + '%')
     print()
     print('result', result)
     if result == expected or expected is None or expected == []:
@@ -81,6 +160,7 @@ def run_annotated(commented_code, parameters=None, name=None, title=None, expect
     else:
         print('expected', expected)
     print()
+    _profile_output(program, profile, profile_json)
 
     return result
 
@@ -89,44 +169,72 @@ def run_interactive(commented_code, parameters=None, name=None, path=None):
     """Run a program in interactive debugging mode
     The user can step through the program, set breakpoints and interact with the stack
     The current stack, environment stack and namespace are visible as well as details of each command"""
+    # The debugger needs PyQt5, so it is only imported when it is used
+    from fb1337.interactive import Interactive
     if parameters is None: parameters = list()
     program_parameters = _create_parameter_list(name, parameters)
     interactive_debugger = Interactive(commented_code=commented_code, program_parameters=program_parameters, path=path)
     interactive_debugger.start()
 
 
-def test(test_suite, verbose=False, path=None):
+def test(test_suite, verbose=False, path=None, backend='tree', workers=None, timeout=None, fold=True):
     """Run a complete test suite. The test suite should consist of a dictionary of examples, indexed by name
     Each entry provides a dictionary containing the following keys:
     - code: the fb1337 program which may contain comments
     - parameters: the program parameters
     - result: the expected result as a list of values expected to be on the stack on completion (from bottom to top)
+    The backend and fold are passed on to run
+    With workers, the tests are shared out over that many processes. The report is still in suite order.
+    Tests that cannot be pickled (e.g. with python functions as parameters) are run in this process
+    With a timeout (in seconds), a test that runs for longer is stopped and fails (Unix only)
+    Returns the failures, as (index, name, result or error, expected result)
     """
     if path is not None:
         file_path = path
     else:
         file_path = __file__
     failures = []
-    for i, test_info in enumerate(test_suite):
+    start_time = perf_counter_ns()
+    jobs = [(test_info['code'], test_info['parameters'], test_info['name'], file_path, backend, timeout, fold)
+            for test_info in test_suite]
+    if workers is not None and workers > 1:
+        from concurrent.futures import ProcessPoolExecutor
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_test_worker,
+                                 initargs=(sys.getrecursionlimit(),)) as executor:
+            futures = [executor.submit(_run_test, job) if _can_pickle(job) else None for job in jobs]
+            outcomes = (_test_outcome(future, job) for future, job in zip(futures, jobs))
+            cpu_time = _report_tests(test_suite, outcomes, failures, verbose)
+    else:
+        cpu_time = _report_tests(test_suite, map(_run_test, jobs), failures, verbose)
+    wall_time = perf_counter_ns() - start_time
+    print('Tests:', len(test_suite) - len(failures), 'of', len(test_suite), 'ok')
+    print('wall time', round(wall_time / 1000000, 2), "ms", 'cpu time', round(cpu_time / 1000000, 2), "ms",
+          ('(' + str(workers) + ' workers)') if workers is not None and workers > 1 else '')
+    if len(failures) > 0:
+        print("Failed:")
+        for i, name, result, expected in failures:
+            print(i + 1, name, 'result', result, 'expected', expected)
+    return failures
+
+
+def _report_tests(test_suite, outcomes, failures, verbose):
+    """Check each test's outcome in suite order, printing it if verbose. Returns the total CPU time of the tests"""
+    cpu_time = 0
+    for i, (test_info, (result, error, run_time, test_cpu_time)) in enumerate(zip(test_suite, outcomes)):
         code = test_info['code']
         parameters = test_info['parameters']
         name = test_info['name']
         expected = test_info['result']
-        start_time, end_time, result = None, None, None
-        try:
-            start_time = perf_counter_ns()
-            result = run(code, parameters, name=name, path=file_path)
-            end_time = perf_counter_ns()
-
-            if expected != result:
-                failures.append((i, name, result, expected))
-        except Exception as e:
-            failures.append((i, name, "Error: " + "'" + str(e) + "'", expected))
+        cpu_time += test_cpu_time
+        if error is not None:
+            failures.append((i, name, "Error: " + "'" + error + "'", expected))
+        elif expected != result:
+            failures.append((i, name, result, expected))
         if verbose:
             print(i + 1, name, (parameters if len(parameters) > 0 else ''), '"' + str(code) + '" length',
                   len(_strip_comments(code)))
-            if end_time is not None:
-                print('run time', round((end_time - start_time) / 1000000, 2), "ms")
+            if run_time is not None:
+                print('run time', round(run_time / 1000000, 2), "ms")
             print('result', result)
             if result == expected:
                 print('ok')
@@ -134,14 +242,79 @@ def test(test_suite, verbose=False, path=None):
                 print('expected', expected)
             print("-----")
             print()
-    print('Tests:', len(test_suite) - len(failures), 'of', len(test_suite), 'ok')
-    if len(failures) > 0:
-        print("Failed:")
-        for i, name, result, expected in failures:
-            print(i + 1, name, 'result', result, 'expected', expected)
+    return cpu_time
+
+
+class RunTimeout(BaseException):
+    # Not an Exception, so it cannot be caught by the program being run
+    pass
+
+
+def _on_timeout(signal_number, frame):
+    raise RunTimeout()
+
+
+@contextmanager
+def time_limit(timeout):
+    """Raise RunTimeout in the enclosed code if it runs for longer than timeout seconds (or never if None).
+    The limit is only enforced on Unix, in the main thread. It is a SIGALRM, which Python only acts on between
+    bytecodes, so a single long call into C code (e.g. a huge integer power) is only stopped once it returns"""
+    if timeout is None or not hasattr(signal, 'setitimer') or threading.current_thread() is not threading.main_thread():
+        yield
+        return
+    previous_handler = signal.signal(signal.SIGALRM, _on_timeout)
+    try:
+        signal.setitimer(signal.ITIMER_REAL, timeout)
+        yield
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous_handler)
+
+
+def _can_pickle(job):
+    # Tests with python functions as parameters cannot be sent to a worker process
+    try:
+        pickle.dumps(job)
+        return True
+    except Exception:
+        return False
+
+
+def _test_outcome(future, job):
+    """Wait for a test run in a worker process. Tests that could not be sent to a worker, or whose result
+    could not be sent back, are run in this process instead"""
+    if future is not None:
+        try:
+            return future.result()
+        except pickle.PicklingError:
+            pass
+    return _run_test(job)
+
+
+def _init_test_worker(recursion_limit):
+    # Worker processes do not inherit the recursion limit when they are spawned rather than forked
+    sys.setrecursionlimit(recursion_limit)
+
+
+def _run_test(job):
+    """Run a single test, returning its result, an error message (or None), its run time and its CPU time in ns.
+    This is run in the worker processes, so it must be a module level function"""
+    code, parameters, name, path, backend, timeout, fold = job
+    start_time, start_cpu = perf_counter_ns(), process_time_ns()
+    try:
+        with time_limit(timeout):
+            result = run(code, parameters, name=name, path=path, backend=backend, fold=fold)
+        return result, None, perf_counter_ns() - start_time, process_time_ns() - start_cpu
+    except RunTimeout:
+        return None, 'timed out after ' + str(timeout) + 's', None, process_time_ns() - start_cpu
+    except Exception as e:
+        # Many errors are raised bare (e.g. KeyError), so the type is the only description they have
+        message = type(e).__name__ if str(e) == '' else type(e).__name__ + ': ' + str(e)
+        return None, message, None, process_time_ns() - start_cpu
 
 
 def interactive_from_test_suite(test_suite, name, path=None):
+    from fb1337.interactive import Interactive
     if path is None: path = __file__
     for t in test_suite:
         if t['name'] == name:
@@ -17,6 +17,7 @@ from PyQt5.QtWidgets import QMainWindow, QApplication, QVBoxLayout, QHBoxLayout,
 
 from fb1337.execute import Program
 from fb1337.parser import SyntaxTree
+from fb1337.tracing import Tracer
 
 
 class NotifyWindow(QMainWindow):
@@ -227,12 +228,12 @@ class NotifyWindow(QMainWindow):
             self.quit()
 
 
-class Interactive:
+class Interactive(Tracer):
 
     def __init__(self, commented_code, program_parameters, path=None):
 
         self.tree = SyntaxTree(commented_code)
-        self.program = Program(self.tree, parameters=program_parameters, debugger=self, logging=False)
+        self.program = Program(self.tree, parameters=program_parameters, tracer=self)
         self.path = path
 
         self.interrupt = True
@@ -258,6 +259,14 @@ class Interactive:
         app = None
         dlg = None
 
+    # The debugger is a tracer: it is told about every token, before and after it runs
+
+    def on_enter(self, env, event):
+        self.notify(env, event.info_dictionary())
+
+    def on_exit(self, env, event):
+        self.notify(env, event.info_dictionary())
+
     def notify(self, env, info_dictionary):
         if self.interrupt or info_dictionary['token'].index in self.breakpoints:
             app = QApplication([])
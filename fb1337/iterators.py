@@ -8,10 +8,12 @@
 # iterators.py
 # Iterator class - turns (almost) anything into an iterable and iterates over it.
 
+import operator
+
 import numpy as np
 
 
-from fb1337.array import Array
+from fb1337.array import Array, Range
 from fb1337.environment import Environment
 from fb1337.lambda_fn import run_object, runnable
 from fb1337.slice import Slice
@@ -51,68 +53,41 @@ class Iterator:
 
 	@classmethod
 	def from_object(cls, obj):
-		new_iterator = Iterator()
+		"""Numbers, Slices, strings, arrays and lists are iterated by the fast iterator kinds below,
+		which work out each value directly rather than by running init, cond and update functions"""
 		if type(obj) in (int, bool, float, np.float_):
-			new_iterator.array = None
-			new_iterator.pointer = None
 			if obj < 0:
-				new_iterator.init = lambda e: -round(obj)
-				new_iterator.cond = lambda e: new_iterator.implicit > 0
-				new_iterator.update = lambda e: new_iterator.implicit - 1
+				return CountIterator(-round(obj), -1, operator.gt, 0)
 			elif obj > 0:
-				new_iterator.init = lambda e: 1
-				new_iterator.cond = lambda e: new_iterator.implicit <= round(obj)
-				new_iterator.update = lambda e: new_iterator.implicit + 1
+				return CountIterator(1, 1, operator.le, round(obj))
 			else:
-				new_iterator.init = lambda e: 0
-				new_iterator.cond = lambda e: False
-				new_iterator.update = lambda e: 0
+				return CountIterator(0, 0, operator.gt, 0)
 		elif type(obj) is str:
-			new_iterator.array = obj
-			new_iterator.pointer = 0
-			if len(obj) > 0:
-				new_iterator.init = lambda e: new_iterator.array[new_iterator.pointer]
-				new_iterator.cond = lambda e: new_iterator.pointer < len(new_iterator.array)
-				new_iterator.update = lambda e: [new_iterator.next(), new_iterator.value_at_pointer()][1]
-			else:
-				new_iterator.init = lambda e: ''
-				new_iterator.cond = lambda e: False
-				new_iterator.update = lambda e: ''
+			return SequenceIterator(obj, 0, '')
+		elif isinstance(obj, Range) and obj.is_lazy():
+			# The range holds no nulls, and is read without storing its values unless the loop body changes them
+			return SequenceIterator(_LiveRange(obj), 0, '')
 		elif isinstance(obj, Array):
 			if obj.is_structured() and len(obj.get_shape()) > 1:
-				new_iterator.array = [obj.build(x) for x in obj.structured_values()]
-				new_iterator.pointer = 0
-			else:
-				new_iterator.array = obj.values
-				new_iterator.pointer = 0
-				while new_iterator.pointer < len(new_iterator.array) and new_iterator.array[new_iterator.pointer] == '':
-					new_iterator.pointer += 1
-			if len(new_iterator.array) > 0:
-				new_iterator.init = lambda e: new_iterator.array[new_iterator.pointer]
-				new_iterator.cond = lambda e: new_iterator.pointer < len(new_iterator.array)
-				new_iterator.update = lambda e: [new_iterator.next(), new_iterator.value_at_pointer()][1]
-			else:
-				new_iterator.init = lambda e: 0 if obj.is_structured() else ''
-				new_iterator.cond = lambda e: False
-				new_iterator.update = lambda e: 0 if obj.is_structured() else ''
+				return SequenceIterator([obj.build(x) for x in obj.structured_values()], 0, 0)
+			array = obj.values
+			pointer = 0
+			while pointer < len(array) and array[pointer] == '':
+				pointer += 1
+			return SequenceIterator(array, pointer, 0 if obj.is_structured() else '')
 		elif isinstance(obj, Slice):
-			new_iterator.init = lambda e: obj.start_value
-			new_iterator.cond = lambda e: (new_iterator.implicit < obj.stop_value) if obj.ascending \
-				else (new_iterator.implicit > obj.stop_value)
-			new_iterator.update = lambda e: new_iterator.implicit + obj.step_value
+			return CountIterator(obj.start_value, obj.step_value, operator.lt if obj.ascending else operator.gt,
+			                     obj.stop_value)
 		elif type(obj) in (tuple, list, np.ndarray) and len(obj) > 0:
-			new_iterator.array = list(obj)
-			new_iterator.pointer = 0
-			new_iterator.init = lambda e: new_iterator.array[new_iterator.pointer]
-			new_iterator.cond = lambda e: new_iterator.pointer < len(new_iterator.array)
-			new_iterator.update = lambda e: new_iterator.array[new_iterator.next()]
+			return SequenceIterator(list(obj), 0, '')
 		elif obj is None or obj == '':
+			new_iterator = Iterator()
 			new_iterator.init = lambda e: 1
 			new_iterator.cond = lambda e: True
 			new_iterator.update = lambda e: 1
+			return new_iterator
 		else:
 			raise TypeError("Cannot iterate over", obj)
-		return new_iterator
 
 	@classmethod
 	def from_functions(cls, start_block, cond_block, step_block):
@@ -138,36 +113,150 @@ class Iterator:
 
 	def start(self, env, body):
 
+		self.begin(env)
+
+		while self.proceed(env):
+			block_env = Environment.acquire(env)
+			body(block_env)
+			block_env.release()
+			self.advance(env)
+
+		self.finish(env)
+
+		return None
+
+	# The steps of start are also available separately, so the bytecode VM can run the body without a Python call
+
+	def begin(self, env):
 		env.implicit_object = self
 
 		run_object(env, self.init)
 		self.previous = self.implicit
 		self.implicit = env.pop()
 
-		while not self.exit_now:
+	def proceed(self, env):
+		"""Returns whether the body should be run (again)"""
+		if self.exit_now:
+			return False
+		run_object(env, self.cond)
+		return Array.truthy(env.pop())
+
+	def advance(self, env):
+		run_object(env, self.update)
+		self.previous = self.implicit
+		self.implicit = env.pop()
+
+	def finish(self, env):
+		env.implicit_object = None
 
-			run_object(env, self.cond)
-			run_block = Array.truthy(env.pop())
+	def exit_iteration(self):
+		self.exit_now = True
 
-			if run_block:
-				block_env = Environment(env)
-				block_env.implicit_obj = self
-				body(block_env)
+	def __repr__(self):
+		return "<Iterator implicit=" + str(self.implicit) + ">"
 
-			else:
 
-				break
+class CountIterator(Iterator):
+	"""Counts from first in steps while compare(value, bound) is true: 5: counts 1 to 5, ~5: counts 5 down to 1
+	and a Slice counts from its start towards its stop. The loop is run directly in Python"""
 
-			run_object(env, self.update)
+	def __init__(self, first, step, compare, bound):
+		super().__init__()
+		self.first = first
+		self.step = step
+		self.compare = compare
+		self.bound = bound
+
+	def start(self, env, body):
+		self.begin(env)
+
+		compare, bound, step = self.compare, self.bound, self.step
+		while not self.exit_now and compare(self.implicit, bound):
+			block_env = Environment.acquire(env)
+			body(block_env)
+			block_env.release()
 			self.previous = self.implicit
-			self.implicit = env.pop()
+			self.implicit = self.implicit + step
 
-		env.implicit_object = None
+		self.finish(env)
 
 		return None
 
-	def exit_iteration(self):
-		self.exit_now = True
+	def begin(self, env):
+		env.implicit_object = self
+		self.previous = self.implicit
+		self.implicit = self.first
 
-	def __repr__(self):
-		return "<Iterator implicit=" + str(self.implicit) + ">"
+	def proceed(self, env):
+		return not self.exit_now and self.compare(self.implicit, self.bound)
+
+	def advance(self, env):
+		self.previous = self.implicit
+		self.implicit = self.implicit + self.step
+
+
+class _LiveRange:
+	# The values of a Range as a sequence: read from the range while the values are not stored, then from the
+	# stored list, so changes made to it by the loop body are seen as they are for any other list
+	__slots__ = ('range', 'values')
+
+	def __init__(self, range_list):
+		self.range = range_list
+		self.values = None
+
+	def __len__(self):
+		if self.values is None and self.range.is_lazy():
+			return len(self.range.span)
+		return len(self._stored())
+
+	def __getitem__(self, index):
+		if self.values is None and self.range.is_lazy():
+			return self.range.span[index]
+		return self._stored()[index]
+
+	def _stored(self):
+		# The list the values were first stored in, as a loop over any other list keeps the list it started with
+		if self.values is None:
+			self.values = self.range.values
+		return self.values
+
+
+class SequenceIterator(Iterator):
+	"""Steps through the values of a string, array or list, skipping null values. The array is not copied,
+	so changes made to it by the loop body are seen by later steps. Once the values run out the implicit value
+	is null, or empty when the sequence was empty"""
+
+	def __init__(self, array, pointer, empty):
+		super().__init__()
+		self.array = array
+		self.pointer = pointer
+		self.empty = empty
+
+	def start(self, env, body):
+		self.begin(env)
+
+		array = self.array
+		while not self.exit_now and self.pointer < len(array):
+			block_env = Environment.acquire(env)
+			body(block_env)
+			block_env.release()
+			self.next()
+			self.previous = self.implicit
+			self.implicit = self.value_at_pointer()
+
+		self.finish(env)
+
+		return None
+
+	def begin(self, env):
+		env.implicit_object = self
+		self.previous = self.implicit
+		self.implicit = self.array[self.pointer] if self.pointer < len(self.array) else self.empty
+
+	def proceed(self, env):
+		return not self.exit_now and self.pointer < len(self.array)
+
+	def advance(self, env):
+		self.next()
+		self.previous = self.implicit
+		self.implicit = self.value_at_pointer()
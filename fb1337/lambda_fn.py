@@ -50,6 +50,7 @@ def fp2fn(e, f, n):
 		f(e)
 		return e.pop()
 
+	new_fn.symbol = getattr(f, 'symbol', None)
 	return new_fn
 
 
@@ -83,11 +84,12 @@ class Lambda:
 			env.push(self.cache[param])
 			return
 
-		local_env = Environment(env)
+		local_env = Environment.acquire(env)
 		self.block(local_env)
 
 		if self.cache is not None and param is not None and type(param).__hash__:
 			self.cache[param] = local_env.peek()
+		local_env.release()
 
 	@staticmethod
 	def combinator(comb, f, g=(lambda e: 0), h=(lambda e: 0)):
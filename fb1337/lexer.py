@@ -35,34 +35,43 @@ token_patterns = [
 
 	(r"`nl", 'newline'),
 
-	(r"([a-zA-Z]|`.)+", 'literal'),
+	(r"(?:[a-zA-Z]|`.)+", 'literal'),
 
-	(r"(\)|\;)", 'block end'),
+	(r"(?:\)|\;)", 'block end'),
 
 	(r'.', 'symbol')]
 
 comment_pattern = r"\A[\t ]*([^\t⍝]*)[\t⍝]([^\n\r]*)(?:[\n\r]*)"
 
 
-def match(re_patterns: list, code_string: str, offset: int) -> (str, str, int):
-	"""Takes a code string and finds the first matching token after the offset"""
-	code = code_string[offset:]
-	if len(code) == 0:
+def _combine_patterns(patterns: list) -> (re.Pattern, dict):
+	"""Combine the token patterns into a single regex, with a named group for each pattern. The alternatives are
+	tried in order, so the first pattern to match wins, as if each had been tried separately"""
+	groups = ['(?P<t' + str(i) + '>' + pattern + ')' for i, (pattern, token_type) in enumerate(patterns)]
+	group_types = {'t' + str(i): token_type for i, (pattern, token_type) in enumerate(patterns)}
+	return re.compile('|'.join(groups)), group_types
+
+
+token_re, token_group_types = _combine_patterns(token_patterns)
+comment_re = re.compile(comment_pattern)
+
+
+def match(code_string: str, offset: int) -> (str, str, int):
+	"""Takes a code string and finds the token starting at the offset"""
+	if offset >= len(code_string):
 		return '', "return", len(code_string)
 
-	for p, token_type in re_patterns:
-		m = p.match(code)
-		if m:
-			return m.group(), token_type, offset + m.end()
+	m = token_re.match(code_string, offset)
+	if m:
+		return m.group(), token_group_types[m.lastgroup], m.end()
 	else:
-		raise SyntaxError("No matching tokens found", code)
+		raise SyntaxError("No matching tokens found", code_string[offset:])
 
 
 def separate_comments(commented_code: str) -> (str, dict):
 	"""Extract the comments from the code and return the cleaned code and comments"""
 	# Extract comments from the code, to be added to the tokens later
 	lines: List[str] = commented_code.split('\n')
-	comment_re = re.compile(comment_pattern)
 
 	code_fragments: List[str] = []
 	location: int = 0
@@ -84,47 +93,54 @@ def separate_comments(commented_code: str) -> (str, dict):
 	return "".join(code_fragments), comments
 
 
-def get_comments_for_token(comments, lost_comments, location, consumed):
-	"""Identify comments belonging to the code consumed in last match"""
-	token_comments: List[str] = []
-	token_comments += lost_comments
-	for i in range(location + 1, location + consumed + 1):
-		if i in comments:
-			token_comments += [comments[i]]
-	return '; '.join(token_comments)
+class CommentIndex:
+	"""The comments in a program, sorted by location, for tokens which are read from left to right"""
 
+	def __init__(self, comments: dict):
+		self.locations: List[int] = sorted(comments.keys())
+		self.comments: dict = comments
+		self.next: int = 0
 
-def tokenize(commented_code: str) -> list:
-	"""Break the code into lexical tokens, and separate out the comments"""
-	# compile the regex patterns for token identification
-	code_re = [(re.compile(pattern), name) for pattern, name in token_patterns]
+	def comments_for_token(self, lost_comments: List[str], start: int, end: int) -> str:
+		"""Identify comments belonging to the code from start to end, which must follow the previous token"""
+		token_comments: List[str] = list(lost_comments)
+		while self.next < len(self.locations) and self.locations[self.next] <= end:
+			if self.locations[self.next] > start:
+				token_comments.append(self.comments[self.locations[self.next]])
+			self.next += 1
+		return '; '.join(token_comments)
 
+
+def iter_tokens(commented_code: str):
+	"""Break the code into lexical tokens, and separate out the comments. Tokens are yielded as they are read"""
 	# Extract comments from the code
 	code: str
 	comments: dict
 	code, comments = separate_comments(commented_code)
+	return iter_code_tokens(code, comments)
+
+
+def iter_code_tokens(code: str, comments: dict):
+	"""Break code which has had its comments separated out into lexical tokens"""
+	comment_index = CommentIndex(comments)
 
 	# Break the code into lexical tokens
 	location: int = 0
-	tokens: List[tuple] = []
 	lost_comments: List[str] = []
-	while len(code) > 0:
+	while location < len(code):
 
 		# Read the next token
 		token: str
 		token_type: str
-		consumed: int
-		token_comment_str: str
-		token, token_type, consumed = match(code_re, code, offset=0)
+		token_end: int
+		token, token_type, token_end = match(code, location)
 
 		# Identify any comments related to this token
-		token_comment_str = get_comments_for_token(comments, lost_comments, location, consumed)
+		token_comment_str: str = comment_index.comments_for_token(lost_comments, location, token_end)
 		lost_comments = []
 
-		# Extract the token code and move ahead
-		token_start = location
-		location += consumed
-		token_code, code = code[:consumed], code[consumed:]
+		# Move ahead
+		token_start, location = location, token_end
 
 		# Turn the regex identification into a correct lexical token
 		value = token
@@ -153,11 +169,13 @@ def tokenize(commented_code: str) -> list:
 			token_type = 'value'
 			value = token.replace('`', '')
 
-		tokens.append(
-			(token_type,
-			 value,
-			 {'comments': token_comment_str,
-			  'token_code': token_code,
-			  'code location': (token_start, location)}))
+		yield (token_type,
+		       value,
+		       {'comments': token_comment_str,
+		        'token_code': token,
+		        'code location': (token_start, location)})
 
-	return tokens
+
+def tokenize(commented_code: str) -> list:
+	"""Break the code into lexical tokens, and separate out the comments"""
+	return list(iter_tokens(commented_code))
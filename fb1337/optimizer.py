@@ -0,0 +1,203 @@
+# FBl337
+# Programming Code Golf Language
+# Created: 21 February 2024
+# Version: 21 February 2024 12:00PM
+# Copyright: James Leibert 2024
+# Licence: Available for use under the GPL3 Licence https://www.gnu.org/licenses/gpl-3.0.txt
+
+# optimizer.py
+# Constant folding: commands with constant inputs and no side effects are run once, before the program runs
+
+
+import io
+import math
+from contextlib import redirect_stdout
+
+import numpy as np
+
+from fb1337.array import Array
+from fb1337.commands import FBLeet_language
+from fb1337.environment import Environment
+from fb1337.parser import SyntaxToken
+
+# Commands in these groups only depend on their parameters
+FOLDABLE_GROUPS = {'math', 'string', 'list', 'array', 'set', 'coordinate', 'matrix', 'structured array'}
+# Except for these, which use the whole stack or change their parameters
+UNFOLDABLE_SYMBOLS = {'⏍', '☐', '☆', '⌸', '⬇', '⬆', '⌘'}
+
+command_groups = {command['symbol']: command['group'] for command in FBLeet_language}
+
+# Folding runs commands in branches that may never run, so it is kept cheap. Folded values hold at most
+# FOLD_SIZE_LIMIT items (or characters, or digits), and integer inputs larger than FOLD_SIZE_LIMIT are only folded
+# by these commands, whose time does not grow with the size of the integer (e.g. 99999⍳, 9,99999* and 99999! are not).
+# Since a value larger than this is never folded, it cannot be the input of a further fold, so the work each fold
+# does is bounded by its inputs and whether code is folded does not depend on how long it takes
+FOLD_SIZE_LIMIT = 1000
+SIZE_FREE_SYMBOLS = {'~', '+', '-', '÷', '%', '‰', '‱', '|', '⩲', '²', '√', '⊛', '±', '⨸', '⩓', '⩔', '⌈', '⌊',
+                     '=', '≠', '<', '≤', '>', '≥', '¬', '∧', '∨'}
+
+# Value tokens push the same object every time they are run, so only values which cannot be changed in place
+# can be folded into a token. Arrays can still be used as the inputs of a fold with an unchangeable result.
+IMMUTABLE_TYPES = (int, float, str, bool, np.generic)
+
+_not_folded = object()
+
+
+def _size(value):
+	# The number of items, characters or decimal digits in a value
+	if isinstance(value, Array):
+		return math.prod(value.get_shape())
+	if isinstance(value, (str, list, tuple, dict, set)):
+		return len(value)
+	if type(value) is int:
+		return value.bit_length() * 3 // 10
+	return 1
+
+
+class Fold:
+	"""A record of some code which was replaced by its value"""
+
+	__slots__ = ('code', 'value', 'code_location')
+
+	def __init__(self, code, value, code_location):
+		self.code = code
+		self.value = value
+		self.code_location = code_location
+
+	def __repr__(self):
+		return self.code + ' → ' + repr(self.value)
+
+
+class _Constant:
+	# A value that will be on the stack at this point in a block. It is pushed by a value token,
+	# or is the result of running a command token on the constants it takes as inputs
+	__slots__ = ('value', 'token', 'inputs', 'folded')
+
+	def __init__(self, value, token, inputs=(), folded=False):
+		self.value = value
+		self.token = token
+		self.inputs = inputs
+		self.folded = folded
+
+	def originals(self):
+		"""All the tokens in the original code which put the constant on the stack"""
+		tokens = []
+		work = [self]
+		while len(work) > 0:
+			constant = work.pop()
+			tokens.append(constant.token)
+			tokens.extend(constant.token.code_tokens)
+			work.extend(constant.inputs)
+		return tokens
+
+
+class ConstantFolder:
+	"""Finds runs of tokens in each block which only push constants and run commands without side effects
+	(e.g. 3,4,5++ or ḳ𝜋#), runs them using the program's own commands, and replaces them with a value token.
+	A command is folded when the values it takes from the stack were all pushed by the tokens immediately
+	before it in the same block, and its code parameters are values"""
+
+	def __init__(self, program):
+		self.program = program
+		self.folds = []
+
+	def fold(self, syntax_tree):
+		"""Fold the constants in the syntax tree, changing it in place. Returns a list of the Folds made"""
+		tracer, self.program.tracer = self.program.tracer, None
+		try:
+			for token in syntax_tree.tokens:
+				if token.sub_tree is not None:
+					token.sub_tree[:] = self._fold_block(syntax_tree, token.sub_tree)
+			tree = syntax_tree.tree
+			if type(tree) is list and len(tree) > 0 and type(tree[0]) is list:
+				for context in tree:
+					context[:] = self._fold_block(syntax_tree, context)
+			elif type(tree) is list:
+				tree[:] = self._fold_block(syntax_tree, tree)
+		finally:
+			self.program.tracer = tracer
+		if len(self.folds) > 0:
+			syntax_tree.reindex()
+		return self.folds
+
+	def _fold_block(self, syntax_tree, block):
+		folded = []
+		constants = []  # The constants pushed by the tokens since the last token which could not be folded
+
+		def tokens_for(constant):
+			# Only unchangeable values are replaced by a token, others are worked out each time from their inputs
+			tokens = []
+			work = [constant]
+			while len(work) > 0:
+				item = work.pop()
+				if isinstance(item, SyntaxToken) or not item.folded:
+					tokens.append(item if isinstance(item, SyntaxToken) else item.token)
+				elif isinstance(item.value, IMMUTABLE_TYPES):
+					tokens.append(self._value_token(syntax_tree, item))
+				else:
+					work.append(item.token)
+					work.extend(reversed(item.inputs))
+			return tokens
+
+		for token in block:
+			if token.token_type == 'value':
+				constants.append(_Constant(token.value, token))
+				continue
+
+			value = _not_folded
+			if self._foldable(token) and token.stack_values <= len(constants):
+				inputs = constants[len(constants) - token.stack_values:]
+				value = self._evaluate(token, [constant.value for constant in inputs])
+
+			if value is _not_folded:
+				for constant in constants:
+					folded.extend(tokens_for(constant))
+				constants.clear()
+				folded.append(token)
+				continue
+
+			del constants[len(constants) - len(inputs):]
+			constants.append(_Constant(value, token, inputs, True))
+
+		for constant in constants:
+			folded.extend(tokens_for(constant))
+		return folded
+
+	@staticmethod
+	def _foldable(token):
+		return token.token_type == 'fn' and len(token.fn_tokens) == 0 and token.sub_tree is None and \
+			command_groups.get(token.value) in FOLDABLE_GROUPS and token.value not in UNFOLDABLE_SYMBOLS and \
+			all([code_token.token_type == 'value' for code_token in token.code_tokens])
+
+	def _evaluate(self, token, values):
+		"""Run the command on the values, and return the single value it leaves on the stack"""
+		if token.value not in SIZE_FREE_SYMBOLS and \
+				any([type(value) is int and abs(value) > FOLD_SIZE_LIMIT for value in values]):
+			return _not_folded
+		program = self.program
+		env = Environment()
+		env.push_many(values)
+		inline_caches = len(program.inline_caches)
+		try:
+			# Commands which do not match their parameters print a message before raising an error
+			with redirect_stdout(io.StringIO()):
+				program._apply(env, token)
+		except Exception:
+			return _not_folded
+		finally:
+			token.inline_cache = None
+			del program.inline_caches[inline_caches:]
+		stack = env.get_stack()
+		if len(stack) != 1 or stack[0] is None or _size(stack[0]) > FOLD_SIZE_LIMIT:
+			return _not_folded
+		return stack[0]
+
+	def _value_token(self, syntax_tree, constant):
+		originals = sorted(constant.originals(), key=lambda t: t.code_location)
+		start, end = originals[0].code_location[0], originals[-1].code_location[1]
+		code = syntax_tree.source.code[start:end]
+		comments = '; '.join([t.comments for t in originals if len(t.comments) > 0])
+		self.folds.append(Fold(code, constant.value, (start, end)))
+		return SyntaxToken(('value', constant.value, {'comments': comments, 'token_code': code,
+		                                              'code location': (start, end)}),
+		                   source=syntax_tree.source)
@@ -9,7 +9,12 @@
 # Abstract Syntax Tree builder for fb1337 interpreter
 
 
-from fb1337.lexer import tokenize
+import sys
+from array import array
+
+from fb1337.lexer import separate_comments, iter_code_tokens
+
+_parse_token_types = {'fn': 'symbol', 'end block': 'block end'}
 
 # Complete list of all functions available and their signatures. These need to match the commands
 # given in the FBLCommands module
@@ -21,33 +26,114 @@ def add_command_signature(symbol, signature, alias):
 	command_dictionary[symbol] = (signature, alias,)
 
 
+# Shared by all tokens without code or function parameters
+EMPTY = ()
+
+
+class SourceTable:
+	"""The code text, code location and comments of each token in a program. These are stored once for the
+	whole program, in arrays indexed by token id (the order in which the tokens were read), rather than on
+	every token. Most tokens have no comments, so comments are kept in a dictionary"""
+
+	__slots__ = ('code', 'starts', 'ends', 'comments', 'texts')
+
+	def __init__(self, code=''):
+		self.code = code  # The program with its comments removed
+		self.starts = array('l')
+		self.ends = array('l')
+		self.comments = dict()
+		self.texts = dict()  # Code text for any token which is not found in the code at its location
+
+	def add(self, lexical_token):
+		"""Record the source information of a lexical token and return its token id"""
+		information = lexical_token[2]
+		token_id = len(self.starts)
+		start, end = information['code location']
+		self.starts.append(start)
+		self.ends.append(end)
+		if len(information['comments']) > 0:
+			self.comments[token_id] = information['comments']
+		if self.code[start:end] != information['token_code']:
+			self.texts[token_id] = information['token_code']
+		return token_id
+
+
 class SyntaxToken:
 	"""Syntax Tokens are nodes in the Syntax Tree. Each node consists of a single token
 	(similar to a parse token with extra information on its location in the tree) as well
 	as the parameters and blocks for function tokens required to run the token, which
-	constitute the next level in the tree."""
+	constitute the next level in the tree.
+	To keep large programs small, the comments and code text are kept in the program's SourceTable,
+	and the location in the tree is found from the token's parent when it is needed."""
+
+	__slots__ = ('token_type', 'value', 'stack_values', 'code_tokens', 'fn_tokens', 'sub_tree', 'index',
+	             'inline_cache', 'source', 'token_id', 'parent', 'step')
 
 	def __init__(self, lexical_token,
 	             token_type=None, value=None,
-	             stack_values=None, code_tokens=None, fn_tokens=None, sub_tree=None):
+	             stack_values=None, code_tokens=None, fn_tokens=None, sub_tree=None, source=None):
 
 		self.token_type = lexical_token[0] if token_type is None else token_type
 		self.value = lexical_token[1] if value is None else value
 
-		self.comments = lexical_token[2]['comments']
-		self.code_location = lexical_token[2]['code location']
-		self.code_text = lexical_token[2]['token_code']
-		self.parse_token_type = lexical_token[0]
-		self.parse_token = lexical_token
+		self.source = SourceTable() if source is None else source
+		self.token_id = self.source.add(lexical_token)
 
 		self.stack_values = 0 if stack_values is None else stack_values
-		self.code_tokens = [] if code_tokens is None else code_tokens
-		self.fn_tokens = [] if fn_tokens is None else fn_tokens
+		self.code_tokens = tuple(code_tokens) if code_tokens else EMPTY
+		self.fn_tokens = tuple(fn_tokens) if fn_tokens else EMPTY
 		self.sub_tree = None if sub_tree is None else sub_tree
 
-		self.location = None
+		# The location in the tree is the parent's location followed by the step (see SyntaxTree)
+		self.parent = None
+		self.step = None
 		self.index = None
 
+		# Inline dispatch cache for function tokens, created by the Program when the token is first called
+		self.inline_cache = None
+
+	@property
+	def comments(self):
+		return self.source.comments.get(self.token_id, '')
+
+	@property
+	def code_location(self):
+		return self.source.starts[self.token_id], self.source.ends[self.token_id]
+
+	@property
+	def code_text(self):
+		if self.token_id in self.source.texts:
+			return self.source.texts[self.token_id]
+		return self.source.code[self.source.starts[self.token_id]:self.source.ends[self.token_id]]
+
+	@property
+	def parse_token_type(self):
+		return _parse_token_types.get(self.token_type, self.token_type)
+
+	@property
+	def parse_token(self):
+		"""The lexical token the syntax token was made from"""
+		return (self.parse_token_type,
+		        self.value,
+		        {'comments': self.comments,
+		         'token_code': self.code_text,
+		         'code location': self.code_location})
+
+	@property
+	def location(self):
+		"""The path to the token through the syntax tree"""
+		if self.step is None:
+			return None
+		steps = []
+		token = self
+		while token is not None:
+			steps.append(token.step)
+			token = token.parent
+		location = ()
+		for step in reversed(steps):
+			location += (step,) if type(step) is int else step
+		return location
+
 	def __repr__(self):
 		params = []
 		if self.stack_values > 0:
@@ -78,6 +164,57 @@ class SyntaxToken:
 		return s
 
 
+class _FunctionSyntax:
+	"""A function token whose parameters and block are still being read by the parser"""
+
+	def __init__(self, parse_token, source):
+		self.parse_token = parse_token
+		self.source = source
+		# Every use of a command shares one copy of its symbol
+		self.symbol = sys.intern(parse_token[1])
+		signature, alias = command_dictionary[self.symbol] if self.symbol in command_dictionary else (None, None)
+
+		if signature is None:
+			print(self.symbol, 'not found')
+			raise SyntaxError
+
+		self.stack_values, self.code_values, self.function_values, self.blocks = signature
+		self.code_value_syntax = []
+		self.function_value_syntax = []
+		self.sub_tree_syntax = [] if self.blocks else None
+		self.end_block = False
+
+	def needs_parameter(self):
+		return len(self.code_value_syntax) < self.code_values or \
+			len(self.function_value_syntax) < self.function_values
+
+	def complete(self, end_of_program):
+		"""The function is complete when it has its parameters and, if it has a block, the block has ended"""
+		if self.needs_parameter():
+			return False
+		return not self.blocks or self.end_block or end_of_program
+
+	def add(self, syntax):
+		"""Add the next token read by the parser: a code parameter, a function parameter, or part of the block"""
+		if len(self.code_value_syntax) < self.code_values:
+			self.code_value_syntax.append(syntax)
+		elif len(self.function_value_syntax) < self.function_values:
+			self.function_value_syntax.append(syntax)
+		else:
+			self.sub_tree_syntax.append(syntax)
+			self.end_block = syntax.token_type == 'end block'
+
+	def syntax_token(self):
+		return SyntaxToken(self.parse_token,
+		                   token_type='fn',
+		                   value=self.symbol,
+		                   stack_values=self.stack_values,
+		                   code_tokens=self.code_value_syntax,
+		                   fn_tokens=self.function_value_syntax,
+		                   sub_tree=self.sub_tree_syntax,
+		                   source=self.source)
+
+
 class SyntaxTree:
 	"""The syntax tree is a semantic representation of the program. The top level of the
 	tree is a sequence of tokens to be evaluated. Each function or block token also contains
@@ -91,27 +228,38 @@ class SyntaxTree:
 	def __init__(self, program):
 
 		self.program = program
-		self.tree = SyntaxTree._build_tree(program)  # A tree of tokens making up the program
+		code, comments = separate_comments(program)
+		self.source = SourceTable(code)  # Code text, locations and comments for all the tokens
+		self.tree = SyntaxTree._build_tree(code, comments, self.source)  # A tree of tokens making up the program
+		self.reindex()
 
+	def reindex(self):
+		"""List, index and locate the tokens in the tree. This must be done again if the tree is changed"""
 		self.tokens = []  # All token objects, including those at lower levels in the syntax tree
 		SyntaxTree._traverse(self.tree, lambda x: self.tokens.append(x))
 		for i, token in enumerate(self.tokens):
 			token.index = i
 
-		SyntaxTree._add_token_locations(self.tree, [])
-		self.locations = dict()  # reverse lookup to index of token at location
-		for token in self.tokens:
-			self.locations[token.location] = token.index
+		SyntaxTree._add_token_locations(self.tree)
+		self._locations = None
+
+	@property
+	def locations(self):
+		"""Reverse lookup to the index of the token at each location, built when it is first needed"""
+		if self._locations is None:
+			self._locations = {token.location: token.index for token in self.tokens}
+		return self._locations
 
 	@staticmethod
-	def _build_tree(program):
+	def _build_tree(code, comments, source):
 
 		tree = []
 
 		# Get a tree for each separate context block in the code
-		parse_tokens = tokenize(program)
-		while len(parse_tokens) > 0:
-			syntax, parse_tokens = SyntaxTree._eval_syntax(parse_tokens)
+		parse_tokens = list(iter_code_tokens(code, comments))
+		position = 0
+		while position < len(parse_tokens):
+			syntax, position = SyntaxTree._eval_syntax(parse_tokens, position, source)
 			tree.append(syntax)
 
 		# If there is only one context block, we don't need to wrap it
@@ -121,127 +269,109 @@ class SyntaxTree:
 		return tree
 
 	@staticmethod
-	def _eval_syntax(parse_token_list):
+	def _eval_syntax(parse_tokens, position, source):
+		"""Build the syntax for one context block, which runs from the position up to and including the next end
+		of block at this level, or to the end of the program. Returns the block and the position after it.
+		Functions still waiting for their parameters or block are kept on a stack, rather than parsed recursively,
+		so there is no limit to how deeply the code can be nested"""
 		tree = []
-
-		remaining = parse_token_list
-
+		unfinished = []  # _FunctionSyntax for each function being built, innermost last
 		end_context = False
-		while not end_context and len(remaining) > 0:
-			end_context, syntax, remaining = SyntaxTree._eval_syntax_token(remaining)
-			tree.append(syntax)
-
-		return tree, remaining
-
-	@staticmethod
-	def _eval_syntax_token(parse_tokens):
-		parse_token, remaining_parse_tokens = parse_tokens[0], parse_tokens[1:]
-		token_type, value = parse_token[0], parse_token[1]
-
-		if token_type == 'block end':
-			return True, SyntaxToken(parse_token, token_type='end block'), remaining_parse_tokens
 
-		elif token_type == 'value':
-			return False, SyntaxToken(parse_token, token_type='value'), remaining_parse_tokens
+		while True:
+			# Any functions which are now complete become parameters or block tokens of the function below them
+			while len(unfinished) > 0 and unfinished[-1].complete(position >= len(parse_tokens)):
+				syntax = unfinished.pop().syntax_token()
+				if len(unfinished) > 0:
+					unfinished[-1].add(syntax)
+				else:
+					tree.append(syntax)
 
-		elif token_type == 'symbol':
-			fn_syntax, remaining_parse_tokens = SyntaxTree._apply_syntax(parse_token, remaining_parse_tokens)
-			return False, fn_syntax, remaining_parse_tokens
+			if len(unfinished) == 0 and (end_context or position >= len(parse_tokens)):
+				return tree, position
 
-		else:
-			print("Unexpected token", parse_token, remaining_parse_tokens)
-			raise SyntaxError
-
-	@staticmethod
-	def _apply_syntax(token, remaining_parse_tokens):
-		global command_dictionary
+			if position >= len(parse_tokens):
+				print('unexpected end of program parsing command', unfinished[-1].symbol)
+				raise SyntaxError
 
-		symbol = token[1]
-		signature, alias = command_dictionary[symbol] if symbol in command_dictionary else (None, None)
+			parse_token = parse_tokens[position]
+			position += 1
+			token_type = parse_token[0]
 
-		if signature is None:
-			print(symbol, 'not found')
-			raise SyntaxError
+			if token_type == 'block end':
+				if len(unfinished) > 0 and unfinished[-1].needs_parameter():
+					print('unexpected end of program parsing command', unfinished[-1].symbol)
+					raise SyntaxError
+				syntax = SyntaxToken(parse_token, token_type='end block', source=source)
 
-		stack_values, code_values, function_values, blocks = signature
-		code_value_syntax = []
-		function_value_syntax = []
+			elif token_type == 'value':
+				syntax = SyntaxToken(parse_token, token_type='value', source=source)
 
-		for _ in range(code_values):
-			end_context, syntax, remaining_parse_tokens = SyntaxTree._eval_syntax_token(remaining_parse_tokens)
-			if end_context:
-				print('unexpected end of program parsing command', symbol)
-				raise SyntaxError
-			code_value_syntax.append(syntax)
+			elif token_type == 'symbol':
+				unfinished.append(_FunctionSyntax(parse_token, source))
+				continue
 
-		for _ in range(function_values):
-			end_context, syntax, remaining_parse_tokens = SyntaxTree._eval_syntax_token(remaining_parse_tokens)
-			if end_context:
-				print('unexpected end of program parsing command', symbol)
+			else:
+				print("Unexpected token", parse_token, parse_tokens[position:])
 				raise SyntaxError
-			function_value_syntax.append(syntax)
-
-		if blocks:
-			sub_tree_syntax = []
-			while len(remaining_parse_tokens) > 0:
-				end_context, new_token, remaining_parse_tokens = SyntaxTree._eval_syntax_token(remaining_parse_tokens)
-				sub_tree_syntax.append(new_token)
-				if end_context:
-					break
-		else:
-			sub_tree_syntax = None
 
-		return SyntaxToken(token,
-		                   token_type='fn',
-		                   value=symbol,
-		                   stack_values=stack_values,
-		                   code_tokens=code_value_syntax,
-		                   fn_tokens=function_value_syntax,
-		                   sub_tree=sub_tree_syntax), \
-			remaining_parse_tokens
+			if len(unfinished) > 0:
+				unfinished[-1].add(syntax)
+			else:
+				tree.append(syntax)
+				end_context = token_type == 'block end'
 
 	@staticmethod
-	def _add_token_locations(tree, depth_stack):
-		if type(tree) is list:
-			for i, t in enumerate(tree):
-				SyntaxTree._add_token_locations(t, depth_stack + [i])
-
-		elif isinstance(tree, SyntaxToken):
-			node_type = tree.token_type
-			if node_type == 'fn' or node_type == 'block':
-				count = 0
-				for t in tree.code_tokens:
-					SyntaxTree._add_token_locations(t, depth_stack + [count * 2])
-					count += 1
-				for f in tree.fn_tokens:
-					SyntaxTree._add_token_locations(f, depth_stack + [count * 2])
-					count += 1
-				if tree.sub_tree is not None:
-					SyntaxTree._add_token_locations(tree.sub_tree, depth_stack)
-					count += 1
-
-			tree.location = tuple(depth_stack)
-
-		else:
-			print("Illegal syntax", tree)
-			raise SyntaxError
+	def _add_token_locations(tree):
+		"""Give each token its parent and its step from the parent, from which its location is found.
+		Tokens in a list follow the location of the list with their position in it. The parameters of a function
+		token follow its location with 0, 2, 4 ... and the tokens in its block are listed at its location"""
+		work = [(tree, None, ())]
+		while len(work) > 0:
+			tree, parent, step = work.pop()
+			if type(tree) is list:
+				for i, t in enumerate(tree):
+					work.append((t, parent, step + (i,)))
+
+			elif isinstance(tree, SyntaxToken):
+				node_type = tree.token_type
+				if node_type == 'fn' or node_type == 'block':
+					count = 0
+					for t in tree.code_tokens:
+						work.append((t, tree, (count * 2,)))
+						count += 1
+					for f in tree.fn_tokens:
+						work.append((f, tree, (count * 2,)))
+						count += 1
+					if tree.sub_tree is not None:
+						work.append((tree.sub_tree, tree, ()))
+						count += 1
+
+				tree.parent = parent
+				tree.step = step[0] if len(step) == 1 else step
+
+			else:
+				print("Illegal syntax", tree)
+				raise SyntaxError
 
 	@staticmethod
 	def _traverse(tree, call_fn):
-		if type(tree) is list:
-			for t in tree:
-				SyntaxTree._traverse(t, call_fn)
-
-		elif isinstance(tree, SyntaxToken):
-			call_fn(tree)
-			for t in tree.code_tokens + tree.fn_tokens:
-				SyntaxTree._traverse(t, call_fn)
-			if tree.sub_tree is not None:
-				SyntaxTree._traverse(tree.sub_tree, call_fn)
+		# Children are pushed in reverse so that they are visited in order
+		work = [tree]
+		while len(work) > 0:
+			tree = work.pop()
+			if type(tree) is list:
+				work.extend(reversed(tree))
+
+			elif isinstance(tree, SyntaxToken):
+				call_fn(tree)
+				if tree.sub_tree is not None:
+					work.append(tree.sub_tree)
+				work.extend(reversed(tree.code_tokens + tree.fn_tokens))
 
-		else:
-			print("Illegal syntax", tree)
-			raise SyntaxError
+			else:
+				print("Illegal syntax", tree)
+				raise SyntaxError
 
 	def pretty_print(self):
 		"""Print a listing of the program with indentations to indicate the tree structure"""
@@ -260,17 +390,34 @@ class SyntaxTree:
 					s += '{'
 			if len(token.comments) > 0:
 				s += '    # ' + token.comments + ' # '
+			return s
+
+		def token_list(token_list, indent):
+			return [('\n', token, indent) for token in token_list]
+
+		# The work stack holds text still to be written and tokens still to be listed, next item last
+		text = []
+		work = list(reversed(token_list(self.tree if type(self.tree) is list else [self.tree], 0)))
+		while len(work) > 0:
+			item = work.pop()
+			if type(item) is str:
+				text.append(item)
+				continue
+			newline, token, indent = item
+			if type(token) is list:
+				# A program with several context blocks lists each in turn
+				work.extend(reversed(token_list(token, indent)))
+				continue
+			text.append(newline + token_string(token, indent))
 			if token.token_type == 'fn' and token.value in command_dictionary:
+				following = []
 				if len(token.code_tokens + token.fn_tokens) > 0:
-					s += token_list_string(token.code_tokens + token.fn_tokens, indent + 2) + ']'
+					following += token_list(token.code_tokens + token.fn_tokens, indent + 2) + [']']
 				if token.sub_tree is not None:
-					s += token_list_string(token.sub_tree, indent + 2) + "}"
-			return s
-
-		def token_list_string(token_list, indent):
-			return ''.join(['\n' + token_string(t, indent) for t in token_list])
+					following += token_list(token.sub_tree, indent + 2) + ['}']
+				work.extend(reversed(following))
 
-		print(token_list_string(self.tree, 0))
+		print(''.join(text))
 
 	def __repr__(self):
 		s = []
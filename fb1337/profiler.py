@@ -0,0 +1,160 @@
+# FBl337
+# Programming Code Golf Language
+# Created: 21 February 2024
+# Version: 21 February 2024 12:00PM
+# Copyright: James Leibert 2024
+# Licence: Available for use under the GPL3 Licence https://www.gnu.org/licenses/gpl-3.0.txt
+
+# profiler.py
+# Execution profiler: call counts and times for each command symbol and each token
+
+
+import json
+from time import perf_counter_ns
+
+from fb1337.tracing import Tracer
+
+HEAT_CHARACTERS = ' .:-=+*#%@'
+
+
+class ProfileEntry:
+	"""Call count, cumulative time and self time (in ns) for a command symbol or a single token.
+	Cumulative time includes the commands run inside the command, self time does not.
+	Recursive calls are only counted once in the cumulative time."""
+
+	__slots__ = ('symbol', 'alias', 'index', 'location', 'code', 'calls', 'cumulative', 'self_time', 'active')
+
+	def __init__(self, symbol, alias, index=None, location=None, code=None):
+		self.symbol = symbol
+		self.alias = alias
+		self.index = index
+		self.location = location
+		self.code = code
+		self.calls = 0
+		self.cumulative = 0
+		self.self_time = 0
+		self.active = 0
+
+	def as_dictionary(self):
+		d = {'symbol': self.symbol, 'alias': self.alias, 'calls': self.calls,
+		     'cumulative_ns': self.cumulative, 'self_ns': self.self_time}
+		if self.index is not None:
+			d['index'] = self.index
+			d['location'] = list(self.location) if self.location is not None else None
+			d['code'] = self.code
+		return d
+
+
+class Profiler(Tracer):
+	"""A tracer which times every command the program runs.
+	If the syntax tree is provided, the heat map shows all the program's code, not just its commands"""
+
+	def __init__(self, syntax_tree=None):
+		self.syntax_tree = syntax_tree
+		self.symbols = dict()
+		self.tokens = dict()
+		self.frames = []
+
+	def on_enter(self, env, event):
+		if event.match is None:
+			return
+		token = event.token
+		symbol_entry = self.symbols.get(token.value)
+		if symbol_entry is None:
+			symbol_entry = self.symbols[token.value] = ProfileEntry(token.value, event.match['alias'])
+		token_entry = self.tokens.get(token.index)
+		if token_entry is None:
+			token_entry = self.tokens[token.index] = ProfileEntry(token.value, event.match['alias'], token.index,
+			                                                      token.code_location, token.code_text)
+		symbol_entry.active += 1
+		token_entry.active += 1
+		# frame: symbol entry, token entry, time spent in commands run inside this one, start time
+		self.frames.append([symbol_entry, token_entry, 0, perf_counter_ns()])
+
+	def on_exit(self, env, event):
+		if event.match is None or len(self.frames) == 0:
+			return
+		end = perf_counter_ns()
+		symbol_entry, token_entry, inner, start = self.frames.pop()
+		elapsed = end - start
+		for entry in (symbol_entry, token_entry):
+			entry.calls += 1
+			entry.self_time += elapsed - inner
+			entry.active -= 1
+			if entry.active == 0:
+				entry.cumulative += elapsed
+		if len(self.frames) > 0:
+			self.frames[-1][2] += elapsed
+
+	def total_time(self):
+		return sum([entry.self_time for entry in self.symbols.values()])
+
+	def data(self):
+		"""The raw profile data as a dictionary of lists, suitable for saving as JSON"""
+		return {'total_ns': self.total_time(),
+		        'symbols': [entry.as_dictionary() for entry in
+		                    sorted(self.symbols.values(), key=lambda e: -e.self_time)],
+		        'tokens': [entry.as_dictionary() for entry in
+		                   sorted(self.tokens.values(), key=lambda e: e.index)]}
+
+	def dump_json(self, file_name):
+		with open(file_name, 'w') as file:
+			json.dump(self.data(), file, indent=1, ensure_ascii=False)
+
+	def report(self, limit=None):
+		"""Print a table of commands sorted by self time, followed by a heat map of the code
+		and a table of the tokens in code order"""
+		total = self.total_time()
+
+		def ms(ns):
+			return str(round(ns / 1000000, 3))
+
+		def percent(ns):
+			return str(round(100 * ns / total, 1)) if total > 0 else '0.0'
+
+		print('profile', ms(total), 'ms in', sum([entry.calls for entry in self.symbols.values()]), 'calls')
+		print()
+		print('symbol', 'alias'.ljust(16), 'calls'.rjust(9), 'self ms'.rjust(10), 'cum ms'.rjust(10), 'self %'.rjust(7),
+		      sep='  ')
+		entries = sorted(self.symbols.values(), key=lambda e: -e.self_time)
+		for entry in entries[:limit]:
+			print(str(entry.symbol).ljust(6), str(entry.alias).ljust(16), str(entry.calls).rjust(9),
+			      ms(entry.self_time).rjust(10), ms(entry.cumulative).rjust(10), percent(entry.self_time).rjust(7),
+			      sep='  ')
+		print()
+
+		print('heat map (self time by code location)')
+		print(self.heat_map())
+		print()
+
+		print('index', 'location'.ljust(9), 'token'.ljust(6), 'calls'.rjust(9), 'self ms'.rjust(10),
+		      'cum ms'.rjust(10), 'self %'.rjust(7), sep='  ')
+		for entry in sorted(self.tokens.values(), key=lambda e: e.location[0]):
+			location = str(entry.location[0]) + '-' + str(entry.location[1])
+			print(str(entry.index).rjust(5), location.ljust(9), str(entry.symbol).ljust(6), str(entry.calls).rjust(9),
+			      ms(entry.self_time).rjust(10), ms(entry.cumulative).rjust(10), percent(entry.self_time).rjust(7),
+			      sep='  ')
+
+	def heat_map(self, line_length=60):
+		"""The program code, with a line beneath marking how much self time each token used"""
+		entries = sorted(self.tokens.values(), key=lambda e: e.location[0])
+		if len(entries) == 0:
+			return ''
+		hottest = max([entry.self_time for entry in entries])
+		if self.syntax_tree is not None:
+			spans = [(token.code_location, token.code_text) for token in self.syntax_tree.tokens]
+		else:
+			spans = [(entry.location, entry.code) for entry in entries]
+		code = [' '] * max([end for (start, end), text in spans])
+		heat = [' '] * len(code)
+		for (start, end), text in spans:
+			code[start:end] = list(text[:end - start].ljust(end - start).replace('\n', ' ').replace('\t', ' '))
+		for entry in entries:
+			start, end = entry.location
+			level = (len(HEAT_CHARACTERS) - 1) * entry.self_time // hottest if hottest > 0 else 0
+			heat[start:end] = [HEAT_CHARACTERS[max(level, 1)]] * (end - start)
+		lines = []
+		for i in range(0, len(code), line_length):
+			lines.append(''.join(code[i:i + line_length]).rstrip())
+			lines.append(''.join(heat[i:i + line_length]).rstrip())
+		return '\n'.join(lines)
@@ -0,0 +1,167 @@
+# FBl337
+# Programming Code Golf Language
+# Created: 21 February 2024
+# Version: 21 February 2024 12:00PM
+# Copyright: James Leibert 2024
+# Licence: Available for use under the GPL3 Licence https://www.gnu.org/licenses/gpl-3.0.txt
+
+# server.py
+# A pool of warm worker processes serving requests to run programs
+
+
+# Requests and responses are JSON objects, one per line.
+# A request contains the program 'code' and may contain its 'parameters', 'name', 'path', 'backend', a
+# 'timeout' in seconds, 'cache' (false to not use the program cache) and 'fold' (false to not fold constants).
+# An 'id' is copied to the response.
+# The response contains the 'result' (converted to JSON), its 'text' as printed by the command line,
+# any 'output' the program printed, and an 'error' message, which is null if the program ran successfully.
+# Requests are read from a Unix socket, or from stdin with the responses written in order to stdout.
+# The timeout is a SIGALRM in the worker, which Python only acts on between bytecodes, so it cannot stop
+# long work inside a single call to C code (e.g. a huge integer power or numpy operation) until that call returns.
+
+import io
+import json
+import os
+import signal
+import socket
+import socketserver
+import sys
+from contextlib import redirect_stdout
+from functools import lru_cache
+from multiprocessing import Pool
+
+from fb1337.fb1337 import compile, RunTimeout, time_limit
+
+
+class Server:
+
+    def __init__(self, workers=None, timeout=None, jobs_per_worker=1000, backend='tree'):
+        """Start the worker processes. Each worker is replaced after running jobs_per_worker requests.
+        The timeout (in seconds) and backend are used for requests which do not give their own"""
+        self.timeout = timeout
+        self.backend = backend
+        self.pool = Pool(processes=workers, initializer=_init_worker, initargs=(sys.getrecursionlimit(),),
+                         maxtasksperchild=jobs_per_worker)
+
+    def request(self, line):
+        """Run one request in a worker and return the response line"""
+        return self.pool.apply(_serve_line, (line, self.timeout, self.backend))
+
+    def serve_socket(self, socket_path):
+        """Serve requests from a Unix socket until interrupted. Each connection may send many requests.
+        The socket's directory is made if needed, and must belong to this user and be closed to everyone else"""
+        directory = os.path.dirname(os.path.abspath(socket_path))
+        os.makedirs(directory, mode=0o700, exist_ok=True)
+        if not _private(directory):
+            print("The socket directory", directory, "must belong to this user with no access for others (mode 700)")
+            return
+        if os.path.exists(socket_path):
+            if server_running(socket_path):
+                print("A server is already running on", socket_path)
+                return
+            os.remove(socket_path)
+        server = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                for line in self.rfile:
+                    if len(line.strip()) > 0:
+                        self.wfile.write((server.request(line.decode('utf-8')) + '\n').encode('utf-8'))
+                        self.wfile.flush()
+
+        signal.signal(signal.SIGTERM, _on_terminate)
+        with socketserver.ThreadingUnixStreamServer(socket_path, Handler) as socket_server:
+            os.chmod(socket_path, 0o600)
+            print("fb1337 server listening on", socket_path)
+            try:
+                socket_server.serve_forever()
+            except KeyboardInterrupt:
+                pass
+            finally:
+                os.remove(socket_path)
+
+    def serve_stdio(self, stdin=None, stdout=None):
+        """Serve requests from stdin until it is closed. Requests run in parallel, but the responses are
+        written in the order of the requests"""
+        if stdin is None: stdin = sys.stdin
+        if stdout is None: stdout = sys.stdout
+        lines = (line for line in stdin if len(line.strip()) > 0)
+        jobs = ((line, self.timeout, self.backend) for line in lines)
+        for response in self.pool.imap(_serve_job, jobs):
+            stdout.write(response + '\n')
+            stdout.flush()
+
+    def close(self):
+        self.pool.close()
+        self.pool.join()
+
+
+def server_running(socket_path):
+    """True if a server is accepting connections on the socket"""
+    if not hasattr(socket, 'AF_UNIX') or not os.path.exists(socket_path):
+        return False
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as connection:
+        try:
+            connection.connect(socket_path)
+            return True
+        except OSError:
+            return False
+
+
+def _private(directory):
+    # Only the user who owns the directory can reach a socket inside it
+    status = os.stat(directory)
+    return (not hasattr(os, 'getuid') or status.st_uid == os.getuid()) and status.st_mode & 0o077 == 0
+
+
+def _on_terminate(signal_number, frame):
+    # Stop serving as if interrupted, so the socket is removed
+    raise KeyboardInterrupt()
+
+
+def _init_worker(recursion_limit):
+    # The server process deals with interrupts and shuts the workers down
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    sys.setrecursionlimit(recursion_limit)
+    # Warm up, so the first request does not pay for setting up the interpreter
+    _compiled('1', None, None, 'tree', True, True).run()
+
+
+@lru_cache(maxsize=256)
+def _compiled(code, name, path, backend, cache, fold):
+    # Programs are often run many times with different parameters, so they are only parsed once
+    return compile(code, name=name, path=path, backend=backend, cache=cache, fold=fold)
+
+
+def _serve_job(job):
+    return _serve_line(*job)
+
+
+def _serve_line(line, timeout, backend):
+    """Run the request on a line and return the response line. This runs in the worker processes"""
+    response = {'result': None, 'text': None, 'output': '', 'error': None}
+    output = io.StringIO()
+    try:
+        request = json.loads(line)
+        response['id'] = request.get('id')
+        timeout = request.get('timeout', timeout)
+        with redirect_stdout(output), time_limit(timeout):
+            program = _compiled(request['code'], request.get('name'), request.get('path'),
+                                request.get('backend', backend), request.get('cache', True),
+                                request.get('fold', True))
+            result = program.run(request.get('parameters', []))
+        response['result'] = result
+        response['text'] = str(result)
+    except RunTimeout:
+        response['error'] = 'timed out after ' + str(timeout) + 's'
+    except Exception as e:
+        response['error'] = type(e).__name__ + ': ' + str(e)
+    response['output'] = output.getvalue()
+    return json.dumps(response, default=_json_value)
+
+
+def _json_value(value):
+    # numpy scalars have a python equivalent; anything else is sent as its text
+    if hasattr(value, 'item'):
+        return value.item()
+    return str(value)
@@ -0,0 +1,70 @@
+# FBl337
+# Programming Code Golf Language
+# Created: 21 February 2024
+# Version: 21 February 2024 12:00PM
+# Copyright: James Leibert 2024
+# Licence: Available for use under the GPL3 Licence https://www.gnu.org/licenses/gpl-3.0.txt
+
+# stack.py
+# The program stack shared by all environments of a running program
+
+
+class Stack:
+    """The program stack. Values are kept in a Python list with the top of the stack at the end,
+    so push and pop are amortised O(1) and never copy the stack.
+    Popping an empty stack returns None, and None values are never pushed.
+    The high water mark records the greatest depth the stack has reached."""
+
+    def __init__(self, values=None):
+        self.values = [] if values is None else [v for v in values if v is not None]
+        self.high_water_mark = len(self.values)
+
+    def __len__(self):
+        return len(self.values)
+
+    def push(self, value):
+        """Push a value to the stack"""
+        if value is not None:
+            values = self.values
+            values.append(value)
+            if len(values) > self.high_water_mark:
+                self.high_water_mark = len(values)
+
+    def push_many(self, values):
+        """Push each value in turn (so the last value ends up on top)"""
+        self.values.extend([v for v in values if v is not None])
+        if len(self.values) > self.high_water_mark:
+            self.high_water_mark = len(self.values)
+
+    def pop(self):
+        """Pop a value from the stack and return it. Return None if the stack is empty"""
+        if self.values:
+            return self.values.pop()
+        return None
+
+    def pop_n(self, n):
+        """Pop n values and return them in stack order (top of stack last).
+        If the stack holds fewer than n values, the missing values are returned as None at the front."""
+        if n <= 0:
+            return []
+        values = self.values
+        available = min(n, len(values))
+        taken = values[len(values) - available:]
+        del values[len(values) - available:]
+        if available < n:
+            return [None] * (n - available) + taken
+        return taken
+
+    def peek(self):
+        """Return the top value on the stack without removing it. Return None if the stack is empty"""
+        if self.values:
+            return self.values[-1]
+        return None
+
+    def deep(self, n):
+        """Copy the value n-deep and put it on the top of the stack"""
+        if len(self.values) > n >= 1:
+            self.push(self.values[-n - 1])
+
+    def __repr__(self):
+        return '<Stack ' + str(self.values) + '>'
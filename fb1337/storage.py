@@ -0,0 +1,177 @@
+# FBl337
+# Programming Code Golf Language
+# Created: 21 February 2024
+# Version: 21 February 2024 12:00PM
+# Copyright: James Leibert 2024
+# Licence: Available for use under the GPL3 Licence https://www.gnu.org/licenses/gpl-3.0.txt
+
+# storage.py
+# Buffers: the values of a rectangular array held in a single NumPy array, so whole-array operations run in NumPy
+
+
+from math import prod
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+# Values of these types are nested structure rather than values, so a structure holding them is not rectangular
+_CONTAINERS = {list, tuple, np.ndarray}
+
+# Commands whose left fold over a window of integers can be worked out in NumPy, with the value which leaves the
+# result unchanged when it is added to a window (so a window that runs off the edge can be filled with it)
+_INT64 = np.iinfo(np.int64)
+WINDOW_PADDING = {'+': 0, '×': 1, '⌈': _INT64.min, '⌊': _INT64.max, '∧': 1, '∨': 0}
+# The NumPy functions which fold integers as these commands do
+_UFUNCS = {'+': np.add, '×': np.multiply, '⌈': np.maximum, '⌊': np.minimum, '-': np.subtract}
+
+
+def to_buffer(structured_values, shape):
+	"""Hold the nested lists in a buffer of the given shape, or return None if they are not rectangular.
+	Integers are held as int64 and booleans as bool; anything else (including a mix of types, null values or
+	integers too large for int64) is held as Python objects, so the values are always returned unchanged"""
+	try:
+		buffer = np.array(structured_values, dtype=object)
+	except ValueError:
+		return None
+	if buffer.shape != tuple(shape):
+		return None
+	return _typed(buffer)
+
+
+def from_values(values, shape):
+	"""A buffer holding a flat list of values in the given shape, or None if any value is itself a structure"""
+	if len(values) != prod(shape):
+		return None
+	buffer = np.empty(len(values), dtype=object)
+	try:
+		buffer[:] = values
+	except ValueError:
+		return None
+	return _typed(buffer.reshape(shape))
+
+
+def _typed(buffer):
+	kinds = set(map(type, buffer.flat))
+	if len(kinds & _CONTAINERS) > 0:
+		return None
+	if kinds == {bool}:
+		return buffer.astype(bool)
+	if kinds == {int}:
+		try:
+			return buffer.astype(np.int64)
+		except OverflowError:
+			return buffer
+	return buffer
+
+
+def structured(buffer):
+	"""The nested lists of Python values held in the buffer"""
+	return buffer.tolist()
+
+
+def flat(buffer):
+	"""The values held in the buffer as a flat list of Python values"""
+	return buffer.ravel().tolist()
+
+
+def item(buffer, index):
+	"""The Python value at a flat index in the buffer"""
+	return buffer.ravel()[index:index + 1].tolist()[0]
+
+
+def window_reduce(buffer, size, symbol, edges):
+	"""Fold the command over each size × size... window of an integer buffer, as Array.window would: the windows
+	around each value which lie inside the buffer or, with edges, a window around every value holding the values
+	inside the buffer. Returns None if the buffer does not hold integers or the result could overflow int64"""
+	dimensions = buffer.ndim
+	if buffer.dtype != np.int64 or dimensions == 0 or size < 1 or symbol not in WINDOW_PADDING:
+		return None
+	if not edges and min(buffer.shape) < size:
+		return None
+	if not _fits(buffer, symbol, size ** dimensions):
+		return None
+	if edges:
+		# The window around a value starts (size - 1) // 2 before it
+		padded = np.pad(buffer, [((size - 1) // 2, size // 2)] * dimensions, constant_values=WINDOW_PADDING[symbol])
+	else:
+		padded = buffer
+	windows = sliding_window_view(padded, (size,) * dimensions)
+	axes = tuple(range(dimensions, 2 * dimensions))
+	if symbol == '+':
+		return windows.sum(axis=axes)
+	if symbol == '×':
+		return windows.prod(axis=axes)
+	if symbol == '⌈':
+		return windows.max(axis=axes)
+	if symbol == '⌊':
+		return windows.min(axis=axes)
+	if symbol == '∨':
+		# The first value which is not 0, or 0
+		in_order = windows.reshape(windows.shape[:dimensions] + (-1,))
+		first = np.argmax(in_order != 0, axis=-1)
+		return np.take_along_axis(in_order, first[..., np.newaxis], axis=-1)[..., 0]
+	# ∧ gives 0 if any value is 0, otherwise the last value inside the buffer
+	if edges:
+		last = buffer[np.ix_(*[np.minimum(np.arange(length) + size // 2, length - 1) for length in buffer.shape])]
+	else:
+		last = windows[(Ellipsis,) + (-1,) * dimensions]
+	return np.where((windows == 0).any(axis=axes), 0, last)
+
+
+def fold(buffer, symbol, reverse, partial_sums):
+	"""Fold the command along the first axis of a buffer of integers, as StructuredArray.reduce_struc (or
+	reduce_struc_r when reverse) would. Gives the result, or with partial_sums every partial result.
+	Returns None if the buffer holds anything other than integers. Values whose sums or products could
+	overflow int64 are folded as Python integers, so the result is always exact"""
+	if buffer.dtype == object and set(map(type, buffer.flat)) != {int}:
+		return None
+	elif buffer.dtype != object and buffer.dtype != np.int64:
+		return None
+	elif buffer.dtype == np.int64 and not _fits(buffer, symbol, len(buffer)):
+		buffer = buffer.astype(object)
+	if not partial_sums and symbol in _UFUNCS and not (reverse and symbol == '-'):
+		# The others give the same result when they are folded from the right
+		folded = _UFUNCS[symbol].reduce(buffer, axis=0)
+	elif reverse:
+		# Folding from the right is folding the reversed values from the left, giving each value first
+		folded = _accumulate(buffer[::-1], symbol, True)[::-1]
+		folded = folded if partial_sums else folded[0]
+	else:
+		folded = _accumulate(buffer, symbol, False)
+		folded = folded if partial_sums else folded[-1]
+	# Folding a single row gives a scalar, which is held in a buffer like any other result
+	return np.asarray(folded, dtype=buffer.dtype)
+
+
+def _accumulate(buffer, symbol, swapped):
+	# Every partial result of the fold along the first axis. When swapped, the command is given each value
+	# first and the result so far second
+	if symbol in _UFUNCS and not (swapped and symbol == '-'):
+		return _UFUNCS[symbol].accumulate(buffer, axis=0)
+	positions = np.arange(len(buffer)).reshape((-1,) + (1,) * (buffer.ndim - 1))
+	if symbol == '-':
+		# The signs of the values alternate: c - (b - a) = c - b + a
+		signs = np.where(positions % 2 == 0, 1, -1)
+		return np.add.accumulate(buffer * signs, axis=0) * signs
+	if symbol == '∧':
+		# a and b is 0 when a is 0, otherwise b
+		zeros = np.logical_or.accumulate(buffer == 0, axis=0)
+		return np.where(zeros, 0, buffer[:1] if swapped else buffer)
+	# a or b is a when a is not 0, otherwise b: so the first value which is not 0, or the latest when swapped
+	if swapped:
+		chosen = np.maximum.accumulate(np.where(buffer != 0, positions, -1), axis=0)
+	else:
+		chosen = np.minimum.accumulate(np.where(buffer != 0, positions, len(buffer)), axis=0)
+	found = (chosen >= 0) & (chosen < len(buffer))
+	values = np.take_along_axis(buffer, np.clip(chosen, 0, len(buffer) - 1), axis=0)
+	return np.where(found, values, 0)
+
+
+def _fits(buffer, symbol, count):
+	# Sums and products of count values are only worked out in int64 if they cannot overflow
+	if symbol not in ('+', '-', '×'):
+		return True
+	largest = max(-int(buffer.min()), int(buffer.max()))
+	if symbol in ('+', '-'):
+		return (largest * count).bit_length() < 64
+	return largest <= 1 or largest.bit_length() * count < 64
@@ -0,0 +1,118 @@
+# FBl337
+# Programming Code Golf Language
+# Created: 21 February 2024
+# Version: 21 February 2024 12:00PM
+# Copyright: James Leibert 2024
+# Licence: Available for use under the GPL3 Licence https://www.gnu.org/licenses/gpl-3.0.txt
+
+# tracing.py
+# Tracing hooks: tracers are told about each token as the program runs
+
+
+class TraceEvent:
+	"""The record passed to a tracer. A program reuses a single event for all its notifications,
+	refilling it before each call, so a tracer must copy anything it wants to keep.
+	For value tokens and end of block tokens, match is None and there are no parameters."""
+
+	__slots__ = ('token', 'match', 'stack_parameters', 'code_parameters', 'fn_parameters', 'block_parameters',
+	             'value')
+
+	def __init__(self):
+		self.set(None)
+
+	def set(self, token, match=None, stack_parameters=(), code_parameters=(), fn_parameters=(), block_parameters=(),
+	        value=None):
+		self.token = token
+		self.match = match
+		self.stack_parameters = stack_parameters
+		self.code_parameters = code_parameters
+		self.fn_parameters = fn_parameters
+		self.block_parameters = block_parameters
+		self.value = value
+
+	def info_dictionary(self):
+		"""The event as a new dictionary, in the form used by the interactive debugger"""
+		if self.match is None:
+			return {'token': self.token}
+		return {'token': self.token,
+		        'symbol': self.match['symbol'],
+		        'alias': self.match['alias'],
+		        'signature': self.match['signature'],
+		        'type signature': self.match['type signature'],
+		        'description': self.match['description'],
+		        's-params': list(self.stack_parameters),
+		        'c-params': list(self.code_parameters),
+		        'f-params': list(self.fn_parameters),
+		        'b-params': list(self.block_parameters),
+		        'value': self.value}
+
+	def __repr__(self):
+		return '<TraceEvent ' + str(self.token) + (' value=' + str(self.value) if self.value is not None else '') + '>'
+
+
+class Tracer:
+	"""Base class for tracers. on_enter is called before each token is run and on_exit after each command
+	has run (value and end of block tokens only receive on_enter). Override either or both."""
+
+	def on_enter(self, env, event):
+		pass
+
+	def on_exit(self, env, event):
+		pass
+
+
+class NotifyTracer(Tracer):
+	"""Adapts a debugger with a notify(env, info_dictionary) method to the tracer interface"""
+
+	def __init__(self, debugger):
+		self.debugger = debugger
+
+	def on_enter(self, env, event):
+		self.debugger.notify(env, event.info_dictionary())
+
+	def on_exit(self, env, event):
+		self.debugger.notify(env, event.info_dictionary())
+
+
+class LoggingTracer(Tracer):
+	"""Prints each notification along with the stack and implicit value"""
+
+	def on_enter(self, env, event):
+		print("notification", 'stack:', env.get_stack(), 'implicit:', env.implicit(), 'info:', event.info_dictionary())
+
+	def on_exit(self, env, event):
+		self.on_enter(env, event)
+
+
+class TracerGroup(Tracer):
+	"""Passes each event to several tracers in turn"""
+
+	def __init__(self, tracers):
+		self.tracers = list(tracers)
+
+	def on_enter(self, env, event):
+		for tracer in self.tracers:
+			tracer.on_enter(env, event)
+
+	def on_exit(self, env, event):
+		for tracer in self.tracers:
+			tracer.on_exit(env, event)
+
+
+def combine_tracers(tracer=None, debugger=None, logging=False, profiler=None):
+	"""The single tracer for a program given its tracer, debugger, logging and profiler options,
+	or None if there are none"""
+	tracers = []
+	if tracer is not None:
+		tracers.append(tracer)
+	if debugger is not None:
+		tracers.append(NotifyTracer(debugger))
+	if logging:
+		tracers.append(LoggingTracer())
+	if profiler is not None:
+		tracers.append(profiler)
+	if len(tracers) == 0:
+		return None
+	if len(tracers) == 1:
+		return tracers[0]
+	return TracerGroup(tracers)
@@ -256,35 +256,60 @@ def parameter_match(parameters, type_signature):
 def apply_type_transformations(parameters, type_signature, fn):
     """Assuming parameter match succeeded, this will alter the type of the parameters to
     conform to the type signature"""
+    conversions, new_fn = type_transformation_plan(parameters, type_signature, fn)
+    return transform_parameters(parameters, conversions), new_fn
+
+
+def type_transformation_plan(parameters, type_signature, fn):
+    """Works out the transformations apply_type_transformations makes, without making them.
+    Returns a list with a conversion function for each parameter (None if it is used as is),
+    or None if no parameter needs converting, and the function to apply to the parameters.
+    The plan only depends on the types of the parameters (and whether strings and single values
+    can be read as integers), so it can be reused for other parameters of the same types."""
 
     # Allow int unary and binary functions to be extended to lists and matrices
     if type_signature == ('int',) and isinstance(parameters[0], Array):
-        if isinstance(parameters[0], Array):
-            return parameters, lambda e, m: m.map(fc2fn(e, fn))
-        else:
-            raise TypeError
+        return None, lambda e, m: m.map(fc2fn(e, fn))
     if type_signature == ('int', 'int',) and isinstance(parameters[0], Array) and is_number(parameters[1]):
-        if isinstance(parameters[0], Array):
-            return parameters, lambda e, m, a: m.map(lambda x: fn(e, x, a))
-        else:
-            raise TypeError
+        return None, lambda e, m, a: m.map(lambda x: fn(e, x, a))
     if type_signature == ('int', 'int',) and isinstance(parameters[0], Array) and isinstance(parameters[1], Array):
-        return parameters, lambda e, m, n: m.bi_map(n, fc2fn(e, fn))
+        return None, lambda e, m, n: m.bi_map(n, fc2fn(e, fn))
 
     # Otherwise there are only a small number of other type coercions that are accepted
-    new_parameters = []
+    conversions = []
     for t, v in zip(type_signature, parameters):
         if t == 'int' and int_value(v) is not None:
-            new_parameters.append(int_value(v))
+            conversions.append(int_value if int_value(v) is not v else None)
         elif t == 'None' and is_null(v):
-            new_parameters.append('')
+            conversions.append(_to_null)
         elif (t == 'List' or t == 'FlatList') and isinstance(v, Matrix):
-            new_parameters.append(FlatList(v.values))
+            conversions.append(_to_flat_list)
         elif t == 'Matrix' and is_num_collection(v) and isinstance(v, StructuredArray):
-            new_parameters.append(Matrix(v.structured_values()))
+            conversions.append(_to_matrix)
         else:
-            new_parameters.append(v)
-    return new_parameters, fn
+            conversions.append(None)
+    if all([c is None for c in conversions]):
+        return None, fn
+    return conversions, fn
+
+
+def transform_parameters(parameters, conversions):
+    """Apply the conversions from a type transformation plan"""
+    if conversions is None:
+        return parameters
+    return [v if c is None else c(v) for c, v in zip(conversions, parameters)]
+
+
+def _to_null(v):
+    return ''
+
+
+def _to_flat_list(v):
+    return FlatList(v.values)
+
+
+def _to_matrix(v):
+    return Matrix(v.structured_values())
 
 
 def convert_collection(obj, new_type):
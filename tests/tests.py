@@ -9,9 +9,19 @@
 # Test programs
 
 
+import io
+import os
 import sys
+import tempfile
+from contextlib import redirect_stdout
 
-from fb1337 import test, interactive_from_test_suite
+from fb1337 import compile, test, interactive_from_test_suite
+from fb1337.array import Range
+from fb1337.cache import ProgramCache
+from fb1337.dispatch import InlineCache
+from fb1337.environment import Environment
+from fb1337.iterators import Iterator
+from fb1337.stack import Stack
 
 sys.setrecursionlimit(10000)
 
@@ -79,6 +89,15 @@ tests = [
     {'name': 'roll list', 'code': "3⍳↦ 3⍳↤⊕", 'parameters': [], 'result': [0, 1, 2, 2, 3, 0]},
     {'name': 'include exclude', 'code': "5⍳Ø4,2,4⏍⟈ Ø4,2,4⏍3⍳∩ ⊕", 'parameters': [], 'result': [1, 3, 5, 2]},
     {'name': 'take drop', 'code': "5⍳ ↑4 ↓2", 'parameters': [], 'result': [3, 4]},
+    {'name': 'range reductions', 'code': "ṁ⍳/+ 10⍳/× ~9⍳/- 3,9‥/⌈ 9,3‥⥆- 9⍳[2Ø3/+ 1⍳/+", 'parameters': [],
+     'result': [500000500000, 3628800, -27, 9, 6, 18, 1]},
+    {'name': 'range changed', 'code': "5⍳@1,9∂/+«↓3#", 'parameters': [], 'result': [22, 2]},
+    {'name': 'range product', 'code': "~3,3‥/× 20000⍳/×,1000007%", 'parameters': [], 'result': [0, 928493]},
+    {'name': 'range loop changed', 'code': "5⍳→a $a:_ $a@3,0◌", 'parameters': [], 'result': [1, 2, 3, 0, 5]},
+    {'name': 'builtin folds', 'code': "$1/+ $1∖- $1⥶∨ 1‿0‿3,4‿5‿6⁔∂⥶∧⊣⌿×",
+     'parameters': [[4000000000000000000, 4000000000000000000, 0, 3]],
+     'result': [8000000000000000003, [4000000000000000000, 0, 0, -3], [4000000000000000000, 4000000000000000000, 3, 3],
+                [[4, 0, 6], [4, 5, 6]], [4, 0, 18]]},
     {'name': 'copies', 'code': "5,3⧉ hi2⧉ ⊕", 'parameters': [], 'result': [5, 5, 5, 'hi', 'hi']},
     {'name': 'set slice.py', 'code': "Ø3,1,4,1,5,9⏍@{2,4Ø9", 'parameters': [], 'result': [3, 1, 9, 9, 5, 9]},
     {'name': 'slice.py alt', 'code': "Ø3,1,4,1,5,9⏍[1Ø2", 'parameters': [], 'result': [1, 1, 9]},
@@ -126,6 +145,10 @@ tests = [
      'result': [[12, 16, 9], [24, 28, 15], [15, 17, 9]]},
     {'name': 'stencil 3', 'code': "1,2,3,2,3,4,3,4,5⌸3,3⍴⌺3+", 'parameters': [],
      'result': [[8, 15, 12], [15, 27, 21], [12, 21, 16]]},
+    {'name': 'stencil commands', 'code': "1‿0‿3,4‿5‿6⁔7‿8‿0⁔→a $a⌺2∧ $a⧈2∨ $a⌺3⌊", 'parameters': [],
+     'result': [[[0, 0, 6], [8, 0, 0], [8, 0, 0]], [[1, 3], [4, 5]], [[0, 0, 0], [0, 0, 0], [4, 0, 0]]]},
+    {'name': 'stencil large', 'code': "$1⌺3+", 'parameters': [[4000000000000000000] * 3],
+     'result': [8000000000000000000, 12000000000000000000, 8000000000000000000]},
     {'name': 'array size', 'code': "1‿2‿3‿4,4‿5‿6‿7⁔7‿8‿9‿10⁔#", 'parameters': [], 'result': 3},
     {'name': 'array flatten', 'code': "1‿2‿3‿4,4‿5‿6‿7⁔7‿8‿9‿10⁔▭", 'parameters': [],
      'result': [1, 2, 3, 4, 4, 5, 6, 7, 7, 8, 9, 10]},
@@ -326,15 +349,214 @@ tests = [
      'result': [1, 2, 'Fizz', 4, 'Buzz', 'Fizz', 7, 8, 'Fizz', 'Buzz', 11, 'Fizz', 13, 14, 'FizzBuzz']},
     {'name': 'triangle divisors', 'code': "0Ω1µ$1<)1:_+→a$a⍳}µ$a«‱)#$a«", 'parameters': [12], 'result': 120},
 
+    # Constant Folding
+    {'name': 'fold stack lists', 'code': "Ø1,2,3,4⌸2,2⍴/+;Ø1,2,3⏍#;4,5,6☐3#;3⍳☆++", 'parameters': [],
+     'result': [[3, 7], 3, 3, 6]},
+    {'name': 'fold changed in place', 'code': "2𝚰⌘0,1,5;Ø3,1,3⏍ṵ∂2⬆#;Ø3,1,3⏍ṵ∂⬇◌#", 'parameters': [],
+     'result': [[[1, 5], [0, 1]], [3, 1, 2], 3, 1]},
+    {'name': 'fold large', 'code': "0?µ9,9999999*⊛)1 9,999*⊛ 0?µ99999999!)2 100000⍳/+", 'parameters': [],
+     'result': [1, 3166, 2, 5000050000]},
+
     {'name': 'loadtest', 'code': "1⨋2⨋3⨋∫ℤ∫ℤ∫ℤ", 'parameters': [], 'result': [1, 2, 3]},
     {'name': 'loadlist', 'code': "~3⍳:_⨋;7⨋9⨋;∮", 'parameters': [], 'result': [3, 2, 1, 7, 9]},
     {'name': 'loadarray', 'code': "`1` `2` `3⨋`4` `5` `6⨋`7` `8` `9⨋⨖", 'parameters': [],
      'result': [[1, 2, 3], [4, 5, 6], [7, 8, 9]]},
 ]
 
+
+# Checks of the interpreter's parts, which cannot be written as a program and its result
+def check_cache_hit():
+    with tempfile.TemporaryDirectory() as directory:
+        directory = os.path.join(directory, 'fb1337')
+        ProgramCache(directory).syntax_tree("3,4+")
+        cache = ProgramCache(directory)
+        tree = cache.syntax_tree("3,4+")
+        return cache.hits == 1 and tree.source.code == "3,4+" and os.stat(directory).st_mode & 0o777 == 0o700
+
+
+def check_cache_miss_changed_code():
+    with tempfile.TemporaryDirectory() as directory:
+        cache = ProgramCache(directory)
+        cache.syntax_tree("3,4+")
+        cache.syntax_tree("3,4-")
+        return cache.hits == 0 and cache.misses == 2 and len(os.listdir(directory)) == 2
+
+
+def check_cache_fingerprint():
+    with tempfile.TemporaryDirectory() as directory:
+        ProgramCache(directory).syntax_tree("3,4+")
+        cache = ProgramCache(directory)
+        cache._fingerprint = 'a different interpreter'
+        cache.syntax_tree("3,4+")
+        return cache.hits == 0 and cache.misses == 1
+
+
+def check_cache_owner():
+    with tempfile.TemporaryDirectory() as directory:
+        ProgramCache(directory).syntax_tree("3,4+")
+        try:
+            # Only possible when run as root
+            os.chown(os.path.join(directory, os.listdir(directory)[0]), os.getuid() + 1, -1)
+        except OSError:
+            return True
+        cache = ProgramCache(directory)
+        cache.syntax_tree("3,4+")
+        return cache.hits == 0
+
+
+def check_cache_eviction():
+    with tempfile.TemporaryDirectory() as directory:
+        cache = ProgramCache(directory, max_bytes=10 ** 6)
+        for n in range(20):
+            cache.syntax_tree(str(n) + ",1+")
+        # The directory is only listed on the first save, while the entries fit
+        listed = cache.scans == 1
+        entry_bytes = os.path.getsize(os.path.join(directory, os.listdir(directory)[0]))
+        cache.max_bytes = entry_bytes * 5
+        cache.syntax_tree("99,1+")
+        newest = ProgramCache(directory)
+        newest.syntax_tree("99,1+")
+        return listed and cache.scans == 2 and len(os.listdir(directory)) <= 5 and newest.hits == 1
+
+
+def check_inline_cache_hot_loop():
+    program = compile("0,5:1000⍳:_+;;", cache=False)
+    result = program.run()
+    statistics = program.program.inline_cache_statistics()
+    # Each call site only misses the first time it is run
+    return result == 2502500 and statistics['hits'] >= 10000 and statistics['misses'] <= statistics['sites']
+
+
+def check_inline_cache_keys():
+    cache = InlineCache(compile("1").program.commands, ':')
+    values = [Range(range(1, 4)), Iterator.from_object(3), Iterator.from_object('abc'),
+              Iterator.from_object(Range(range(1, 4)))]
+    return all([cache.key([value, lambda e: None]) is not None for value in values])
+
+
+def check_compiled_run_many():
+    results = []
+    for backend in ['tree', 'closure', 'bytecode']:
+        program = compile("$1:_+→s $s", backend=backend, cache=False)
+        results.append(list(program.run_many([[3], [4], [3]])))
+    # Nothing is left on the stack from the run before
+    program = compile("$1∂", cache=False)
+    stacks = list(program.run_many([[1], [2]]))
+    # The inline caches are shared, so only the first run misses
+    program = compile("$1⍳/+", cache=False)
+    program.run([3])
+    misses = program.program.inline_cache_statistics()['misses']
+    sums = list(program.run_many([[4], [5]]))
+    return results == [[6, 10, 6]] * 3 and stacks == [[1, 1], [2, 2]] and sums == [10, 15] and \
+        program.program.inline_cache_statistics()['misses'] == misses
+
+
+def check_test_workers():
+    suite = tests[:40] + [{'name': 'wrong', 'code': "3,4+", 'parameters': [], 'result': 8},
+                          {'name': 'missing', 'code': "£z", 'parameters': [], 'result': 0},
+                          {'name': 'slow', 'code': "0,10000000:_+", 'parameters': [], 'result': 50000005000000}]
+    with redirect_stdout(io.StringIO()):
+        serial = test(suite, path=__file__, timeout=0.5)
+        shared = test(suite, path=__file__, workers=2, timeout=0.5)
+    return serial == shared and [(name, result) for _, name, result, _ in shared] == \
+        [('wrong', 7), ('missing', "Error: 'KeyError'"), ('slow', "Error: 'timed out after 0.5s'")]
+
+
+def check_stack_analysis():
+    def analysis(code):
+        program = compile(code, cache=False, fold=False).program
+        commands = [token for token in program.syntax_tree.tokens if token.token_type == 'fn']
+        return program.analysis, [program.analysis.types[token.index] for token in commands]
+
+    arithmetic, arithmetic_types = analysis("3,4+2×")
+    comparison, comparison_types = analysis("3,4<5+")
+    underflow, _ = analysis("3+")
+    unknown, unknown_types = analysis("$1+")
+    return arithmetic.underflows == [] and arithmetic_types == [('int', 'int'), ('int', 'int')] and \
+        arithmetic.selected == 2 and comparison_types == [('int', 'int'), ('bool', 'int')] and \
+        [(u.symbol, u.needed, u.available, u.accepted) for u in underflow.underflows] == [('+', 2, 1, True)] and \
+        unknown_types == [('int',), ('?', '?')] and unknown.underflows == []
+
+
+def check_environment_pool():
+    program = compile("0,1000:_+", cache=False)
+    created, reused = Environment.created, Environment.reused
+    total = program.run()
+    loop_created, loop_reused = Environment.created - created, Environment.reused - reused
+    parent = Environment()
+    released = Environment.acquire(parent)
+    released.release()
+    pooled = len(Environment._pool) > 0 and Environment._pool[-1] is released
+    # An environment still held by a function which was returned is not put back in the pool
+    captured = Environment.acquire(parent)
+    returned = (lambda env: (lambda: env))(captured)
+    captured.release()
+    recycled = len(Environment._pool) > 0 and Environment._pool[-1] is captured
+    return total == 500500 and loop_created <= 2 and loop_reused >= 999 and pooled and not recycled and \
+        returned() is captured and captured.parent is parent
+
+
+def check_stack_underflow():
+    # As when values were popped one at a time, missing values are None and come before those on the stack
+    stack = Stack([1, 2])
+    popped = stack.pop_n(3), len(stack), stack.pop_n(2), stack.pop(), stack.peek(), stack.pop_n(0)
+    stack = Stack([1, 2, 3])
+    stack.deep(3)
+    stack.deep(0)
+    unchanged = list(stack.values)
+    stack.deep(2)
+    return popped == ([None, 1, 2], 0, [None, None], None, None, []) and unchanged == [1, 2, 3] and \
+        stack.values == [1, 2, 3, 1] and stack.high_water_mark == 4
+
+
+def check_fold_count():
+    # Whether code is folded does not depend on how long folding takes, so every constant here is folded
+    program = compile(' '.join(["3,4+", "99²²²²²²²²²²²²"] * 200), cache=False).program
+    return len(program.folds) == 400 and [str(fold) for fold in program.folds[:2]] == \
+        ['3,4+ → 7', '99²²²²²²²² → ' + str(99 ** 256)] and program.run() is not None
+
+
+def check_bytecode_nesting():
+    # Loops and paren blocks are jumps in the bytecode virtual machine, so they can be nested deeper than the
+    # recursion limit allows the tree backend to go. Fn parameters and blocks are not, and still recurse
+    nested = ["(" * 300 + "1" + ")" * 300, "1:" * 300 + "7" + ";" * 300]
+    programs = [(compile(code, backend=backend, cache=False), backend) for code in nested
+                for backend in ('tree', 'bytecode')]
+    results = []
+    limit = sys.getrecursionlimit()
+    sys.setrecursionlimit(1000)
+    try:
+        for program, backend in programs:
+            try:
+                results.append((backend, program.run()))
+            except RecursionError:
+                results.append((backend, RecursionError))
+    finally:
+        sys.setrecursionlimit(limit)
+    return results == [('tree', RecursionError), ('bytecode', 1), ('tree', RecursionError), ('bytecode', 7)]
+
+
+checks = [check_cache_hit, check_cache_miss_changed_code, check_cache_fingerprint, check_cache_owner,
+          check_cache_eviction, check_inline_cache_hot_loop, check_inline_cache_keys,
+          check_compiled_run_many, check_test_workers, check_stack_analysis,
+          check_environment_pool, check_stack_underflow,
+          check_fold_count, check_bytecode_nesting]
+
+
+def run_checks(check_list):
+    failures = [check.__name__ for check in check_list if not check()]
+    for name in failures:
+        print('failed', name)
+    print('Checks:', len(check_list) - len(failures), 'of', len(check_list), 'ok')
+
+
 if __name__ == "__main__":
     debug_single_test = None
     if debug_single_test is not None and debug_single_test in [t['name'] for t in tests]:
         interactive_from_test_suite(tests, debug_single_test)
     else:
         test(tests, verbose=True, path=__file__)
+        test(tests, path=__file__, backend='closure')
+        test(tests, path=__file__, backend='bytecode')
+        test(tests, path=__file__, fold=False)
+        run_checks(checks)